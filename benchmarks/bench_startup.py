@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+#
+# Startup benchmark of dada_fildb: the import time of the package and the time from process start
+# to the first page in an in-process stand-in ringbuffer. Each run is a fresh interpreter,
+# no PSRDADA install is needed
+#
+# Usage: python benchmarks/bench_startup.py [--baseline previous.jsonl] > results.jsonl
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from statistics import median
+from time import perf_counter
+
+# modules that should not be imported to replay SIGPROC data
+HEAVY_MODULES = ('astropy', )
+# timings that are compared to the baseline
+TIMINGS = ('python_seconds', 'import_seconds', 'first_page_seconds', 'process_seconds')
+
+
+def child(files, pagesize):
+    """
+    Replay the first page of files into a MemoryWriter, in a fresh interpreter started by run_case.
+    Prints the time to import numpy and dada_fildb and to fill the first page, from the start of this function.
+    This module does not import numpy itself, so that its import is timed here
+
+    :param list files: path to the filterbank file of each beam
+    :param int pagesize: number of samples per page
+    """
+    tstart = perf_counter()
+    import numpy  # noqa: F401
+    tnumpy = perf_counter()
+    from dada_fildb.dada_fildb import dada_fildb
+    timport = perf_counter()
+
+    from common import MemoryWriter
+    writer = MemoryWriter()
+    dada_fildb(files, key='dada', order='TF', pagesize=pagesize, duration=f'{pagesize}samp', writer=writer)
+    first_page = writer.start_time + writer.latencies[0]
+    heavy = sorted({name.split('.')[0] for name in sys.modules} & set(HEAVY_MODULES))
+    print(json.dumps({'numpy_seconds': tnumpy - tstart, 'import_seconds': timport - tnumpy,
+                      'first_page_seconds': first_page - tstart, 'heavy_modules': heavy}))
+
+
+def run_case(files, pagesize):
+    """
+    Run the child in a fresh interpreter, and an empty interpreter for reference
+
+    :param list files: path to the filterbank file of each beam
+    :param int pagesize: number of samples per page
+    :return: dict with the benchmark result
+    """
+    tstart = perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], check=True)
+    python = perf_counter() - tstart
+
+    tstart = perf_counter()
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', '--pagesize', str(pagesize),
+                             '--files'] + files, check=True, stdout=subprocess.PIPE).stdout
+    result = json.loads(output)
+    result['process_seconds'] = perf_counter() - tstart
+    result['python_seconds'] = python
+    return result
+
+
+def compare(result, baseline_file, tolerance):
+    """
+    Compare the result to an earlier run
+
+    :param dict result: benchmark result
+    :param str baseline_file: JSON lines file of an earlier run
+    :param float tolerance: allowed fractional increase in time
+    :return: number of regressions
+    """
+    with open(baseline_file) as f:
+        previous = [json.loads(line) for line in f if line.strip()][-1]
+    nregression = 0
+    for key in TIMINGS:
+        if result[key] > previous[key] * (1 + tolerance):
+            nregression += 1
+            print(f'Regression in {key}: {previous[key]:.4f} -> {result[key]:.4f} s', file=sys.stderr)
+    return nregression
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark the import and startup time of dada_fildb. '
+                                                 'The median of all runs is printed as a JSON object')
+    parser.add_argument('--nbeam', type=int, default=12,
+                        help='Number of beams (Default: %(default)s)')
+    parser.add_argument('--nchans', type=int, default=1536,
+                        help='Number of channels (Default: %(default)s)')
+    parser.add_argument('--pagesize', type=int, default=1024,
+                        help='Number of samples per page (Default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='Number of runs (Default: %(default)s)')
+    parser.add_argument('--tmpdir',
+                        help='Directory for the synthetic filterbank files (Default: system temporary directory)')
+    parser.add_argument('--baseline',
+                        help='JSON lines output of an earlier run to compare to, '
+                             'exits with an error if startup is slower')
+    parser.add_argument('--tolerance', type=float, default=.2,
+                        help='Allowed fractional increase in time compared to the baseline '
+                             '(Default: %(default)s)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--files', nargs='+', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.files, args.pagesize)
+        return
+
+    from common import create_filterbank, remove_files
+
+    with tempfile.TemporaryDirectory(dir=args.tmpdir) as tmpdir:
+        files = [create_filterbank(os.path.join(tmpdir, f'bench_beam{beam:02d}.fil'), args.nchans, args.pagesize,
+                                   seed=beam)
+                 for beam in range(args.nbeam)]
+        try:
+            runs = [run_case(files, args.pagesize) for _ in range(args.repeat)]
+        finally:
+            remove_files(files)
+
+    result = {'nbeam': args.nbeam, 'nchans': args.nchans, 'pagesize': args.pagesize, 'repeat': args.repeat,
+              'heavy_modules': runs[0]['heavy_modules']}
+    for key in ('numpy_seconds', ) + TIMINGS:
+        result[key] = median(run[key] for run in runs)
+    print(json.dumps(result), flush=True)
+    if result['heavy_modules']:
+        print(f'Imported at startup: {", ".join(result["heavy_modules"])}', file=sys.stderr)
+
+    if args.baseline is not None and compare(result, args.baseline, args.tolerance) > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+#
+# End-to-end throughput benchmark of dada_fildb against an in-process stand-in ringbuffer,
+# no PSRDADA install is needed
+#
+# Usage: python benchmarks/bench_throughput.py [--baseline previous.jsonl] > results.jsonl
+import itertools
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from dada_fildb.dada_fildb import dada_fildb
+from dada_fildb.sigproc import SigprocFile
+
+from common import MemoryWriter, create_filterbank, remove_files
+
+ORDERS = ['TF', 'Tf', 'FT', 'fT']
+
+
+def case_key(result):
+    """
+    Parameters that identify a benchmark case
+    """
+    return tuple(result.get(k, 'copy') for k in ('nbeam', 'nchans', 'pagesize', 'nbits', 'order', 'prefetch', 'workers',
+                                                 'reader'))
+
+
+def run_case(tmpdir, nbeam, nchans, pagesize, nbits, order, npage, prefetch, workers, reader):
+    """
+    Replay synthetic files into a MemoryWriter
+
+    :return: dict with the benchmark result
+    """
+    files = [create_filterbank(os.path.join(tmpdir, f'bench_beam{beam:02d}.fil'), nchans, npage * pagesize,
+                               nbits=nbits, seed=beam)
+             for beam in range(nbeam)]
+    try:
+        writer = MemoryWriter()
+        dada_fildb(files, key='dada', order=order, pagesize=pagesize, prefetch=prefetch, workers=workers,
+                   reader=reader, writer=writer)
+    finally:
+        remove_files(files)
+
+    elapsed = writer.end_time - writer.start_time
+    nbyte = writer.npage * writer.buffers[0].nbytes
+    latencies = np.array(writer.latencies)
+    result = {'nbeam': nbeam, 'nchans': nchans, 'pagesize': pagesize, 'nbits': nbits, 'order': order,
+              'prefetch': prefetch, 'workers': workers, 'reader': reader, 'npage': writer.npage, 'seconds': elapsed,
+              'pages_per_second': writer.npage / elapsed, 'gbps': nbyte / elapsed / 1e9}
+    for percentile in (50, 90, 99):
+        result[f'latency_p{percentile}'] = float(np.percentile(latencies, percentile))
+    result['latency_max'] = float(latencies.max())
+    return result
+
+
+def compare(results, baseline_file, tolerance):
+    """
+    Compare results to an earlier run
+
+    :param list results: benchmark results
+    :param str baseline_file: JSON lines file of an earlier run
+    :param float tolerance: allowed fractional decrease in throughput
+    :return: number of regressions
+    """
+    with open(baseline_file) as f:
+        baseline = {case_key(result): result for result in map(json.loads, f) if result}
+    nregression = 0
+    for result in results:
+        previous = baseline.get(case_key(result))
+        if previous is None:
+            continue
+        ratio = result['gbps'] / previous['gbps']
+        if ratio < 1 - tolerance:
+            nregression += 1
+            print(f'Regression in case (nbeam, nchans, pagesize, nbits, order, prefetch, workers, reader) = '
+                  f'{case_key(result)}: {previous["gbps"]:.3f} -> {result["gbps"]:.3f} GB/s', file=sys.stderr)
+    return nregression
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark dada_fildb throughput without a ringbuffer. '
+                                                 'Results are printed as one JSON object per line')
+    parser.add_argument('--nbeam', type=int, nargs='+', default=[1, 12],
+                        help='Number of beams (Default: %(default)s)')
+    parser.add_argument('--nchans', type=int, nargs='+', default=[1536],
+                        help='Number of channels (Default: %(default)s)')
+    parser.add_argument('--pagesize', type=int, nargs='+', default=[1024, 12500],
+                        help='Number of samples per page (Default: %(default)s)')
+    parser.add_argument('--nbits', type=int, nargs='+', default=[8],
+                        help='Number of bits of the input data (Default: %(default)s)')
+    parser.add_argument('--order', nargs='+', default=['TF', 'FT'], choices=ORDERS,
+                        help='Ringbuffer data orders (Default: %(default)s)')
+    parser.add_argument('--prefetch', type=int, nargs='+', default=[0],
+                        help='Number of pages to read ahead (Default: %(default)s)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1],
+                        help='Number of beam workers (Default: %(default)s)')
+    parser.add_argument('--reader', nargs='+', default=['copy'], choices=SigprocFile.backends,
+                        help='Input file backends (Default: %(default)s)')
+    parser.add_argument('--npage', type=int, default=8,
+                        help='Number of pages per case (Default: %(default)s)')
+    parser.add_argument('--tmpdir',
+                        help='Directory for the synthetic filterbank files (Default: system temporary directory)')
+    parser.add_argument('--baseline',
+                        help='JSON lines output of an earlier run to compare to, '
+                             'exits with an error if any case is slower')
+    parser.add_argument('--tolerance', type=float, default=.1,
+                        help='Allowed fractional decrease in throughput compared to the baseline '
+                             '(Default: %(default)s)')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.tmpdir) as tmpdir:
+        for case in itertools.product(args.nbeam, args.nchans, args.pagesize, args.nbits, args.order,
+                                      args.prefetch, args.workers, args.reader):
+            result = run_case(tmpdir, *case[:5], args.npage, *case[5:])
+            print(json.dumps(result), flush=True)
+            results.append(result)
+
+    if args.baseline is not None and compare(results, args.baseline, args.tolerance) > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
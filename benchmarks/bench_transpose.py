@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+#
+# Benchmark of the conversion of filterbank blocks into ringbuffer page order
+#
+# Usage: python benchmarks/bench_transpose.py [--json]
+import itertools
+import json
+import time
+
+import numpy as np
+
+from dada_fildb.transpose import TILE, page_shape, reorder, tf_view
+
+ORDERS = ['TF', 'Tf', 'FT', 'fT']
+DTYPES = {8: np.uint8, 16: np.uint16, 32: np.float32}
+
+
+def naive(data, order, out):
+    """
+    Reference conversion: a single strided copy
+    """
+    np.copyto(tf_view(out, order)[:data.shape[0]], data, casting='unsafe')
+
+
+def run_case(method, nchans, pagesize, nbits, nbeam, order, repeat, tile=TILE):
+    """
+    Time the conversion of one page
+
+    :return: dict with the benchmark result
+    """
+    rng = np.random.default_rng(42)
+    blocks = [rng.integers(0, 256, size=(pagesize, nchans)).astype(DTYPES[nbits]) for _ in range(nbeam)]
+    page = np.empty(nbeam * pagesize * nchans, dtype=np.uint8)
+    beam_pages = page.reshape((nbeam, ) + page_shape(order, nchans, pagesize))
+
+    def convert():
+        for beam, block in enumerate(blocks):
+            if method == 'tiled':
+                reorder(block, order, beam_pages[beam], tile=tile)
+            else:
+                naive(block, order, beam_pages[beam])
+
+    # warm up, this also faults in the page
+    convert()
+    times = []
+    for _ in range(repeat):
+        tstart = time.perf_counter()
+        convert()
+        times.append(time.perf_counter() - tstart)
+    best = min(times)
+    nbyte = sum(block.nbytes for block in blocks)
+    return {'method': method, 'order': order, 'nchans': nchans, 'pagesize': pagesize, 'nbits': nbits,
+            'nbeam': nbeam, 'tile': tile, 'seconds': best, 'median_seconds': float(np.median(times)),
+            'gbps': nbyte / best / 1e9}
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark conversion of filterbank data to ringbuffer order')
+    parser.add_argument('--nchans', type=int, nargs='+', default=[384, 1536],
+                        help='Number of channels (Default: %(default)s)')
+    parser.add_argument('--pagesize', type=int, nargs='+', default=[1024, 12500],
+                        help='Number of samples per page (Default: %(default)s)')
+    parser.add_argument('--nbits', type=int, nargs='+', default=[8, 16, 32], choices=sorted(DTYPES.keys()),
+                        help='Number of bits of the input data (Default: %(default)s)')
+    parser.add_argument('--nbeam', type=int, nargs='+', default=[1, 12],
+                        help='Number of beams (Default: %(default)s)')
+    parser.add_argument('--order', nargs='+', default=ORDERS, choices=ORDERS,
+                        help='Ringbuffer data orders (Default: %(default)s)')
+    parser.add_argument('--method', nargs='+', default=['tiled', 'naive'], choices=['tiled', 'naive'],
+                        help='Conversion methods (Default: %(default)s)')
+    parser.add_argument('--tile', type=int, default=TILE,
+                        help='Tile size of tiled transpose (Default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of timed repetitions per case (Default: %(default)s)')
+    parser.add_argument('--json', action='store_true',
+                        help='Print one JSON object per case instead of a table')
+    args = parser.parse_args()
+
+    if not args.json:
+        print(f'{"method":>6} {"order":>5} {"nchans":>6} {"pagesize":>8} {"nbits":>5} {"nbeam":>5} {"GB/s":>8}')
+    for nchans, pagesize, nbits, nbeam, order, method in itertools.product(args.nchans, args.pagesize, args.nbits,
+                                                                           args.nbeam, args.order, args.method):
+        result = run_case(method, nchans, pagesize, nbits, nbeam, order, args.repeat, tile=args.tile)
+        if args.json:
+            print(json.dumps(result), flush=True)
+        else:
+            print(f'{method:>6} {order:>5} {nchans:>6} {pagesize:>8} {nbits:>5} {nbeam:>5} {result["gbps"]:8.3f}',
+                  flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#
+# Shared helpers for the benchmarks: an in-process stand-in for psrdada.Writer
+# and generation of synthetic filterbank files
+import os
+from time import perf_counter
+
+import numpy as np
+
+from dada_fildb.sigproc import SigprocFile
+
+
+class MemoryWriter:
+    """
+    In-process stand-in for psrdada.Writer that hands out a ring of reusable page buffers.
+    Pages are consumed instantly, so the measured rate is that of the writer alone.
+    The time between handing out a page and the request for the next page is recorded as the page latency
+
+    :param int nbuffer: number of page buffers in the ring
+    """
+
+    def __init__(self, nbuffer=4):
+        self.nbuffer = nbuffer
+        self.header = None
+        self.buffers = None
+        self.isEndOfData = False
+        self.npage = 0
+        self.latencies = []
+        self.start_time = None
+        self.end_time = None
+        self._handout_time = None
+
+    def setHeader(self, header):
+        self.header = header
+        nbyte = int(header['RESOLUTION'])
+        self.buffers = [np.zeros(nbyte, dtype=np.uint8) for _ in range(self.nbuffer)]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        now = perf_counter()
+        self._page_done(now)
+        if self.isEndOfData:
+            raise StopIteration
+        if self.start_time is None:
+            self.start_time = now
+        buffer = self.buffers[self.npage % self.nbuffer]
+        self._handout_time = now
+        return buffer
+
+    def _page_done(self, now):
+        if self._handout_time is not None:
+            self.latencies.append(now - self._handout_time)
+            self.npage += 1
+            self.end_time = now
+            self._handout_time = None
+
+    def markEndOfData(self):
+        self._page_done(perf_counter())
+        self.isEndOfData = True
+
+    def disconnect(self):
+        pass
+
+
+def create_filterbank(fname, nchans, nsamp, nbits=8, tsamp=81.92e-6, seed=None):
+    """
+    Create a filterbank file with random data
+
+    :param str fname: path to file
+    :param int nchans: number of channels
+    :param int nsamp: number of spectra
+    :param int nbits: number of bits per sample
+    :param float tsamp: sampling time (s)
+    :param int seed: random seed
+    :return: path to file
+    """
+    header = {'source_name': 'FAKE',
+              'src_raj': 0.,
+              'src_dej': 0.,
+              'az_start': 0.,
+              'za_start': 0.,
+              'fch1': 1520.,
+              'foff': -300. / nchans,
+              'nchans': nchans,
+              'nbits': nbits,
+              'tstart': 58000.,
+              'tsamp': tsamp,
+              'nifs': 1}
+    filterbank = SigprocFile.new_file(fname, header)
+    filterbank.close()
+    rng = np.random.default_rng(seed)
+    nbyte = nsamp * nchans * nbits // 8
+    if nbits == 32:
+        data = rng.normal(128, 16, size=nbyte // 4).astype(np.float32)
+    else:
+        data = rng.integers(0, 256, size=nbyte, dtype=np.uint8)
+    with open(fname, 'ab') as f:
+        f.write(data.tobytes())
+    return fname
+
+
+def remove_files(fnames):
+    """
+    Remove files that exist
+
+    :param list fnames: paths to files
+    """
+    for fname in fnames:
+        if os.path.isfile(fname):
+            os.remove(fname)
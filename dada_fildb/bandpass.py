@@ -0,0 +1,194 @@
+import logging
+import threading
+
+import numpy as np
+
+from .transpose import is_frequency_major
+
+logger = logging.getLogger(__name__)
+
+# value of masked channels, the mean of normalised 8-bit data
+MASK_VALUE = 128
+# number of float32 values corrected at a time, so the intermediate block stays in cache
+BLOCK = 2 ** 16
+
+
+def load_mask(fname, nchans):
+    """
+    Read a channel mask from a text file with channel numbers or ranges lo:hi (hi is not included),
+    separated by whitespace or commas. Lines starting with # are ignored
+
+    :param str fname: path to mask file
+    :param int nchans: number of channels
+    :return: bool array, True for masked channels
+    """
+    mask = np.zeros(nchans, dtype=bool)
+    with open(fname) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            for item in line.replace(',', ' ').split():
+                if ':' in item:
+                    lo, hi = item.split(':')
+                    lo = int(lo) if lo else 0
+                    hi = int(hi) if hi else nchans
+                else:
+                    lo = int(item)
+                    hi = lo + 1
+                if not 0 <= lo < hi <= nchans:
+                    raise ValueError(f'Masked channels {item} are outside of the data, which has {nchans} channels')
+                mask[lo:hi] = True
+    return mask
+
+
+def load_bandpass(fname, nchans, nbeam):
+    """
+    Read a bandpass from a text file with one line per channel with its mean and standard deviation,
+    either once for all beams or for each beam (mean0 std0 mean1 std1 ...). Lines starting with # are ignored
+
+    :param str fname: path to bandpass file
+    :param int nchans: number of channels
+    :param int nbeam: number of beams
+    :return: mean and standard deviation with shape (nbeam, nchans)
+    """
+    bandpass = np.loadtxt(fname, ndmin=2)
+    if bandpass.shape[0] != nchans or bandpass.shape[1] not in (2, 2 * nbeam):
+        raise ValueError(f'Bandpass in {fname} has shape {bandpass.shape}, '
+                         f'expected ({nchans}, 2) or ({nchans}, {2 * nbeam})')
+    mean = np.broadcast_to(bandpass[:, ::2].T, (nbeam, nchans))
+    std = np.broadcast_to(bandpass[:, 1::2].T, (nbeam, nchans))
+    return mean, std
+
+
+class BandpassCorrector:
+    """
+    Mask channels and normalise the bandpass of ringbuffer pages in place.
+    The offset, scale and masked channel ranges are computed once in the frequency order of each data order,
+    so each page only needs broadcast operations.
+    Normalised channels have mean 128 and a standard deviation of 128 / nsigma, like requantized data.
+    The channels are those of the data as replayed, in the channel order of the input files
+
+    :param list orders: ringbuffer data orders
+    :param int nbeam: number of beams
+    :param int nchans: number of channels
+    :param np.ndarray mask: bool array, True for masked channels
+    :param np.ndarray mean: mean of each beam and channel of the 8-bit data, shape (nbeam, nchans)
+    :param np.ndarray std: standard deviation of each beam and channel of the 8-bit data, shape (nbeam, nchans)
+    :param float nsigma: number of standard deviations between the mean and the edges of the 8-bit range
+    """
+
+    def __init__(self, orders, nbeam, nchans, mask=None, mean=None, std=None, nsigma=6.):
+        if mask is None:
+            mask = np.zeros(nchans, dtype=bool)
+        self.mask = mask
+        self.normalise = mean is not None
+        if self.normalise:
+            # output = data * scale + offset, constant channels are set to the mean value.
+            # the extra .5 in the offset turns truncation to uint8 into rounding
+            std = np.asarray(std, dtype=np.float64)
+            valid = (std > 0) & ~mask
+            scale = np.where(valid, 128. / nsigma / np.where(std > 0, std, 1.), 0.)
+            offset = np.where(valid, 128. - mean * scale, MASK_VALUE) + .5
+            self.scale = scale.astype(np.float32)
+            self.offset = offset.astype(np.float32)
+        self._scale = {}
+        self._offset = {}
+        self._ranges = {}
+        for order in set(orders):
+            flip = 'F' in order
+            shape = (nbeam, nchans, 1) if is_frequency_major(order) else (nbeam, 1, nchans)
+            if self.normalise:
+                self._scale[order] = (self.scale[:, ::-1] if flip else self.scale).reshape(shape)
+                self._offset[order] = (self.offset[:, ::-1] if flip else self.offset).reshape(shape)
+            # contiguous ranges of masked channels
+            edges = np.diff(np.concatenate([[0], (mask[::-1] if flip else mask).astype(np.int8), [0]]))
+            self._ranges[order] = list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+        self._local = threading.local()
+
+    def _buffer(self, shape):
+        """
+        Get the reusable float buffer of the calling thread
+
+        :param tuple shape: shape of the block
+        :return: float32 array
+        """
+        size = int(np.prod(shape))
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or len(buffer) < size:
+            buffer = np.empty(size, dtype=np.float32)
+            self._local.buffer = buffer
+        return buffer[:size].reshape(shape)
+
+    def apply(self, slab, order, beam, nsamp):
+        """
+        Correct the slab of one beam in a ringbuffer page in place, the zero padding after the data is not changed
+
+        :param np.ndarray slab: 2D uint8 slab of one beam (and IF) in ringbuffer order
+        :param str order: ringbuffer data order
+        :param int beam: beam index
+        :param int nsamp: number of time samples with data
+        """
+        frequency_major = is_frequency_major(order)
+        data = slab[:, :nsamp] if frequency_major else slab[:nsamp]
+        if data.size == 0:
+            return
+        if self.normalise:
+            # the masked channels are already set by the scale and offset
+            scale = self._scale[order][beam]
+            offset = self._offset[order][beam]
+            nrow = max(BLOCK // data.shape[1], 1)
+            for r0 in range(0, data.shape[0], nrow):
+                block = data[r0:r0 + nrow]
+                block_scale = scale[r0:r0 + nrow] if frequency_major else scale
+                block_offset = offset[r0:r0 + nrow] if frequency_major else offset
+                tmp = self._buffer(block.shape)
+                np.multiply(block, block_scale, out=tmp)
+                np.add(tmp, block_offset, out=tmp)
+                np.clip(tmp, 0, 255, out=tmp)
+                np.copyto(block, tmp, casting='unsafe')
+            return
+        for lo, hi in self._ranges[order]:
+            if frequency_major:
+                data[lo:hi] = MASK_VALUE
+            else:
+                data[:, lo:hi] = MASK_VALUE
+
+    def correct(self, data, beam):
+        """
+        Correct a block of data in the channel order of the input files,
+        the reference for the in-place correction of pages
+
+        :param np.ndarray data: uint8 block with shape (time, frequency)
+        :param int beam: beam index
+        :return: corrected uint8 block
+        """
+        if self.normalise:
+            data = np.clip(data * self.scale[beam] + self.offset[beam], 0, 255).astype(np.uint8)
+        else:
+            data = data.copy()
+            data[:, self.mask] = MASK_VALUE
+        return data
+
+
+def load_corrector(mask, bandpass, orders, nbeam, nchans, nsigma=6.):
+    """
+    Load a channel mask and bandpass and prepare their correction of ringbuffer pages
+
+    :param str mask: path to mask file, see load_mask, or None
+    :param str bandpass: path to bandpass file, see load_bandpass, or None
+    :param list orders: ringbuffer data orders
+    :param int nbeam: number of beams
+    :param int nchans: number of channels
+    :param float nsigma: number of standard deviations between the mean and the edges of the 8-bit range
+    :return: BandpassCorrector
+    """
+    channel_mask = None
+    mean = std = None
+    if mask is not None:
+        channel_mask = load_mask(mask, nchans)
+        logger.info(f'Masking {channel_mask.sum()} of {nchans} channels from {mask}')
+    if bandpass is not None:
+        mean, std = load_bandpass(bandpass, nchans, nbeam)
+        logger.info(f'Normalising the bandpass from {bandpass}')
+    return BandpassCorrector(orders, nbeam, nchans, mask=channel_mask, mean=mean, std=std, nsigma=nsigma)
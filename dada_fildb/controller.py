@@ -0,0 +1,436 @@
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from time import perf_counter
+
+import numpy as np
+
+from .dada_fildb import channel_range, loop_count, prepare_replay
+from .header_cache import HeaderCache
+from .wrapper import FilterbankWrapper
+
+logger = logging.getLogger(__name__)
+
+# options of a job in the manifest, besides those of prepare_replay
+JOB_KEYS = ('name', 'delay')
+
+
+class SharedFile(FilterbankWrapper):
+    """
+    A file opened by several replays. All attributes are those of the file,
+    closing only closes the file once every replay that uses it has closed it
+
+    :param SigprocFile filterbank: the open file
+    :param FileCache cache: cache the file was opened from
+    :param tuple key: key of the file in the cache
+    """
+
+    def __init__(self, filterbank, cache, key):
+        super().__init__(filterbank)
+        self._cache = cache
+        self._key = key
+        self._closed = False
+
+    def close(self):
+        """
+        Release the file, it is closed when no other replay uses it
+        """
+        if not self._closed:
+            self._closed = True
+            self._cache.release(self._key)
+
+
+class FileCache:
+    """
+    Input files of all replays of the controller, each file is opened once per reader backend.
+    The parsed header and memory map of a file are shared by every replay that reads it
+    """
+
+    def __init__(self):
+        self._files = {}
+        self._lock = threading.Lock()
+        # number of files opened, and number of times they were requested
+        self.nfile = 0
+        self.nopen = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._files)
+
+    def open(self, fname, reader, opener):
+        """
+        Get a file, opening it only if no other replay has it open
+
+        :param str fname: path to the file
+        :param str reader: reader backend, files read with different backends are not shared
+        :param callable opener: function(fname) that opens the file
+        :return: SharedFile
+        """
+        key = (os.path.realpath(fname), reader)
+        with self._lock:
+            entry = self._files.get(key)
+            if entry is None:
+                entry = [opener(fname), 0]
+                self._files[key] = entry
+                self.nfile += 1
+            entry[1] += 1
+            self.nopen += 1
+        return SharedFile(entry[0], self, key)
+
+    def release(self, key):
+        """
+        Release a file, and close it if no replay uses it anymore
+
+        :param tuple key: key of the file in the cache
+        """
+        with self._lock:
+            entry = self._files[key]
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self._files[key]
+        entry[0].close()
+
+
+class JobStats:
+    """
+    Pages written by the writers of one job, and where the writers spent their time:
+    waiting for a free page in the ringbuffer (backpressure from the readers),
+    waiting for a thread of the fill pool, and filling the page
+
+    :param str name: name of the job
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.npage = 0
+        self.nbyte = 0
+        self.wait = 0.
+        self.queue = 0.
+        self.fill = 0.
+        self.start = None
+        self.end = None
+        self.error = None
+        self._last = (0, 0., 0.)
+
+    def add_page(self, nbyte, wait, queue, fill):
+        """
+        Record one written page
+
+        :param int nbyte: size of the page in bytes
+        :param float wait: time spent waiting for the free page (s)
+        :param float queue: time spent waiting for a thread to fill the page (s)
+        :param float fill: time spent filling the page (s)
+        """
+        self.npage += 1
+        self.nbyte += nbyte
+        self.wait += wait
+        self.queue += queue
+        self.fill += fill
+
+    def interval(self):
+        """
+        Get the bytes written and the backpressure since the previous call
+
+        :return: number of bytes, fraction of the writer time spent waiting for free pages
+        """
+        nbyte, wait, total = self._last
+        busy = self.wait + self.queue + self.fill
+        self._last = (self.nbyte, self.wait, busy)
+        busy -= total
+        return self.nbyte - nbyte, (self.wait - wait) / busy if busy > 0 else 0.
+
+    def summary(self):
+        """
+        Summarise the job
+
+        :return: dict with the pages and bytes written, throughput in GB/s, and the fractions of time spent
+                 waiting for free pages (backpressure), waiting for a fill thread, and filling pages
+        """
+        busy = self.wait + self.queue + self.fill
+        elapsed = 0. if self.start is None else (self.end or perf_counter()) - self.start
+        return {'name': self.name,
+                'ok': self.error is None,
+                'error': None if self.error is None else repr(self.error),
+                'npage': self.npage,
+                'nbyte': self.nbyte,
+                'seconds': elapsed,
+                'gbps': self.nbyte / elapsed / 1e9 if elapsed > 0 else 0.,
+                'backpressure': self.wait / busy if busy > 0 else 0.,
+                'queue': self.queue / busy if busy > 0 else 0.,
+                'fill': self.fill / busy if busy > 0 else 0.}
+
+
+def load_manifest(fname):
+    """
+    Read the jobs to run from a JSON manifest: either a list of jobs, or an object with the list of jobs
+    under "jobs" and options shared by all jobs under "defaults".
+    Each job is an object with the options of dada_fildb, with the same names as the arguments of prepare_replay,
+    an optional name, and an optional delay (s) between setting the headers and writing the data.
+    loop can be a number or "forever", channels a list [lo, hi]
+
+    :param str fname: path to the manifest
+    :return: list with the options of each job
+    """
+    with open(fname) as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        defaults, jobs = {}, manifest
+    else:
+        defaults, jobs = manifest.get('defaults', {}), manifest.get('jobs', [])
+    if not jobs:
+        raise ValueError(f'No jobs in manifest {fname}')
+
+    allowed = set(inspect.signature(prepare_replay).parameters) - {'writer', 'file_cache'}
+    allowed.update(JOB_KEYS)
+    parsed = []
+    for i, job in enumerate(jobs):
+        options = dict(defaults, **job)
+        unknown = set(options) - allowed
+        if unknown:
+            raise ValueError(f'Unknown options of job {i} in {fname}: {", ".join(sorted(unknown))}')
+        missing = {'key', 'pagesize'} - set(options)
+        if not options.get('synthetic') and 'files' not in options:
+            missing.add('files')
+        if missing:
+            raise ValueError(f'Missing options of job {i} in {fname}: {", ".join(sorted(missing))}')
+        if isinstance(options.get('loop'), str):
+            options['loop'] = loop_count(options['loop'])
+        if isinstance(options.get('channels'), str):
+            options['channels'] = channel_range(options['channels'])
+        elif options.get('channels') is not None:
+            options['channels'] = tuple(options['channels'])
+        options.setdefault('files', [])
+        options.setdefault('order', 'FT')
+        if 'name' not in options:
+            key = options['key']
+            options['name'] = key if isinstance(key, str) else ','.join(key)
+        parsed.append(options)
+    names = [options['name'] for options in parsed]
+    if len(set(names)) != len(names):
+        raise ValueError(f'Duplicate job names in {fname}')
+    return parsed
+
+
+class Controller:
+    """
+    Run many replays from a single process. The writers of all jobs are driven by one asyncio event loop:
+    waiting for free ringbuffer pages is done on a thread per writer, filling pages on a thread pool of fixed size.
+    Input files and header caches are shared by the jobs that use the same ones.
+    A job that fails is stopped without affecting the other jobs
+
+    :param list jobs: options of each job, see load_manifest
+    :param int threads: number of threads to fill pages
+    :param float report_interval: time between logs of the aggregate throughput (s), zero to disable
+    """
+
+    def __init__(self, jobs, threads=4, report_interval=10.):
+        if threads < 1:
+            raise ValueError(f'Number of threads must be at least 1, got {threads}')
+        self.jobs = jobs
+        self.threads = threads
+        self.report_interval = report_interval
+        self.file_cache = FileCache()
+        self.stats = [JobStats(job['name']) for job in jobs]
+        self._header_caches = {}
+        self._fill_pool = None
+        self._wait_pool = None
+
+    def _options(self, job):
+        """
+        Get the arguments of prepare_replay of a job, with the shared file and header caches
+
+        :param dict job: options of the job
+        :return: dict of arguments
+        """
+        options = {name: value for name, value in job.items() if name not in JOB_KEYS}
+        header_cache = options.get('header_cache')
+        if header_cache is not None and not isinstance(header_cache, HeaderCache):
+            path = os.path.abspath(header_cache)
+            if path not in self._header_caches:
+                self._header_caches[path] = HeaderCache(path)
+            options['header_cache'] = self._header_caches[path]
+        # files that are still being written are not shared, each follower has to see them grow
+        if not options.get('follow'):
+            options['file_cache'] = self.file_cache
+        return options
+
+    def run(self):
+        """
+        Run all jobs until they are done
+
+        :return: summary of each job, see JobStats.summary
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._run())
+        finally:
+            loop.close()
+        return [stats.summary() for stats in self.stats]
+
+    async def _run(self):
+        # one thread per writer can block on a full ringbuffer, the fills share a bounded pool
+        nwriter = sum(1 if isinstance(job['key'], str) else len(job['key']) for job in self.jobs)
+        self._fill_pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='fill')
+        self._wait_pool = ThreadPoolExecutor(max_workers=nwriter, thread_name_prefix='wait')
+        reporter = None
+        if self.report_interval > 0:
+            reporter = asyncio.ensure_future(self._report())
+        try:
+            await asyncio.gather(*[self._run_job(job, stats) for job, stats in zip(self.jobs, self.stats)])
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+            self._fill_pool.shutdown()
+            self._wait_pool.shutdown()
+        logger.info(f'Opened {self.file_cache.nfile} input files for {self.file_cache.nopen} uses')
+
+    async def _run_job(self, job, stats):
+        """
+        Prepare one job and write all of its pages, log the error if it fails
+
+        :param dict job: options of the job
+        :param JobStats stats: statistics of the job
+        """
+        loop = asyncio.get_event_loop()
+        name = job['name']
+        replay = None
+        try:
+            replay = await loop.run_in_executor(self._fill_pool, partial(prepare_replay, **self._options(job)))
+            await asyncio.sleep(job.get('delay', 0.))
+            logger.info(f'Starting job {name}')
+            stats.start = perf_counter()
+            # fills that wait for the other writers of the job or for growing files
+            # must not occupy the threads of the fill pool
+            blocking = replay.fanout is not None or bool(job.get('follow'))
+            tasks = [asyncio.ensure_future(self._write_pages(replay, i, stats, blocking))
+                     for i in range(len(replay.writers))]
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            if pending:
+                # release the writers that wait for pages of the writer that failed
+                replay.abort()
+                await asyncio.wait(pending)
+            # raise the first error of the writers
+            errors = [task.exception() for task in tasks if task.exception() is not None]
+            if errors:
+                raise errors[0]
+        except Exception as e:
+            stats.error = e
+            logger.error(f'Job {name} failed: {e!r}')
+        finally:
+            stats.end = perf_counter()
+            if replay is not None:
+                replay.stop()
+                # also after a failure, so the ringbuffers are released and the shared files closed
+                try:
+                    await loop.run_in_executor(self._fill_pool, replay.close)
+                except Exception as e:
+                    logger.error(f'Failed to close job {name}: {e!r}')
+                    if stats.error is None:
+                        stats.error = e
+        if stats.error is None:
+            logger.info(f'Finished job {name}: {stats.npage} pages, {stats.nbyte / 2**30:.2f} GiB')
+
+    async def _write_pages(self, replay, index, stats, blocking=False):
+        """
+        Fill the pages of one writer of a job until all pages are written, like write_pages
+
+        :param Replay replay: the replay of the job
+        :param int index: index of the writer
+        :param JobStats stats: statistics of the job
+        :param bool blocking: fill the pages on the thread of the writer instead of the fill pool
+        """
+        loop = asyncio.get_event_loop()
+        writer = replay.writers[index]
+        fill = replay.fills[index]
+        pacer = replay.pacers[index]
+        metrics = replay.metrics
+        fill_pool = self._wait_pool if blocking else self._fill_pool
+
+        def timed_fill(page, out, submitted):
+            tstart = perf_counter()
+            last = fill(page, out)
+            return last, tstart - submitted, perf_counter() - tstart
+
+        iterator = iter(writer)
+        page = 0
+        if pacer is not None:
+            pacer.start()
+        while True:
+            tstart = perf_counter()
+            buffer = await loop.run_in_executor(self._wait_pool, next, iterator, None)
+            if buffer is None:
+                break
+            wait = perf_counter() - tstart
+            if metrics is not None:
+                metrics.record('wait', wait)
+            out = np.asarray(buffer)
+            last, queue, fill_time = await loop.run_in_executor(fill_pool, timed_fill, page, out, perf_counter())
+            if pacer is not None:
+                # the page is released to the readers once we move on to the next one
+                remaining, _ = pacer.schedule(page)
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+            if metrics is not None:
+                metrics.page_done(out.nbytes)
+            stats.add_page(out.nbytes, wait, queue, fill_time)
+            page += 1
+
+            if page == replay.npage or last:
+                writer.markEndOfData()
+
+    async def _report(self):
+        """
+        Periodically log the aggregate throughput and the backpressure of each job
+        """
+        while True:
+            tstart = perf_counter()
+            await asyncio.sleep(self.report_interval)
+            elapsed = perf_counter() - tstart
+            nbyte_total = 0
+            parts = []
+            for stats in self.stats:
+                if stats.start is None or stats.end is not None:
+                    continue
+                nbyte, backpressure = stats.interval()
+                nbyte_total += nbyte
+                parts.append(f'{stats.name} {nbyte / elapsed / 1e9:.3f} GB/s ({100 * backpressure:.0f}% waiting)')
+            if parts:
+                logger.info(f'Total {nbyte_total / elapsed / 1e9:.3f} GB/s in {len(parts)} jobs: '
+                            + ', '.join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run many replays of dada_fildb from a single process')
+    parser.add_argument('manifest',
+                        help='JSON file with the jobs to run: a list of jobs, or an object with the list of '
+                             'jobs under "jobs" and options shared by all jobs under "defaults". '
+                             'Each job has the options of dada_fildb, with underscores instead of hyphens, '
+                             'e.g. {"files": ["cb00.fil"], "key": "dada", "order": "FT", "pagesize": 1024}, '
+                             'and optionally a name')
+    parser.add_argument('--threads', type=int, default=4,
+                        help='Number of threads to fill pages, shared by all jobs (Default: %(default)s)')
+    parser.add_argument('--report-interval', type=float, default=10.,
+                        help='Time between logs of the aggregate throughput in seconds, 0 to disable '
+                             '(Default: %(default)s)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+
+    args = parser.parse_args()
+    logging.basicConfig(format='%(asctime)s %(name)s %(levelname)s: %(message)s',
+                        level=logging.DEBUG if args.verbose else logging.INFO)
+
+    controller = Controller(load_manifest(args.manifest), threads=args.threads,
+                            report_interval=args.report_interval)
+    summary = controller.run()
+    print(json.dumps({'jobs': summary,
+                      'nbyte': sum(job['nbyte'] for job in summary),
+                      'ok': all(job['ok'] for job in summary)}))
+    if not all(job['ok'] for job in summary):
+        sys.exit(1)
@@ -1,13 +1,34 @@
+import argparse
+import logging
 import os
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from functools import partial
 import numpy as np
-from time import sleep
-from psrdada import Writer
-from astropy.time import Time
+from time import perf_counter, sleep
 
+from .bandpass import load_corrector
+from .fanout import FanOut
+from .follow import Follower
+from .header_cache import HeaderCache
+from .ifs import IF_MODES, MultiIFFile, split_ifs
+from .injection import InjectedFile, load_pulses, write_log
+from .metrics import Metrics
+from .pacing import Pacer
+from .prefetch import Prefetcher
+from .psrfits import PsrfitsFile, is_psrfits
+from .requantize import RequantizedFile
+from .scrunch import ScrunchedFile
+from .selection import SelectedFile
 from .sigproc import SigprocFile
+from .synthetic import NOISE_TYPES, SyntheticFile, noise_pool
+from .transpose import IF_LAYOUTS, if_slabs, page_shape, reorder
+from .utc import mjd_to_isot
+from .virtual import VirtualSigprocFile
 
+logger = logging.getLogger(__name__)
 
-def create_header(filterbank, nbeam, pagesize, flip_band=True):
+
+def create_header(filterbank, nbeam, pagesize, flip_band=True, scanlen=None):
 
     bw = filterbank.nchans * filterbank.foff
     fch1 = filterbank.fch1
@@ -27,10 +48,12 @@ def create_header(filterbank, nbeam, pagesize, flip_band=True):
     header['RA_HMS'] = ra_hms
     header['DEC'] = filterbank.src_dej
     header['DEC_HMS'] = dec_dms  # the header value is actually called DEC_HMS, this is not a typo
-    header['UTC_START'] = Time(filterbank.tstart, format='mjd').isot.replace('T', '-')
+    header['UTC_START'] = mjd_to_isot(filterbank.tstart).replace('T', '-')
     header['MJD_START'] = filterbank.tstart
     header['LST_START'] = 0  # unknown, but required in header
-    header['SCANLEN'] = filterbank.nspectra() * filterbank.tsamp
+    if scanlen is None:
+        scanlen = filterbank.nspectra() * filterbank.tsamp
+    header['SCANLEN'] = scanlen
     header['TELESCOPE'] = 'WSRT'
     header['INSTRUMENT'] = 'ARTS'
     header['FREQ'] = filterbank.fch1 + .5 * (filterbank.nchans - 1) * filterbank.foff
@@ -42,12 +65,16 @@ def create_header(filterbank, nbeam, pagesize, flip_band=True):
     header['SAMPLES_PER_BATCH'] = pagesize
     header['PADDED_SIZE'] = pagesize
     header['NBIT'] = 8
-    header['NDIM'] = 2
-    header['NPOL'] = 2
+    # detected, real-valued data, with one polarisation per IF
+    nifs, layout = beam_layout(filterbank)
+    header['NDIM'] = 1
+    header['NPOL'] = nifs
+    if nifs > 1:
+        header['IF_LAYOUT'] = layout
     header['IN_USE'] = 1
-    header['RESOLUTION'] = pagesize * filterbank.nchans * nbeam
-    header['TRANSFER_SIZE'] = pagesize * filterbank.nchans * nbeam
-    header['BYTES_PER_SECOND'] = int(pagesize * filterbank.tsamp) * filterbank.nchans * nbeam
+    header['RESOLUTION'] = pagesize * filterbank.nchans * nifs * nbeam
+    header['TRANSFER_SIZE'] = pagesize * filterbank.nchans * nifs * nbeam
+    header['BYTES_PER_SECOND'] = int(round(filterbank.nchans * nifs * nbeam / filterbank.tsamp))
     header['AZ_START'] = filterbank.az_start
     header['ZA_START'] = filterbank.za_start
     header['SCIENCE_CASE'] = 4
@@ -68,91 +95,780 @@ def create_header(filterbank, nbeam, pagesize, flip_band=True):
     return header
 
 
-def get_data(filterbanks, page, pagesize, order):
+def read_ifs(filterbank, nstart, nsamp):
+    """
+    Read the data of each IF of a beam
+
+    :param SigprocFile filterbank: filterbank of this beam
+    :param int nstart: Starting spectra number to start reading from.
+    :param int nsamp: Number of spectra to read.
+    :return: list with an array with shape (time, frequency) for each IF
+    """
+    if isinstance(filterbank, MultiIFFile):
+        return filterbank.get_ifs(nstart, nsamp)
+    return [filterbank.get_data(nstart, nsamp)]
+
+
+def beam_layout(filterbank):
+    """
+    Number of IFs of a beam and the position of their axis in the ringbuffer page
+
+    :param SigprocFile filterbank: filterbank of this beam
+    :return: number of IFs, IF layout
+    """
+    if isinstance(filterbank, MultiIFFile):
+        return filterbank.nifs, filterbank.layout
+    return 1, 'major'
+
+
+def fill_beam(filterbank, page, pagesize, slabs, metrics=None, corrector=None, beam=0):
+    """
+    Write one page of a single beam into its slab of one or more ringbuffer pages
+
+    :param SigprocFile filterbank: filterbank of this beam
+    :param int page: page index
+    :param int pagesize: number of time samples per page
+    :param dict slabs: list with the 2D slab of each IF of this beam in the ringbuffer page of each data order
+    :param Metrics metrics: if given, record the time spent reading and reordering
+    :param BandpassCorrector corrector: if given, mask channels and normalise the bandpass in the page
+    :param int beam: beam index
+    """
+    if metrics is None:
+        fil_data = read_ifs(filterbank, page * pagesize, pagesize)
+        # copy straight from the filterbank into the page, at the end of the file the page is padded with zeroes
+        for order, outs in slabs.items():
+            for data, out in zip(fil_data, outs):
+                reorder(data, order, out)
+                if corrector is not None:
+                    corrector.apply(out, order, beam, len(data))
+        return
+
+    tstart = perf_counter()
+    fil_data = read_ifs(filterbank, page * pagesize, pagesize)
+    metrics.record('read', perf_counter() - tstart, sum(data.nbytes for data in fil_data))
+    for order, outs in slabs.items():
+        tstart = perf_counter()
+        for data, out in zip(fil_data, outs):
+            reorder(data, order, out)
+        metrics.record('reorder', perf_counter() - tstart, sum(out.nbytes for out in outs))
+        if corrector is not None:
+            tstart = perf_counter()
+            for data, out in zip(fil_data, outs):
+                corrector.apply(out, order, beam, len(data))
+            metrics.record('correct', perf_counter() - tstart, sum(out.nbytes for out in outs))
+
+
+def get_pages(filterbanks, page, pagesize, outs, executor=None, metrics=None, corrector=None):
+    """
+    Write one page of filterbank data into a ringbuffer page for each data order,
+    the data are read only once
+
+    :param list filterbanks: SigprocFile of each beam
+    :param int page: page index
+    :param int pagesize: number of time samples per page
+    :param dict outs: uint8 view of the ringbuffer page of each data order
+    :param Executor executor: if given, fill the beams in parallel on this executor
+    :param Metrics metrics: if given, record the time spent in each stage
+    :param BandpassCorrector corrector: if given, mask channels and normalise the bandpass in the pages
+    """
     nbeam = len(filterbanks)
-    f = filterbanks[0]
-    data = np.zeros((nbeam, f.nchans, pagesize))
-    for i, f in enumerate(filterbanks):
-        fil_data = f.get_data(page * pagesize, pagesize)
-        if order.upper() == 'FT':
-            # filterbank is in Tf order, transpose
-            fil_data = np.transpose(fil_data)
-        if 'F' in order:
-            # filterbank has highest-freq first, flip
-            fil_data = fil_data[::-1]
-        try:
-            data[i] = fil_data
-        except ValueError:
-            # shapes do not match, assume we are at the end of the file
-            nsamp = fil_data.shape[1]
-            data[i][:, :nsamp] = fil_data
-    return data
-
-
-def dada_fildb(files, key, order, pagesize, delay):
-    # verify that the input files exist
-    for f in files:
-        if not os.path.isfile(f):
-            raise OSError(f'File not found: {f}')
-
-    # open the input files
-    filterbanks = []
-    for f in files:
-        filterbanks.append(SigprocFile(f))
+    nifs, layout = beam_layout(filterbanks[0])
+    beam_pages = {order: out.reshape((nbeam, ) + page_shape(order, filterbanks[0].nchans, pagesize, nifs, layout))
+                  for order, out in outs.items()}
 
-    # construct PSRDADA header from first filterbank file
-    header = create_header(filterbanks[0], nbeam=len(files), pagesize=pagesize)
+    def fill(i):
+        fill_beam(filterbanks[i], page, pagesize,
+                  {order: if_slabs(pages[i], nifs, layout) for order, pages in beam_pages.items()},
+                  metrics=metrics, corrector=corrector, beam=i)
 
-    # connect to the ringbuffer as writer
-    writer = Writer(int(key, 16))
-    # set the header
-    writer.setHeader(header)
+    if executor is None:
+        for i in range(nbeam):
+            fill(i)
+    else:
+        # each worker writes its own beam slab of the shared pages,
+        # consuming the results re-raises any error from the workers
+        list(executor.map(fill, range(nbeam)))
 
-    # wait if requested
-    sleep(delay)
 
-    # write the data
-    npage = int(np.ceil(filterbanks[0].nspectra() / pagesize))
+def get_data(filterbanks, page, pagesize, order, out, executor=None, metrics=None, corrector=None):
+    """
+    Write one page of filterbank data into a ringbuffer page
+
+    :param list filterbanks: SigprocFile of each beam
+    :param int page: page index
+    :param int pagesize: number of time samples per page
+    :param str order: ringbuffer data order
+    :param np.ndarray out: uint8 view of the ringbuffer page
+    :param Executor executor: if given, fill the beams in parallel on this executor
+    :param Metrics metrics: if given, record the time spent in each stage
+    :param BandpassCorrector corrector: if given, mask channels and normalise the bandpass in the page
+    """
+    get_pages(filterbanks, page, pagesize, {order: out}, executor=executor, metrics=metrics, corrector=corrector)
+
+
+def to_samples(value, tsamp):
+    """
+    Convert a time to a number of samples
+
+    :param value: time in seconds, or number of samples as a string ending in samp, e.g. 1024samp
+    :param float tsamp: sampling time (s)
+    :return: number of samples
+    """
+    if isinstance(value, str) and value.endswith('samp'):
+        return int(value[:-len('samp')])
+    return int(round(float(value) / tsamp))
+
+
+def select(filterbank, start=None, duration=None, channels=None):
+    """
+    Select a time window and channel range of a filterbank
+
+    :param SigprocFile filterbank: input filterbank
+    :param start: start of the window in seconds, or in samples as a string ending in samp
+    :param duration: length of the window in seconds, or in samples as a string ending in samp
+    :param tuple channels: first and last + 1 channel, either can be None
+    :return: SelectedFile
+    """
+    nstart = 0 if start is None else to_samples(start, filterbank.tsamp)
+    nsamp = None if duration is None else to_samples(duration, filterbank.tsamp)
+    chan_start, chan_end = (None, None) if channels is None else channels
+    if chan_start is None:
+        chan_start = 0
+    if chan_end is None:
+        chan_end = filterbank.nchans
+    return SelectedFile(filterbank, start=nstart, nsamp=nsamp, chan_start=chan_start, nchan=chan_end - chan_start)
+
+
+def load_pages(filterbanks, npage, pagesize, order, executor=None, corrector=None):
+    """
+    Read pages of filterbank data into memory
+
+    :param list filterbanks: SigprocFile of each beam
+    :param int npage: number of pages to read
+    :param int pagesize: number of time samples per page
+    :param str order: ringbuffer data order
+    :param Executor executor: if given, fill the beams in parallel on this executor
+    :param BandpassCorrector corrector: if given, mask channels and normalise the bandpass in the pages
+    :return: uint8 array with one page in ringbuffer order per row
+    """
+    nbyte = len(filterbanks) * filterbanks[0].nchans * beam_layout(filterbanks[0])[0] * pagesize
+    pages = np.empty((npage, nbyte), dtype=np.uint8)
+    for page in range(npage):
+        get_data(filterbanks, page, pagesize, order, pages[page], executor=executor, corrector=corrector)
+    return pages
+
+
+def write_pages(writer, fill, npage, pacer=None, metrics=None):
+    """
+    Fill ringbuffer pages until all pages are written
+
+    :param Writer writer: ringbuffer writer
+    :param callable fill: function(page, out) that writes page number page into uint8 array out,
+                          it may return True to end the data after this page
+    :param int npage: total number of pages, None if unknown
+    :param Pacer pacer: if given, hold each page until it is due
+    :param Metrics metrics: if given, record the time spent waiting for free pages and the pages written
+    """
     page = 0
+    if pacer is not None:
+        pacer.start()
+    tstart = perf_counter()
     for buffer in writer:
-        # get a page of filterbank data
-        np.asarray(buffer)[:] = get_data(filterbanks, page, pagesize, order).flatten()
+        if metrics is not None:
+            metrics.record('wait', perf_counter() - tstart)
+        out = np.asarray(buffer)
+        last = fill(page, out)
+        if pacer is not None:
+            # the page is released to the readers once we move on to the next one
+            pacer.wait(page)
+        if metrics is not None:
+            metrics.page_done(out.nbytes)
         page += 1
+        tstart = perf_counter()
 
-        if page == npage:
+        if page == npage or last:
             writer.markEndOfData()
 
-    # disconnect
-    writer.disconnect()
 
-    # close filterbank files
-    for f in filterbanks:
-        f.fp.close()
+def follow_fill(fill, follower, pagesize):
+    """
+    Wait for each page of files that are still being written before filling it
+
+    :param callable fill: function(page, out) that writes page number page into out
+    :param Follower follower: follower of the input files
+    :param int pagesize: number of time samples per page
+    :return: function(page, out) that returns True for the last page
+    """
+    def wait_and_fill(page, out):
+        complete = follower.wait_for((page + 1) * pagesize)
+        fill(page, out)
+        # hold the page until the next one has started, so the end of the data can still be marked on this page.
+        # This does not wait if the data have a known end
+        return not (complete and follower.wait_for((page + 1) * pagesize + 1))
+    return wait_and_fill
+
+
+def write_concurrently(writers, fills, npage, pacers, metrics=None, on_error=None):
+    """
+    Fill the pages of several ringbuffers, each on its own thread, until all pages are written
+
+    :param list writers: ringbuffer writers
+    :param list fills: function(page, out) of each writer
+    :param int npage: total number of pages, None if unknown
+    :param list pacers: Pacer of each writer, or None
+    :param Metrics metrics: if given, record the time spent waiting for free pages and the pages written
+    :param callable on_error: called when a writer fails, to release the writers that wait for it
+    """
+    with ThreadPoolExecutor(max_workers=len(writers), thread_name_prefix='writer') as executor:
+        futures = [executor.submit(write_pages, w, fill, npage, pacer=pacer, metrics=metrics)
+                   for w, fill, pacer in zip(writers, fills, pacers)]
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        if not_done and on_error is not None:
+            on_error()
+    # result re-raises the first error of the writers
+    for future in futures:
+        future.result()
+
+
+def open_filterbanks(files, requantize='block', nsigma=6., start=None, duration=None, channels=None, reader='copy',
+                     header_cache=None, tscrunch=1, fscrunch=1, inject=None, synthetic=False, nbeam=1, nchans=1536,
+                     tsamp=81.92e-6, fch1=1520., foff=-.1953125, noise='gaussian', seed=None, ifs='first',
+                     if_layout='major', file_cache=None):
+    """
+    Open the data of each beam, with the selection, decimation, requantization and injection of pulses applied.
+    The options are those of the command line
+
+    :param list files: path to the filterbank file of each beam, or comma-separated paths of consecutive files
+    :param header_cache: path to the header cache file, or a HeaderCache
+    :param FileCache file_cache: if given, files that are already open are shared instead of opened again
+    :return: list with a reader of 8-bit data for each beam, a MultiIFFile if the beam has multiple IF streams
+    """
+    if if_layout not in IF_LAYOUTS:
+        raise ValueError(f'Unknown IF layout: {if_layout}')
+    if synthetic:
+        if files:
+            raise ValueError('Input files cannot be used with synthetic data')
+        if start is not None or channels is not None:
+            raise ValueError('A time window or channel range cannot be selected from synthetic data, '
+                             'only a duration')
+        if seed is None:
+            seed = int(np.random.default_rng().integers(2 ** 31))
+        logger.info(f'Generating {noise} noise with seed {seed}')
+        nsamp = None if duration is None else to_samples(duration, tsamp)
+        # all beams draw from the same noise pool, at different positions
+        pool = noise_pool(nchans, noise=noise, seed=seed)
+        sources = [[SyntheticFile(nchans, tsamp, fch1, foff, nsamp=nsamp, pool=pool, seed=seed + ibeam)]
+                   for ibeam in range(nbeam)]
+        beams = [[] for _ in sources]
+    else:
+        # each beam is one file, or a comma-separated list of consecutive files
+        beams = [beam.split(',') for beam in files]
+        # verify that the input files exist
+        for beam in beams:
+            for f in beam:
+                if not os.path.isfile(f):
+                    raise OSError(f'File not found: {f}')
+
+        # open the input files
+        if header_cache is not None and not isinstance(header_cache, HeaderCache):
+            header_cache = HeaderCache(header_cache)
+        open_sigproc = partial(SigprocFile, backend=reader, header_cache=header_cache)
+
+        def open_new(fname):
+            # PSRFITS files are recognised by their extension, all other files are read as SIGPROC filterbank
+            if is_psrfits(fname):
+                return PsrfitsFile(fname)
+            return open_sigproc(fname)
+
+        if file_cache is None:
+            open_file = open_new
+        else:
+            def open_file(fname):
+                return file_cache.open(fname, reader, open_new)
+
+        sources = []
+        for beam in beams:
+            if len(beam) > 1:
+                filterbank = VirtualSigprocFile(beam, reader=open_file)
+            else:
+                filterbank = open_file(beam[0])
+            # the IFs are split off first, the streams of a beam share the reads of the file
+            streams = split_ifs(filterbank, ifs)
+            if start is not None or duration is not None or channels is not None:
+                streams = [select(stream, start, duration, channels) for stream in streams]
+            sources.append(streams)
+        if header_cache is not None:
+            header_cache.save()
+
+    if inject is not None:
+        pulses = load_pulses(inject)
+        for pulse in pulses:
+            if pulse['beam'] is not None and not 0 <= pulse['beam'] < len(beams):
+                raise ValueError(f'Cannot inject pulse into beam {pulse["beam"]}, there are {len(beams)} beams')
+    filterbanks = []
+    for ibeam, streams in enumerate(sources):
+        for i, filterbank in enumerate(streams):
+            if tscrunch > 1 or fscrunch > 1:
+                # reduce the resolution before requantizing, so no precision is lost
+                filterbank = ScrunchedFile(filterbank, tscrunch=tscrunch, fscrunch=fscrunch)
+            if filterbank.nbits > 8:
+                # the ringbuffer is always 8-bit, each IF is requantized with its own statistics
+                filterbank = RequantizedFile(filterbank, mode=requantize, nsigma=nsigma)
+            if inject is not None:
+                # add the pulses to the data as written to the ringbuffer, in every IF
+                beam_pulses = [pulse for pulse in pulses if pulse['beam'] in (None, ibeam)]
+                if beam_pulses:
+                    filterbank = InjectedFile(filterbank, beam_pulses)
+            streams[i] = filterbank
+        if len(streams) > 1:
+            filterbanks.append(MultiIFFile(streams, layout=if_layout))
+        else:
+            filterbanks.append(streams[0])
+    return filterbanks
+
+
+class Replay:
+    """
+    A replay of filterbank data that is ready to be written to one or more ringbuffers:
+    the writer of each ringbuffer, the function that fills its pages, and the helpers that prepare pages ahead
+
+    :param list writers: ringbuffer writers, with their headers set
+    :param list fills: function(page, out) of each writer
+    :param int npage: total number of pages, None if unknown
+    :param list pacers: Pacer of each writer, or None
+    :param list filterbanks: reader of each beam
+    :param Metrics metrics: page pipeline metrics, or None
+    :param list helpers: objects with a close method that prepare pages, closed once writing has stopped
+    :param FanOut fanout: the fan-out of pages to the writers, or None
+    :param Executor executor: executor that fills the beams in parallel, or None
+    """
+
+    def __init__(self, writers, fills, npage, pacers, filterbanks, metrics=None, helpers=(), fanout=None,
+                 executor=None):
+        self.writers = writers
+        self.fills = fills
+        self.npage = npage
+        self.pacers = pacers
+        self.filterbanks = filterbanks
+        self.metrics = metrics
+        self.helpers = list(helpers)
+        self.fanout = fanout
+        self.executor = executor
+
+    def abort(self):
+        """
+        Release the writers that wait for pages of a writer that failed
+        """
+        if self.fanout is not None:
+            self.fanout.close()
 
-    return
+    def write(self):
+        """
+        Write all pages, each writer on its own thread if there are several
+        """
+        if len(self.writers) == 1:
+            write_pages(self.writers[0], self.fills[0], self.npage, pacer=self.pacers[0], metrics=self.metrics)
+        else:
+            write_concurrently(self.writers, self.fills, self.npage, self.pacers, metrics=self.metrics,
+                               on_error=self.abort)
+
+    def stop(self):
+        """
+        Log the summaries and stop the helpers, also if writing failed
+        """
+        for pacer in self.pacers:
+            if pacer is not None:
+                pacer.summary()
+        if self.metrics is not None:
+            self.metrics.summary()
+        for helper in self.helpers:
+            helper.close()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def close(self):
+        """
+        Disconnect from the ringbuffers and close the filterbank files
+        """
+        for w in self.writers:
+            w.disconnect()
+        for f in self.filterbanks:
+            f.close()
+
+
+def prepare_replay(files, key, order, pagesize, prefetch=0, workers=1, requantize='block', nsigma=6.,
+                   realtime=False, speed=1., loop=None, start=None, duration=None, channels=None, writer=None,
+                   metrics=None, metrics_interval=10., reader='copy', header_cache=None, tscrunch=1, fscrunch=1,
+                   inject=None, inject_log=None, follow=False, follow_timeout=10., synthetic=False, nbeam=1,
+                   nchans=1536, tsamp=81.92e-6, fch1=1520., foff=-.1953125, noise='gaussian', seed=None,
+                   ifs='first', if_layout='major', mask=None, bandpass=None, file_cache=None):
+    """
+    Open the data, connect to the ringbuffers and set their headers, and prepare the filling of their pages.
+    The options are those of the command line
+
+    :param FileCache file_cache: if given, share open files with other replays in this process
+    :return: Replay
+    """
+    # one or more ringbuffers, each with its own data order or all with the same order
+    keys = [key] if isinstance(key, str) else list(key)
+    orders = [order] if isinstance(order, str) else list(order)
+    if len(orders) == 1:
+        orders = orders * len(keys)
+    if len(orders) != len(keys):
+        raise ValueError(f'Got {len(orders)} data orders for {len(keys)} keys, '
+                         f'expected one order or one per key')
+    if len(set(keys)) != len(keys):
+        raise ValueError(f'Duplicate ringbuffer keys: {keys}')
+    order = orders[0]
+    if follow and loop is not None:
+        raise ValueError('Cannot loop over files that are still being written')
+    if loop is not None and loop < 1:
+        raise ValueError(f'Number of loops must be at least 1, got {loop}')
+    if requantize == 'running' and prefetch > 0 and len(keys) == 1:
+        raise ValueError('Cannot prefetch with running requantization, '
+                         'its statistics are updated with every page in order')
+    if follow and prefetch > 0:
+        raise ValueError('Cannot prefetch files that are still being written, '
+                         'pages are written as soon as they are complete')
+
+    if synthetic and follow:
+        raise ValueError('Synthetic data cannot be followed')
+    filterbanks = open_filterbanks(files, requantize=requantize, nsigma=nsigma, start=start, duration=duration,
+                                   channels=channels, reader=reader, header_cache=header_cache, tscrunch=tscrunch,
+                                   fscrunch=fscrunch, inject=inject, synthetic=synthetic, nbeam=nbeam, nchans=nchans,
+                                   tsamp=tsamp, fch1=fch1, foff=foff, noise=noise, seed=seed, ifs=ifs,
+                                   if_layout=if_layout, file_cache=file_cache)
+    if inject is not None:
+        if inject_log is None:
+            inject_log = f'{os.path.splitext(inject)[0]}_injected.jsonl'
+        write_log(inject_log, filterbanks, pagesize)
+        logger.info(f'Injecting pulses from {inject}, log written to {inject_log}')
+    corrector = None
+    if mask is not None or bandpass is not None:
+        # prepared once for the frequency order of every key
+        corrector = load_corrector(mask, bandpass, orders, len(filterbanks), filterbanks[0].nchans, nsigma=nsigma)
+
+    nspectra = filterbanks[0].nspectra()
+    if follow or np.isinf(nspectra):
+        # the files are still growing or the data are endless, so the length of the data is unknown
+        if loop is not None:
+            raise ValueError('Cannot loop over data of unknown length')
+        npage = None
+        scanlen = 0
+    elif loop is None:
+        npage = int(np.ceil(nspectra / pagesize))
+        scanlen = None
+        if npage == 0:
+            # the end of the data would never be marked
+            for filterbank in filterbanks:
+                filterbank.close()
+            raise ValueError('There are no data to replay')
+    else:
+        # only loop over whole pages, so the replayed time series stays continuous
+        npage_loop = int(nspectra // pagesize)
+        if npage_loop == 0:
+            for filterbank in filterbanks:
+                filterbank.close()
+            raise ValueError(f'Cannot loop over {nspectra} spectra, less than one page of {pagesize} samples')
+        npage = loop * npage_loop
+        if np.isinf(loop):
+            scanlen = 0  # unknown
+        else:
+            scanlen = npage * pagesize * filterbanks[0].tsamp
+
+    # construct PSRDADA header from first filterbank file, the band is flipped per key depending on its order
+    headers = [create_header(filterbanks[0], nbeam=len(filterbanks), pagesize=pagesize, flip_band='F' in key_order,
+                             scanlen=scanlen)
+               for key_order in orders]
+
+    # connect to the ringbuffers as writer, unless writers are given
+    if writer is None:
+        from psrdada import Writer
+        writers = [Writer(int(k, 16)) for k in keys]
+    elif isinstance(writer, (list, tuple)):
+        writers = list(writer)
+    else:
+        writers = [writer]
+    # set the headers
+    for w, header in zip(writers, headers):
+        w.setHeader(header)
+
+    if workers > 1:
+        # threads rather than processes: the page is already shared memory and
+        # numpy releases the GIL while copying, so no data has to be pickled
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='beam')
+    else:
+        executor = None
+
+    if metrics is not None:
+        metrics = Metrics(metrics, interval=metrics_interval, labels={'key': ','.join(keys)})
+
+    nbyte = int(headers[0]['RESOLUTION'])
+    prefetcher = None
+    fanout = None
+    follower = None
+    if follow:
+        follower = Follower(filterbanks, [f for beam in files for f in beam.split(',')],
+                            timeout=follow_timeout)
+    if loop is not None:
+        # read all pages once per data order, after that each page is a single copy from memory
+        pages = {}
+        for key_order in orders:
+            if key_order not in pages:
+                pages[key_order] = load_pages(filterbanks, npage_loop, pagesize, key_order, executor=executor,
+                                              corrector=corrector)
+        nbyte_loop = sum(p.nbytes for p in pages.values())
+        repeat = 'forever' if np.isinf(loop) else f'{loop} times'
+        logger.info(f'Loaded {npage_loop} pages ({nbyte_loop / 2**20:.1f} MiB) to replay {repeat}')
+
+        def loop_fill(key_pages):
+            def fill(page, out):
+                tstart = perf_counter()
+                np.copyto(out, key_pages[page % npage_loop])
+                if metrics is not None:
+                    metrics.record('copy', perf_counter() - tstart, out.nbytes)
+            return fill
+
+        fills = [loop_fill(pages[key_order]) for key_order in orders]
+    elif len(keys) > 1:
+        # read each page once, convert it once per data order, and hand it to all keys
+        def fill_orders(page, outs):
+            get_pages(filterbanks, page, pagesize, outs, executor=executor, metrics=metrics, corrector=corrector)
+
+        if follower is not None:
+            fill_orders = follow_fill(fill_orders, follower, pagesize)
+        fanout = FanOut(fill_orders, orders, nbyte, npage, depth=max(prefetch, 2), metrics=metrics)
+        fills = [fanout.writer_fill(i) for i in range(len(keys))]
+    else:
+        def fill(page, out):
+            get_data(filterbanks, page, pagesize, order, out, executor=executor, metrics=metrics,
+                     corrector=corrector)
+
+        if follower is not None:
+            fill = follow_fill(fill, follower, pagesize)
+        elif prefetch > 0:
+            # start reading ahead already, so the first pages are ready after the delay
+            prefetcher = Prefetcher(fill, nbyte, npage, prefetch, metrics=metrics)
+            fill = prefetcher.fill
+        fills = [fill]
+
+    if realtime:
+        pacers = [Pacer(pagesize * filterbanks[0].tsamp / speed) for _ in keys]
+    else:
+        pacers = [None for _ in keys]
+
+    helpers = [helper for helper in (prefetcher, fanout, follower) if helper is not None]
+    return Replay(writers, fills, npage, pacers, filterbanks, metrics=metrics, helpers=helpers, fanout=fanout,
+                  executor=executor)
+
+
+def dada_fildb(files, key, order, pagesize, delay=0., **kwargs):
+    """
+    Replay filterbank data into one or more ringbuffers
+
+    :param list files: path to the filterbank file of each beam, or comma-separated paths of consecutive files
+    :param key: hexadecimal shared memory key, or list of keys
+    :param order: ringbuffer data order, or list with the order of each key
+    :param int pagesize: number of time samples per page
+    :param float delay: time between setting the headers and writing the data (s)
+    :param kwargs: other options, see prepare_replay
+    """
+    replay = prepare_replay(files, key, order, pagesize, **kwargs)
+
+    # wait if requested
+    sleep(delay)
+
+    # write the data
+    try:
+        replay.write()
+    finally:
+        replay.stop()
+
+    # disconnect and close filterbank files
+    replay.close()
+
+
+def loop_count(value):
+    """
+    Parse the number of loops from the command line
+
+    :param str value: number of loops, or forever
+    :return: number of loops, infinite for forever
+    """
+    if value == 'forever':
+        return np.inf
+    return int(value)
+
+
+def channel_range(value):
+    """
+    Parse a channel range from the command line
+
+    :param str value: range as lo:hi, either can be omitted
+    :return: tuple of first and last + 1 channel, None if omitted
+    """
+    try:
+        lo, hi = value.split(':')
+        return int(lo) if lo else None, int(hi) if hi else None
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid channel range: {value}, expected lo:hi')
+
+
+def add_source_arguments(parser):
+    """
+    Add the command line options that define the data to an argument parser
+
+    :param ArgumentParser parser: argument parser
+    """
+    parser.add_argument('-f', '--files', nargs='+',
+                        help='Input filterbank file(s), one file per beam. '
+                             'Files ending in .fits or .sf are read as PSRFITS search-mode data, '
+                             'all other files as SIGPROC filterbank. '
+                             'If multiple files, must be in ascending beam order. '
+                             'A beam split over consecutive files can be given as a '
+                             'comma-separated list of files in time order. Required unless --synthetic is given')
+    parser.add_argument('--requantize', default='block', choices=['block', 'running'],
+                        help='How to estimate the per-channel offset and scale when requantizing '
+                             '16 or 32-bit data to 8 bits: from a leading block of data, '
+                             'or from running statistics updated with every page in order, '
+                             'which cannot be combined with --prefetch for a single key '
+                             '(Default: %(default)s)')
+    parser.add_argument('--nsigma', type=float, default=6.,
+                        help='Number of standard deviations between the mean and the edges '
+                             'of the 8-bit range when requantizing (Default: %(default)s)')
+    parser.add_argument('--start',
+                        help='Start of the time window to replay, in seconds from the start of the file, '
+                             'or in samples with suffix samp, e.g. 1024samp (Default: start of file)')
+    parser.add_argument('--duration',
+                        help='Length of the time window to replay, in seconds, '
+                             'or in samples with suffix samp (Default: up to end of file)')
+    parser.add_argument('--channels', type=channel_range,
+                        help='Channel range to replay as lo:hi, in the channel order of the input files, '
+                             'hi is not included (Default: all channels)')
+    parser.add_argument('--tscrunch', type=int, default=1,
+                        help='Number of consecutive spectra to average into one output spectrum. '
+                             'The page size is in output spectra (Default: %(default)s)')
+    parser.add_argument('--fscrunch', type=int, default=1,
+                        help='Number of adjacent channels to average into one output channel, '
+                             'must divide the number of (selected) channels (Default: %(default)s)')
+    parser.add_argument('--inject',
+                        help='Add dispersed pulses to the data. Text file with one pulse per line: '
+                             'arrival time at the highest frequency (s, from the start of the replayed data), '
+                             'DM (pc/cm3), intrinsic FWHM width (s), fluence per channel (ms, in units of the '
+                             '8-bit data) and optionally the beam index (default: all beams). '
+                             'In loop mode, the pulses are injected in every loop')
+    parser.add_argument('--mask',
+                        help='Set channels to a constant value of 128. Text file with channel numbers or '
+                             'ranges lo:hi (hi is not included), in the channel order of the input files '
+                             'and counted after --channels and --fscrunch')
+    parser.add_argument('--bandpass',
+                        help='Normalise each channel to mean 128 and a standard deviation of 128 / NSIGMA. '
+                             'Text file with one line per channel (numbered like --mask) '
+                             'with the mean and standard deviation of the 8-bit data, '
+                             'once for all beams or for each beam: mean0 std0 mean1 std1 ...')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='Write 8-bit noise instead of data from input files, '
+                             'endless unless a --duration is given')
+    parser.add_argument('--nbeam', type=int, default=1,
+                        help='Number of beams of synthetic data (Default: %(default)s)')
+    parser.add_argument('--nchans', type=int, default=1536,
+                        help='Number of channels of synthetic data (Default: %(default)s)')
+    parser.add_argument('--tsamp', type=float, default=81.92e-6,
+                        help='Sampling time of synthetic data in seconds (Default: %(default)s)')
+    parser.add_argument('--fch1', type=float, default=1520.,
+                        help='Frequency of the first channel of synthetic data in MHz (Default: %(default)s)')
+    parser.add_argument('--foff', type=float, default=-.1953125,
+                        help='Channel width of synthetic data in MHz (Default: %(default)s)')
+    parser.add_argument('--noise', default='gaussian', choices=NOISE_TYPES,
+                        help='Synthetic noise, the same in every channel or shaped like a bandpass '
+                             '(Default: %(default)s)')
+    parser.add_argument('--seed', type=int,
+                        help='Seed of the synthetic noise, the same seed gives the same data '
+                             '(Default: random)')
+    parser.add_argument('--ifs', default='first', choices=IF_MODES,
+                        help='Which IFs (polarisations) of input files with multiple IFs to write. '
+                             'first: only the first IF, '
+                             'all: every IF, as the polarisations of the ringbuffer, '
+                             'sum: total intensity, the mean of the first two IFs. '
+                             'This is the total intensity of dual-polarisation and coherence (AABBCRCI) data, '
+                             'in Stokes (IQUV) data the first IF already is the total intensity. '
+                             'Files with a single IF are written unchanged (Default: %(default)s)')
+    parser.add_argument('--if-layout', default='major', choices=IF_LAYOUTS,
+                        help='Position of the IF axis within each beam with --ifs all. '
+                             'major: IF changes slower than time and frequency, '
+                             'interleaved: IF changes fastest (Default: %(default)s)')
+    parser.add_argument('--reader', default='copy', choices=SigprocFile.backends,
+                        help='How to read SIGPROC input files. copy: copy from a memory map, '
+                             'mmap: zero-copy views of a memory map with sequential readahead, '
+                             'dropping data that has been written from the page cache, '
+                             'pread: read into reusable buffers without memory mapping, '
+                             'also dropping data that has been read from the page cache '
+                             '(Default: %(default)s)')
+    parser.add_argument('--header-cache',
+                        help='Cache file of parsed filterbank headers, '
+                             'headers are only parsed for files that are new or have changed')
 
 
 def main():
-    import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument('-k', '--key', default='dada',
-                        help='Hexadecimal shared memory key (Default: %(default)s)')
-    parser.add_argument('-f', '--files', required=True, nargs='+',
-                        help='Input filterbank file(s), one file per beam. '
-                             'If multiple files, must be in ascending beam order')
-    parser.add_argument('-o', '--order', default='FT',
+    parser.add_argument('-k', '--key', default='dada', nargs='+',
+                        help='Hexadecimal shared memory key. If multiple keys are given, each page is read once '
+                             'and written to all ringbuffers concurrently (Default: %(default)s)')
+    parser.add_argument('-o', '--order', default='FT', choices=['TF', 'Tf', 'FT', 'fT'], nargs='+',
                         help='Data order (slowest to fastest changing axis) of '
                              'ringbuffer as a two-letter code '
                              'T = time, F = frequency (lowest freq first), f = frequency (highest freq first). '
                              'If multiple input files are present, the slowest changing axis is always assumed '
-                             'to be beams '
+                             'to be beams. '
+                             'Either one order for all keys, or one order per key '
                              '(Default: %(default)s)')
     parser.add_argument('-p', '--pagesize', type=int, required=True,
                         help='Number of time samples in one ringbuffer page')
+    add_source_arguments(parser)
     parser.add_argument('-d', '--delay', type=float, default=0.,
                         help='Delay (s) between writing first header and data to buffer '
                              '(Default: %(default)s)')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='Number of pages to read ahead on background threads. '
+                             'If zero, pages are read directly into the ringbuffer. '
+                             'With multiple keys, the number of pages a key can run ahead of the slowest key '
+                             '(at least 2) '
+                             '(Default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of threads to fill the beams of a page in parallel '
+                             '(Default: %(default)s)')
+    parser.add_argument('--realtime', action='store_true',
+                        help='Release pages at the sample rate of the observation instead of '
+                             'as fast as the readers allow')
+    parser.add_argument('--speed', type=float, default=1.,
+                        help='Replay speed relative to real time in realtime mode (Default: %(default)s)')
+    parser.add_argument('--loop', type=loop_count,
+                        help='Load the data into memory once and replay it this many times, '
+                             'or forever. Only whole pages are replayed')
+    parser.add_argument('--inject-log',
+                        help='Where to write the log of injected pulses, as JSON lines '
+                             '(Default: <INJECT without extension>_injected.jsonl)')
+    parser.add_argument('--follow', action='store_true',
+                        help='Follow input files that are still being written, '
+                             'each page is written as soon as it is complete in all beams')
+    parser.add_argument('--follow-timeout', type=float, default=10.,
+                        help='In follow mode, end the data once the input files have not grown for '
+                             'this many seconds (Default: %(default)s)')
+    parser.add_argument('--metrics',
+                        help='Time each stage of the page pipeline and periodically write the results to '
+                             '<METRICS>.jsonl and <METRICS>.prom (Prometheus text format)')
+    parser.add_argument('--metrics-interval', type=float, default=10.,
+                        help='Time between metrics exports in seconds (Default: %(default)s)')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Verbose output, including the lateness of each page in realtime mode')
 
     args = parser.parse_args()
+    if not args.files and not args.synthetic:
+        parser.error('either --files or --synthetic is required')
+
+    kwargs = vars(args)
+    verbose = kwargs.pop('verbose')
+    logging.basicConfig(format='%(asctime)s %(name)s %(levelname)s: %(message)s',
+                        level=logging.DEBUG if verbose else logging.INFO)
 
-    dada_fildb(**vars(args))
+    dada_fildb(**kwargs)
@@ -0,0 +1,139 @@
+import queue
+import threading
+from time import perf_counter
+
+import numpy as np
+
+
+class _SharedPage:
+    """
+    Page buffer handed to several writers, returned to its pool once every writer has copied it
+    """
+
+    def __init__(self, buffer, pool, nuser):
+        self.buffer = buffer
+        self._pool = pool
+        self._nuser = nuser
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            self._nuser -= 1
+            done = self._nuser == 0
+        if done:
+            self._pool.put(self.buffer)
+
+
+class FanOut:
+    """
+    Read each page once and hand it to several ringbuffer writers.
+    For every distinct data order a page is assembled once into one of a fixed pool of page buffers,
+    which is shared by all writers with that order and reused once each of them has copied it.
+    A writer can run up to depth pages ahead of the slowest writer, after that reading pauses until
+    the slowest writer has caught up.
+
+    :param callable fill: function(page, outs) that writes page number page into the uint8 array outs[order]
+                          for each order, and returns True if it was the last page
+    :param list orders: data order of each writer
+    :param int nbyte: size of one page in bytes
+    :param int npage: total number of pages, None if unknown
+    :param int depth: number of page buffers per data order
+    :param Metrics metrics: if given, record the time spent waiting for pages and copying them
+    """
+
+    def __init__(self, fill, orders, nbyte, npage, depth=2, metrics=None):
+        if depth < 1:
+            raise ValueError(f'Number of page buffers must be at least 1, got {depth}')
+        self._fill = fill
+        self.orders = list(orders)
+        self.npage = npage
+        self.metrics = metrics
+        self._pools = {}
+        for order in set(self.orders):
+            self._pools[order] = queue.Queue()
+            for _ in range(depth):
+                self._pools[order].put(np.empty(nbyte, dtype=np.uint8))
+        # pages ready for each writer, bounded by the number of page buffers
+        self._ready = [queue.Queue() for _ in self.orders]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='fanout', daemon=True)
+        self._thread.start()
+
+    def _get_buffer(self, order):
+        """
+        Wait for a free page buffer, give up if the fan-out is closed
+
+        :param str order: data order
+        :return: page buffer, None if closed
+        """
+        while not self._stop.is_set():
+            try:
+                return self._pools[order].get(timeout=.1)
+            except queue.Empty:
+                pass
+        return None
+
+    def _run(self):
+        page = 0
+        try:
+            while self.npage is None or page < self.npage:
+                outs = {}
+                for order in self._pools:
+                    outs[order] = self._get_buffer(order)
+                    if outs[order] is None:
+                        return
+                last = self._fill(page, outs)
+                shared = {order: _SharedPage(buffer, self._pools[order], self.orders.count(order))
+                          for order, buffer in outs.items()}
+                for ready, order in zip(self._ready, self.orders):
+                    ready.put((page, shared[order], last))
+                if last:
+                    return
+                page += 1
+        except Exception as e:
+            # hand the error to every writer, so none of them waits forever
+            for ready in self._ready:
+                ready.put((page, e, True))
+
+    def fill(self, index, page, out):
+        """
+        Copy the next page of a writer into its ringbuffer page. Pages must be requested in order
+
+        :param int index: index of the writer
+        :param int page: page number
+        :param np.ndarray out: uint8 view of the ringbuffer page
+        :return: True if this was the last page
+        """
+        tstart = perf_counter()
+        expected_page, shared, last = self._ready[index].get()
+        if shared is None:
+            raise RuntimeError(f'Stopped reading before page {page}')
+        if isinstance(shared, Exception):
+            raise RuntimeError(f'Failed to read page {expected_page}') from shared
+        if page != expected_page:
+            raise ValueError(f'Pages must be requested in order, expected page {expected_page}, got {page}')
+        tready = perf_counter()
+        np.copyto(out, shared.buffer)
+        shared.release()
+        if self.metrics is not None:
+            self.metrics.record('prefetch', tready - tstart)
+            self.metrics.record('copy', perf_counter() - tready, out.nbytes)
+        return last
+
+    def writer_fill(self, index):
+        """
+        Fill function of one writer
+
+        :param int index: index of the writer
+        :return: function(page, out)
+        """
+        return lambda page, out: self.fill(index, page, out)
+
+    def close(self):
+        """
+        Stop reading and wait for the reading thread to finish, writers still waiting for a page get an error
+        """
+        self._stop.set()
+        self._thread.join()
+        for ready in self._ready:
+            ready.put((None, None, True))
@@ -0,0 +1,130 @@
+import logging
+import os
+import select
+from time import monotonic, sleep
+
+logger = logging.getLogger(__name__)
+
+# inotify events, see inotify(7)
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+
+
+class FileWatcher:
+    """
+    Wait for files to be written to, with inotify where available, otherwise by polling
+
+    :param list fnames: paths to the files
+    :param float poll_interval: time between checks when polling (s)
+    """
+
+    def __init__(self, fnames, poll_interval=.1):
+        self.poll_interval = poll_interval
+        self._fd = None
+        # ctypes.util imports subprocess and tempfile, so it is only imported when files are followed
+        import ctypes
+        import ctypes.util
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (AttributeError, OSError):
+            fd = -1
+        if fd < 0:
+            logger.info('inotify is not available, polling the input files for new data')
+            return
+        self._fd = fd
+        for fname in fnames:
+            if libc.inotify_add_watch(fd, os.fsencode(fname), IN_MODIFY | IN_CLOSE_WRITE) < 0:
+                logger.info(f'Cannot watch {fname} with inotify, polling the input files for new data')
+                self.close()
+                return
+
+    def wait(self, timeout):
+        """
+        Wait until one of the files is written to, or the timeout has passed
+
+        :param float timeout: maximum time to wait (s)
+        """
+        if self._fd is None:
+            sleep(min(timeout, self.poll_interval))
+            return
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if ready:
+            # discard the events, the caller checks the file sizes
+            try:
+                while os.read(self._fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        """
+        Stop watching the files
+        """
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class Follower:
+    """
+    Wait for data of filterbank files that are still being written.
+    The data end once the files have not grown for timeout seconds,
+    or as soon as every beam is a time window of fixed length that is completely available.
+
+    :param list filterbanks: reader of each beam, which must have a refresh method
+    :param list fnames: paths to the files
+    :param float timeout: time without new data after which the data have ended (s)
+    :param float poll_interval: time between checks if inotify is not available (s)
+    """
+
+    def __init__(self, filterbanks, fnames, timeout=10., poll_interval=.1):
+        self.filterbanks = filterbanks
+        self.timeout = timeout
+        self._watcher = FileWatcher(fnames, poll_interval=poll_interval)
+        self._last_growth = monotonic()
+
+    def available(self):
+        """
+        Number of spectra available in all beams
+
+        :return: number of spectra
+        """
+        grown = False
+        for filterbank in self.filterbanks:
+            # refresh every beam, also when an earlier one has grown
+            grown = filterbank.refresh() or grown
+        if grown:
+            self._last_growth = monotonic()
+        return min(int(filterbank.nspectra()) for filterbank in self.filterbanks)
+
+    def complete(self):
+        """
+        Whether the data of every beam have a fixed length and are completely available
+
+        :return: bool
+        """
+        return all(getattr(filterbank, 'complete', lambda: False)() for filterbank in self.filterbanks)
+
+    def wait_for(self, nspectra):
+        """
+        Wait until the given number of spectra is available in all beams
+
+        :param int nspectra: number of spectra
+        :return: True if available, False if the data ended before that
+        """
+        while self.available() < nspectra:
+            if self.complete():
+                # the end of the data is known, the files may keep growing beyond it
+                return False
+            remaining = self._last_growth + self.timeout - monotonic()
+            if remaining <= 0:
+                return False
+            self._watcher.wait(remaining)
+        return True
+
+    def close(self):
+        """
+        Stop watching the files
+        """
+        self._watcher.close()
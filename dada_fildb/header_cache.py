@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import sys
+import threading
+
+from .sigproc import SigprocFile
+
+logger = logging.getLogger(__name__)
+
+# header keys that should be identical in files of the same observation
+CONSISTENCY_KEYS = ('nchans', 'nbits', 'nifs', 'tsamp', 'tstart', 'fch1', 'foff')
+
+
+def default_path():
+    """
+    Default location of the header cache: $DADA_FILDB_HEADER_CACHE, or headers.json in the user cache directory
+
+    :return: path to the cache file
+    """
+    try:
+        return os.environ['DADA_FILDB_HEADER_CACHE']
+    except KeyError:
+        cache_dir = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+        return os.path.join(cache_dir, 'dada_fildb', 'headers.json')
+
+
+class HeaderCache:
+    """
+    Persistent cache of parsed filterbank headers, keyed by path, size and modification time
+
+    :param str path: path to the cache file, default from default_path()
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(self.path) as f:
+                self._entries = json.load(f)
+        except FileNotFoundError:
+            self._entries = {}
+        except ValueError:
+            logger.warning(f'Ignoring corrupt header cache {self.path}')
+            self._entries = {}
+
+    def header(self, fname):
+        """
+        Get the header of a filterbank file, parsing the file only if it is not in the cache or has changed
+
+        :param str fname: path to filterbank file
+        :return: dict of header values, header size in bytes, file size in bytes
+        """
+        fname = os.path.abspath(fname)
+        stat = os.stat(fname)
+        with self._lock:
+            entry = self._entries.get(fname)
+        if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+            with open(fname, 'rb') as fp:
+                header, hdrbytes = SigprocFile.load_header(fp)
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hdrbytes': hdrbytes,
+                     # JSON cannot store bytes
+                     'header': {k: v.decode('latin-1') if isinstance(v, bytes) else v for k, v in header.items()}}
+            with self._lock:
+                self._entries[fname] = entry
+                self._dirty = True
+        header = {k: v.encode('latin-1') if SigprocFile._type[k] == 'string' else v
+                  for k, v in entry['header'].items()}
+        return header, entry['hdrbytes'], entry['size']
+
+    def save(self):
+        """
+        Write the cache to disk if it has changed
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # write to a temporary file first, so other processes never read a partial cache
+            tmp = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+
+def check_consistency(headers, keys=CONSISTENCY_KEYS):
+    """
+    Compare headers to the first header
+
+    :param dict headers: header dict per file name
+    :param tuple keys: header keys to compare
+    :return: list of (file name, key, value, reference value) for each mismatch
+    """
+    mismatches = []
+    fnames = list(headers.keys())
+    if not fnames:
+        return mismatches
+    reference = headers[fnames[0]]
+    for fname in fnames[1:]:
+        for key in keys:
+            if headers[fname].get(key) != reference.get(key):
+                mismatches.append((fname, key, headers[fname].get(key), reference.get(key)))
+    return mismatches
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='List filterbank headers and check their consistency, '
+                                                 'using a persistent header cache')
+    parser.add_argument('files', nargs='+', help='Filterbank files')
+    parser.add_argument('--cache', help=f'Header cache file (Default: {default_path()})')
+    parser.add_argument('--keys', nargs='+', default=list(CONSISTENCY_KEYS),
+                        help='Header keys to list and check (Default: %(default)s)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only print inconsistencies')
+    args = parser.parse_args()
+
+    cache = HeaderCache(args.cache)
+    headers = {}
+    for fname in args.files:
+        header, hdrbytes, size = cache.header(fname)
+        if header.get('nbits'):
+            bits_per_spectrum = header['nbits'] * header.get('nchans', 1) * header.get('nifs', 1)
+            header['nspectra'] = (size - hdrbytes) * 8 // bits_per_spectrum
+        headers[fname] = header
+    cache.save()
+
+    if not args.quiet:
+        keys = args.keys + ['nspectra']
+        print('\t'.join(['file'] + keys))
+        for fname, header in headers.items():
+            print('\t'.join([fname] + [str(header.get(key)) for key in keys]))
+
+    mismatches = check_consistency(headers, args.keys)
+    for fname, key, value, reference in mismatches:
+        print(f'{fname}: {key} = {value}, expected {reference}', file=sys.stderr)
+    if mismatches:
+        sys.exit(1)
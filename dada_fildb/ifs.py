@@ -0,0 +1,157 @@
+import threading
+
+import numpy as np
+
+from .wrapper import FilterbankWrapper, accumulator_dtype, sum_to_mean
+
+# which IFs of data with multiple IFs are written to the ringbuffer
+IF_MODES = ('first', 'all', 'sum')
+
+
+class SpectraCache:
+    """
+    The most recent read of all IFs of a filterbank, shared by the IF streams of one beam
+    so that the file is read only once for all of them.
+    Each thread has its own cache, the IF streams of a beam must be read one after the other on the same thread
+
+    :param SigprocFile filterbank: input filterbank with multiple IFs
+    """
+
+    def __init__(self, filterbank):
+        self.filterbank = filterbank
+        self._local = threading.local()
+
+    def get_spectra(self, nstart, nsamp, chan_start=0, nchan=None):
+        """
+        Return nsamp time slices of all IFs starting at nstart, read from the file only if the previous read differs
+
+        :param int nstart: Starting spectra number to start reading from.
+        :param int nsamp: Number of spectra to read.
+        :param int chan_start: First channel to read.
+        :param int nchan: Number of channels to read, default is up to the last channel.
+        :return: array with shape (time, IF, frequency)
+        """
+        key = (int(nstart), int(nsamp), chan_start, nchan)
+        cached = getattr(self._local, 'cached', None)
+        if cached is None or cached[0] != key:
+            cached = (key, self.filterbank.get_spectra(*key))
+            self._local.cached = cached
+        return cached[1]
+
+
+class IFFile(FilterbankWrapper):
+    """
+    One IF of a filterbank with multiple IFs, or the mean of several of its IFs, read as a filterbank with one IF.
+    The mean is computed in a wider accumulator type and converted back to the data type of the input,
+    so 8-bit data stays 8-bit. All other attributes are taken from the wrapped filterbank.
+
+    :param SigprocFile filterbank: input filterbank
+    :param tuple ifs: indices of the IFs to read, the mean is taken if there is more than one
+    :param SpectraCache cache: reads shared with the other IF streams of the filterbank,
+                               default is to read the filterbank directly
+    """
+
+    nifs = 1
+
+    def __init__(self, filterbank, ifs, cache=None):
+        ifs = tuple(ifs)
+        if not ifs or not all(0 <= i < filterbank.nifs for i in ifs):
+            raise ValueError(f'Cannot read IFs {ifs}, the data have {filterbank.nifs} IFs')
+        super().__init__(filterbank)
+        self.ifs = ifs
+        self.cache = cache
+        self.dtype = np.dtype(filterbank.dtype)
+        self._acc_dtype = accumulator_dtype(self.dtype)
+
+    def _buffers(self, nsamp, nchan):
+        """
+        Get the reusable buffers of the calling thread
+
+        :param int nsamp: number of spectra
+        :param int nchan: number of channels
+        :return: accumulator and output buffer with shape (nsamp, nchan)
+        """
+        return self._buffer('acc', (nsamp, nchan), self._acc_dtype), self._buffer('out', (nsamp, nchan), self.dtype)
+
+    def get_data(self, nstart, nsamp, chan_start=0, nchan=None):
+        """
+        Return nsamp time slices starting at nstart.
+        If the mean of several IFs is taken, the returned array is reused by the next call from the same thread
+
+        :param int nstart: Starting spectra number to start reading from.
+        :param int nsamp: Number of spectra to read.
+        :param int chan_start: First channel to read.
+        :param int nchan: Number of channels to read, default is up to the last channel.
+        :return: array with shape (time, frequency)
+        """
+        if self.cache is None and self.ifs == (0, ):
+            # the reader gives the first IF without reading the others
+            return self.filterbank.get_data(nstart, nsamp, chan_start, nchan)
+        reader = self.filterbank if self.cache is None else self.cache
+        spectra = reader.get_spectra(nstart, nsamp, chan_start, nchan)
+        if len(self.ifs) == 1:
+            return spectra[:, self.ifs[0]]
+
+        acc, out = self._buffers(*spectra[:, 0].shape)
+        np.copyto(acc, spectra[:, self.ifs[0]])
+        for i in self.ifs[1:]:
+            np.add(acc, spectra[:, i], out=acc)
+        sum_to_mean(acc, len(self.ifs))
+        np.copyto(out, acc, casting='unsafe')
+        return out
+
+
+class MultiIFFile(FilterbankWrapper):
+    """
+    The IF streams of one beam, written together to the ringbuffer.
+    The header attributes are those of the first stream, nifs is the number of streams.
+
+    :param list streams: reader of each IF, with the same header attributes
+    :param str layout: position of the IF axis in the ringbuffer page, see transpose.page_shape
+    """
+
+    def __init__(self, streams, layout='major'):
+        super().__init__(streams[0])
+        self.streams = streams
+        self.nifs = len(streams)
+        self.layout = layout
+
+    def get_ifs(self, nstart, nsamp):
+        """
+        Return nsamp time slices of each IF starting at nstart.
+        The streams are read one after the other, so that they share a single read of the file
+
+        :param int nstart: Starting spectra number to start reading from.
+        :param int nsamp: Number of spectra to read.
+        :return: list with an array with shape (time, frequency) for each IF
+        """
+        return [stream.get_data(nstart, nsamp) for stream in self.streams]
+
+    def close(self):
+        """
+        Close all streams
+        """
+        for stream in self.streams:
+            stream.close()
+
+
+def split_ifs(filterbank, mode='first'):
+    """
+    Split a filterbank into the IF streams that are written to the ringbuffer
+
+    :param SigprocFile filterbank: input filterbank
+    :param str mode: first: only the first IF,
+                     all: every IF as its own stream, the file is read once for all of them,
+                     sum: total intensity, the mean of the first two IFs
+    :return: list of readers with one IF each, a filterbank with one IF is returned unchanged
+    """
+    if mode not in IF_MODES:
+        raise ValueError(f'Unknown IF mode: {mode}')
+    if filterbank.nifs == 1:
+        return [filterbank]
+    if mode == 'all':
+        cache = SpectraCache(filterbank)
+        return [IFFile(filterbank, (i, ), cache) for i in range(filterbank.nifs)]
+    elif mode == 'sum':
+        return [IFFile(filterbank, (0, 1))]
+    return [IFFile(filterbank, (0, ))]
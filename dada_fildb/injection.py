@@ -0,0 +1,159 @@
+import json
+import logging
+import math
+
+import numpy as np
+
+from .ifs import MultiIFFile
+from .wrapper import FilterbankWrapper
+
+logger = logging.getLogger(__name__)
+
+# dispersion delay constant (s MHz^2 cm^3 / pc)
+DM_CONST = 4148.808
+# FWHM of a Gaussian in units of its standard deviation
+FWHM = 2 * math.sqrt(2 * math.log(2))
+
+
+def load_pulses(fname):
+    """
+    Read the pulses to inject from a text file with one pulse per line:
+    time (s) DM (pc/cm3) width (s) fluence (ms) [beam], lines starting with # are ignored
+
+    :param str fname: path to pulse file
+    :return: list of dicts with time, dm, width, fluence and beam (None for all beams)
+    """
+    pulses = []
+    with open(fname) as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.split('#')[0].strip()
+            if not line:
+                continue
+            values = line.split()
+            if len(values) not in (4, 5):
+                raise ValueError(f'{fname}:{lineno}: expected time, dm, width, fluence and optionally beam, '
+                                 f'got {line}')
+            time, dm, width, fluence = map(float, values[:4])
+            beam = int(values[4]) if len(values) == 5 else None
+            pulses.append({'time': time, 'dm': dm, 'width': width, 'fluence': fluence, 'beam': beam})
+    return pulses
+
+
+def _profile(time, dm, width, fluence, freqs, foff, tsamp):
+    """
+    Dispersed Gaussian pulse, integrated over each sample
+
+    :param float time: arrival time at the highest frequency (s)
+    :param float dm: dispersion measure (pc/cm3)
+    :param float width: intrinsic FWHM (s)
+    :param float fluence: integral of the pulse in each channel (ms)
+    :param np.ndarray freqs: channel frequencies (MHz)
+    :param float foff: channel width (MHz)
+    :param float tsamp: sampling time (s)
+    :return: first sample of each channel, pulse values with shape (nchans, nsample)
+    """
+    arrival = time + DM_CONST * dm * (freqs ** -2 - freqs.max() ** -2)
+    # dispersion smearing within a channel adds to the intrinsic width
+    smearing = 2 * DM_CONST * dm * abs(foff) * freqs ** -3
+    sigma = np.maximum(np.sqrt(width ** 2 + smearing ** 2) / FWHM, 1e-3 * tsamp)
+    half = int(np.ceil(4 * sigma.max() / tsamp)) + 1
+    first = np.floor(arrival / tsamp).astype(np.int64) - half
+    # edges of the samples relative to the arrival time, in units of sigma * sqrt(2)
+    edges = (first[:, None] + np.arange(2 * half + 2)) * tsamp - arrival[:, None]
+    cdf = .5 * (1 + np.vectorize(math.erf)(edges / (sigma[:, None] * math.sqrt(2))))
+    # fluence per sample, converted to the mean value over the sample
+    profile = np.diff(cdf, axis=1) * fluence * 1e-3 / tsamp
+    return first, profile.astype(np.float32)
+
+
+class InjectedFile(FilterbankWrapper):
+    """
+    Filterbank reader that adds dispersed pulses to the data on the fly.
+    The delay and profile of each pulse in each channel are computed once, when reading only the
+    samples covered by a pulse are changed, integer data saturate at the limits of their type.
+    All other attributes are taken from the wrapped filterbank.
+
+    :param SigprocFile filterbank: input filterbank
+    :param list pulses: dicts with the arrival time at the highest frequency (s) from the start of the data,
+                        dm (pc/cm3), intrinsic FWHM width (s) and fluence (ms, in data units)
+    """
+
+    def __init__(self, filterbank, pulses):
+        super().__init__(filterbank)
+        freqs = filterbank.fch1 + np.arange(filterbank.nchans) * filterbank.foff
+        channels = np.arange(filterbank.nchans)
+        self.injections = []
+        for pulse in pulses:
+            first, profile = _profile(pulse['time'], pulse['dm'], pulse['width'], pulse['fluence'],
+                                      freqs, filterbank.foff, filterbank.tsamp)
+            nsample = profile.shape[1]
+            self.injections.append({'pulse': pulse,
+                                    'start': int(first.min()), 'end': int(first.max()) + nsample,
+                                    'rows': first[:, None] + np.arange(nsample),
+                                    'cols': np.repeat(channels[:, None], nsample, axis=1),
+                                    'profile': profile,
+                                    'fref': float(freqs.max()),
+                                    'peak': float(profile.max())})
+
+    def get_data(self, nstart, nsamp):
+        """
+        Return nsamp time slices starting at nstart, with the pulses that overlap them added.
+        If pulses were added, the returned array is reused by the next call from the same thread
+
+        :param int nstart: Starting spectra number to start reading from.
+        :param int nsamp: Number of spectra to read.
+        :return: array with shape (time, frequency)
+        """
+        data = self.filterbank.get_data(nstart, nsamp)
+        nstart = int(nstart)
+        nend = nstart + len(data)
+        hits = [injection for injection in self.injections
+                if injection['start'] < nend and injection['end'] > nstart]
+        if not hits:
+            return data
+
+        out = self._buffer('out', data.shape, data.dtype)
+        np.copyto(out, data)
+        for injection in hits:
+            rows = injection['rows'] - nstart
+            mask = (rows >= 0) & (rows < len(data))
+            rows = rows[mask]
+            cols = injection['cols'][mask]
+            values = out[rows, cols] + injection['profile'][mask]
+            if np.issubdtype(out.dtype, np.integer):
+                info = np.iinfo(out.dtype)
+                values = np.clip(np.rint(values), info.min, info.max)
+            out[rows, cols] = values
+        return out
+
+
+def write_log(fname, filterbanks, pagesize):
+    """
+    Write where pulses were injected, one JSON line per pulse per beam
+
+    :param str fname: path to log file
+    :param list filterbanks: reader of each beam, beams without pulses are skipped
+    :param int pagesize: number of time samples per page
+    """
+    with open(fname, 'w') as f:
+        for beam, filterbank in enumerate(filterbanks):
+            if isinstance(filterbank, MultiIFFile):
+                # the same pulses are injected into every IF
+                filterbank = filterbank.streams[0]
+            if not isinstance(filterbank, InjectedFile):
+                continue
+            for injection in filterbank.injections:
+                pulse = injection['pulse']
+                start = max(injection['start'], 0)
+                end = min(injection['end'], int(filterbank.nspectra()))
+                entry = {'beam': beam, 'time': pulse['time'], 'dm': pulse['dm'], 'width': pulse['width'],
+                         'fluence': pulse['fluence'], 'fref': injection['fref'],
+                         'mjd': filterbank.tstart + pulse['time'] / 86400.,
+                         'sample': int(np.floor(pulse['time'] / filterbank.tsamp)),
+                         'start_sample': start, 'end_sample': end,
+                         'first_page': start // pagesize, 'last_page': (end - 1) // pagesize,
+                         'peak': injection['peak'], 'injected': bool(end > start)}
+                if end <= start:
+                    logger.warning(f'Pulse at {pulse["time"]} s with DM {pulse["dm"]} in beam {beam} '
+                                   f'is outside of the data')
+                f.write(json.dumps(entry) + '\n')
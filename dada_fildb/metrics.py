@@ -0,0 +1,233 @@
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left
+from time import perf_counter, time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# stages of the page pipeline
+STAGES = ('read', 'reorder', 'correct', 'copy', 'prefetch', 'wait')
+STAGE_DESCRIPTION = {'read': 'reading filterbank data',
+                     'reorder': 'converting data to ringbuffer order',
+                     'correct': 'masking channels and normalising the bandpass',
+                     'copy': 'copying prepared pages into the ringbuffer',
+                     'prefetch': 'waiting for pages that are read ahead',
+                     'wait': 'waiting for a free ringbuffer page'}
+# upper bounds of the histogram buckets (s), four per decade
+BUCKETS = tuple(float(f'{b:.3g}') for b in np.logspace(-6, 2, 33))
+
+
+class Histogram:
+    """
+    Histogram of durations, with cumulative counts and counts since the last reset of the window
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.window_counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.
+        self.max = 0.
+        self.window_count = 0
+        self.window_sum = 0.
+        self.nbyte = 0
+
+    def add(self, value, nbyte=0):
+        """
+        Add a duration
+
+        :param float value: duration (s)
+        :param int nbyte: number of bytes processed
+        """
+        ind = bisect_left(BUCKETS, value)
+        self.counts[ind] += 1
+        self.window_counts[ind] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.window_count += 1
+        self.window_sum += value
+        self.nbyte += nbyte
+
+    def reset_window(self):
+        """
+        Start a new window
+        """
+        self.window_counts = [0] * (len(BUCKETS) + 1)
+        self.window_count = 0
+        self.window_sum = 0.
+
+    @staticmethod
+    def quantile(counts, q):
+        """
+        Estimate a quantile from bucket counts
+
+        :param list counts: counts per bucket
+        :param float q: quantile (0-1)
+        :return: upper bound of the bucket that contains the quantile, None if there are no counts
+        """
+        total = sum(counts)
+        if total == 0:
+            return None
+        cumulative = np.cumsum(counts)
+        ind = int(np.searchsorted(cumulative, q * total))
+        if ind >= len(BUCKETS):
+            return float('inf')
+        return BUCKETS[ind]
+
+
+class Metrics:
+    """
+    Timing of the stages of the page pipeline, with periodic export to a JSON lines file
+    and a Prometheus text-format file
+
+    :param str prefix: path prefix of the output files, <prefix>.jsonl and <prefix>.prom.
+                       If None, nothing is written
+    :param float interval: minimum time between exports (s)
+    :param dict labels: labels added to all Prometheus metrics
+    """
+
+    def __init__(self, prefix=None, interval=10., labels=None):
+        self.prefix = prefix
+        self.interval = interval
+        self.labels = labels or {}
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.npage = 0
+        self.nbyte = 0
+        self._window_npage = 0
+        self._window_nbyte = 0
+        self._lock = threading.Lock()
+        # serialises exports, which share a temporary file
+        self._export_lock = threading.Lock()
+        self._start = perf_counter()
+        self._last_export = self._start
+
+    def record(self, stage, seconds, nbyte=0):
+        """
+        Record the duration of a stage
+
+        :param str stage: name of the stage
+        :param float seconds: duration (s)
+        :param int nbyte: number of bytes processed
+        """
+        with self._lock:
+            self.stages[stage].add(seconds, nbyte)
+
+    def page_done(self, nbyte):
+        """
+        Record a page written to the ringbuffer, export the metrics if the interval has passed
+
+        :param int nbyte: size of the page
+        """
+        with self._lock:
+            self.npage += 1
+            self.nbyte += nbyte
+            self._window_npage += 1
+            self._window_nbyte += nbyte
+        # a page is not held up by an export that is already running in another thread
+        if perf_counter() - self._last_export < self.interval or not self._export_lock.acquire(blocking=False):
+            return
+        try:
+            # another thread may have exported since the first check
+            if perf_counter() - self._last_export >= self.interval:
+                self._export()
+        finally:
+            self._export_lock.release()
+
+    def snapshot(self):
+        """
+        Current state of the metrics, the window statistics cover the time since the previous snapshot
+
+        :return: dict
+        """
+        now = perf_counter()
+        with self._lock:
+            window = now - self._last_export
+            result = {'time': time(), 'elapsed': now - self._start, 'window': window,
+                      'pages': self.npage, 'bytes': self.nbyte,
+                      'pages_per_second': self._window_npage / window if window > 0 else 0.,
+                      'bytes_per_second': self._window_nbyte / window if window > 0 else 0.,
+                      'stages': {}}
+            for stage, hist in self.stages.items():
+                result['stages'][stage] = {'count': hist.count, 'seconds': hist.sum, 'max': hist.max,
+                                           'bytes': hist.nbyte,
+                                           'window_count': hist.window_count, 'window_seconds': hist.window_sum,
+                                           'window_p50': hist.quantile(hist.window_counts, .5),
+                                           'window_p99': hist.quantile(hist.window_counts, .99)}
+                hist.reset_window()
+            self._window_npage = 0
+            self._window_nbyte = 0
+            self._last_export = now
+        return result
+
+    def prometheus(self):
+        """
+        Metrics in Prometheus text format
+
+        :return: str
+        """
+        labels = ''.join(f'{k}="{v}",' for k, v in self.labels.items())
+        lines = ['# HELP dada_fildb_stage_seconds Time spent per page in each stage of the page pipeline',
+                 '# TYPE dada_fildb_stage_seconds histogram']
+        with self._lock:
+            for stage, hist in self.stages.items():
+                cumulative = np.cumsum(hist.counts)
+                for bound, count in zip(BUCKETS, cumulative):
+                    lines.append(f'dada_fildb_stage_seconds_bucket{{{labels}stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'dada_fildb_stage_seconds_bucket{{{labels}stage="{stage}",le="+Inf"}} {hist.count}')
+                lines.append(f'dada_fildb_stage_seconds_sum{{{labels}stage="{stage}"}} {hist.sum}')
+                lines.append(f'dada_fildb_stage_seconds_count{{{labels}stage="{stage}"}} {hist.count}')
+            lines += ['# HELP dada_fildb_stage_bytes_total Bytes processed in each stage of the page pipeline',
+                      '# TYPE dada_fildb_stage_bytes_total counter']
+            for stage, hist in self.stages.items():
+                lines.append(f'dada_fildb_stage_bytes_total{{{labels}stage="{stage}"}} {hist.nbyte}')
+            labels = labels.rstrip(',')
+            lines += ['# HELP dada_fildb_pages_total Pages written to the ringbuffer',
+                      '# TYPE dada_fildb_pages_total counter',
+                      f'dada_fildb_pages_total{{{labels}}} {self.npage}',
+                      '# HELP dada_fildb_bytes_total Bytes written to the ringbuffer',
+                      '# TYPE dada_fildb_bytes_total counter',
+                      f'dada_fildb_bytes_total{{{labels}}} {self.nbyte}']
+        return '\n'.join(lines) + '\n'
+
+    def export(self):
+        """
+        Append a snapshot to the JSON lines file and rewrite the Prometheus file
+        """
+        with self._export_lock:
+            self._export()
+
+    def _export(self):
+        """
+        Export the metrics, the caller holds the export lock
+        """
+        snapshot = self.snapshot()
+        if self.prefix is None:
+            return
+        with open(f'{self.prefix}.jsonl', 'a') as f:
+            f.write(json.dumps(snapshot) + '\n')
+        # write to a temporary file first, so readers never see a partial file
+        fname = f'{self.prefix}.prom'
+        with open(f'{fname}.tmp', 'w') as f:
+            f.write(self.prometheus())
+        os.replace(f'{fname}.tmp', fname)
+
+    def summary(self):
+        """
+        Export the final metrics and log a summary
+        """
+        self.export()
+        elapsed = perf_counter() - self._start
+        logger.info(f'Wrote {self.npage} pages ({self.nbyte / 1e9:.3f} GB) in {elapsed:.3f} s '
+                    f'({self.nbyte / elapsed / 1e9:.3f} GB/s)')
+        for stage, hist in self.stages.items():
+            if hist.count == 0:
+                continue
+            logger.info(f'{STAGE_DESCRIPTION[stage]}: {hist.sum:.3f} s total, {hist.count} calls, '
+                        f'mean {hist.sum / hist.count * 1e3:.3f} ms, '
+                        f'p99 {min(Histogram.quantile(hist.counts, .99), hist.max) * 1e3:.3f} ms, '
+                        f'max {hist.max * 1e3:.3f} ms')
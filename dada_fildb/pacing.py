@@ -0,0 +1,79 @@
+import logging
+from time import monotonic, sleep
+
+logger = logging.getLogger(__name__)
+
+
+class Pacer:
+    """
+    Release ringbuffer pages on a fixed schedule.
+    Page n is due at start + (n + 1) * interval, where start is the time of the first call to start().
+    Deadlines are absolute, so errors in individual sleeps do not accumulate.
+
+    :param float interval: time between pages (s)
+    """
+
+    def __init__(self, interval):
+        if interval <= 0:
+            raise ValueError(f'Page interval must be positive, got {interval}')
+        self.interval = interval
+        self._start = None
+        # lateness statistics
+        self.npage = 0
+        self.nlate = 0
+        self.total_lateness = 0.
+        self.max_lateness = 0.
+
+    def start(self):
+        """
+        Start the schedule now
+        """
+        self._start = monotonic()
+
+    def schedule(self, page):
+        """
+        Get the time until page is due and record its lateness, without waiting
+
+        :param int page: page number
+        :return: time to wait (s), zero if the page is already due, and lateness (s) of the page
+        """
+        if self._start is None:
+            self.start()
+        deadline = self._start + (page + 1) * self.interval
+        now = monotonic()
+        if now < deadline:
+            lateness = 0.
+        else:
+            lateness = now - deadline
+            self.nlate += 1
+            self.total_lateness += lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+        self.npage += 1
+        logger.debug(f'Page {page} lateness: {lateness:.6f} s')
+        return max(deadline - now, 0.), lateness
+
+    def wait(self, page):
+        """
+        Wait until page is due
+
+        :param int page: page number
+        :return: lateness (s) of the page, zero if the page was ready in time
+        """
+        remaining, lateness = self.schedule(page)
+        if remaining > 0:
+            sleep(remaining)
+        return lateness
+
+    def summary(self):
+        """
+        Log a summary of the lateness of all pages
+        """
+        if self.npage == 0:
+            return
+        mean_lateness = self.total_lateness / self.npage
+        msg = (f'{self.nlate} of {self.npage} pages late, mean lateness {mean_lateness:.6f} s, '
+               f'max lateness {self.max_lateness:.6f} s')
+        if self.nlate > 0:
+            logger.warning(msg)
+        else:
+            logger.info(msg)
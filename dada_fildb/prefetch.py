@@ -0,0 +1,76 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import numpy as np
+
+
+class Prefetcher:
+    """
+    Read pages ahead of the ringbuffer writer on background threads.
+    Each page is assembled into one of a fixed pool of page buffers, which are reused once
+    the page has been copied into the ringbuffer.
+
+    :param callable fill: function(page, out) that writes page number page into uint8 array out
+    :param int nbyte: size of one page in bytes
+    :param int npage: total number of pages, None if unknown
+    :param int nprefetch: number of pages to read ahead
+    :param Metrics metrics: if given, record the time spent waiting for pages and copying them
+    """
+
+    def __init__(self, fill, nbyte, npage, nprefetch, metrics=None):
+        if nprefetch < 1:
+            raise ValueError(f'Number of pages to prefetch must be at least 1, got {nprefetch}')
+        self._fill = fill
+        self.npage = npage
+        self.metrics = metrics
+        self._executor = ThreadPoolExecutor(max_workers=nprefetch, thread_name_prefix='prefetch')
+        self._pending = deque()
+        self._next_page = 0
+        for _ in range(nprefetch):
+            self._submit(np.empty(nbyte, dtype=np.uint8))
+
+    def _load(self, page, buffer):
+        self._fill(page, buffer)
+        return buffer
+
+    def _submit(self, buffer):
+        """
+        Start reading the next page into buffer
+        :param np.ndarray buffer: free page buffer
+        """
+        if self.npage is not None and self._next_page >= self.npage:
+            return
+        future = self._executor.submit(self._load, self._next_page, buffer)
+        self._pending.append((self._next_page, future))
+        self._next_page += 1
+
+    def fill(self, page, out):
+        """
+        Copy the next page into a ringbuffer page. Pages must be requested in order
+
+        :param int page: page number
+        :param np.ndarray out: uint8 view of the ringbuffer page
+        """
+        expected_page, future = self._pending.popleft()
+        if page != expected_page:
+            raise ValueError(f'Pages must be requested in order, expected page {expected_page}, got {page}')
+        tstart = perf_counter()
+        # result re-raises any error that occurred while reading the page
+        buffer = future.result()
+        tready = perf_counter()
+        np.copyto(out, buffer)
+        if self.metrics is not None:
+            self.metrics.record('prefetch', tready - tstart)
+            self.metrics.record('copy', perf_counter() - tready, out.nbytes)
+        # recycle the buffer for the next page
+        self._submit(buffer)
+
+    def close(self):
+        """
+        Stop reading ahead and wait for the background threads to finish
+        """
+        for page, future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=True)
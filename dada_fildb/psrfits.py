@@ -0,0 +1,200 @@
+import threading
+
+import numpy as np
+
+from .sigproc import UNPACK_TABLES
+
+# file name extensions of PSRFITS files
+EXTENSIONS = ('.fits', '.sf')
+# PSRFITS stores the first sample in the most significant bits
+UNPACK_TABLES_MSB = {nbits: np.ascontiguousarray(table[:, ::-1]) for nbits, table in UNPACK_TABLES.items()}
+
+
+def is_psrfits(fname):
+    """
+    Whether a file is PSRFITS, based on its extension
+
+    :param str fname: path to file
+    :return: bool
+    """
+    return fname.lower().endswith(EXTENSIONS)
+
+
+class PsrfitsFile:
+    """
+    Reader of PSRFITS search-mode data with the interface of SigprocFile.
+    The DATA column of the SUBINT table is memory mapped, only the subintegrations that are read are paged in.
+    The data are scaled with DAT_SCL and DAT_OFFS and the polarisations are summed to total intensity,
+    which gives 32-bit floats. Data that need no scaling and have one polarisation are passed through unchanged.
+    Like SIGPROC data, the channels are read with the highest frequency first, with a negative foff,
+    also if the file stores them in ascending frequency order.
+
+    :param str fname: path to file
+    """
+
+    nifs = 1
+
+    def __init__(self, fname):
+        # astropy is only imported when PSRFITS data are read, it dominates the startup time otherwise
+        from astropy.io import fits
+
+        self.fname = fname
+        self.hdul = fits.open(fname, memmap=True)
+        primary = self.hdul[0].header
+        subint = self.hdul['SUBINT']
+        header = subint.header
+        data = subint.data
+
+        self.nsblk = header['NSBLK']
+        self.npol = header['NPOL']
+        self.nchans = header['NCHAN']
+        self.nbits_in = header['NBITS']
+        self.nsubint = header['NAXIS2']
+        zero_off = header.get('ZERO_OFF', 0.) or 0.
+        if self.nbits_in not in (1, 2, 4, 8):
+            raise ValueError(f'{fname} has {self.nbits_in}-bit data, only 1, 2, 4 and 8-bit PSRFITS data '
+                             f'are supported')
+        self.tsamp = header['TBIN']
+        freqs = data['DAT_FREQ'][0]
+        foff = float(header.get('CHAN_BW') or (freqs[1] - freqs[0]))
+        # the data are read with the highest frequency first, like SIGPROC data,
+        # files with ascending frequencies are read with the channels reversed
+        self._flip = foff > 0
+        if self._flip:
+            self.fch1 = float(freqs[-1])
+            self.foff = -foff
+        else:
+            self.fch1 = float(freqs[0])
+            self.foff = foff
+        nsuboffs = header.get('NSUBOFFS', 0) or 0
+        self.tstart = (primary['STT_IMJD'] + (primary['STT_SMJD'] + primary['STT_OFFS']) / 86400.
+                       + nsuboffs * self.nsblk * self.tsamp / 86400.)
+        self.source_name = primary.get('SRC_NAME', '')
+        # as HH:MM:SS strings, the form used in the PSRDADA header
+        self.src_raj = primary.get('RA', '00:00:00')
+        self.src_dej = primary.get('DEC', '00:00:00')
+        self.az_start = float(data['TEL_AZ'][0]) if 'TEL_AZ' in data.names else 0.
+        self.za_start = float(data['TEL_ZEN'][0]) if 'TEL_ZEN' in data.names else 0.
+
+        # polarisations that add up to total intensity
+        pol_type = header.get('POL_TYPE', 'AA+BB')
+        if self.npol == 1 or pol_type.startswith('IQUV'):
+            self._pols = [0]
+        else:
+            self._pols = [0, 1]
+
+        # raw bytes of each subintegration, a view of the memory map
+        self._data = data['DATA'].reshape(self.nsubint, -1)
+        self._bytes_per_sample = self.nchans * self.nbits_in // 8
+        scale = np.asarray(data['DAT_SCL'], dtype=np.float32).reshape(self.nsubint, -1, self.nchans)
+        offset = np.asarray(data['DAT_OFFS'], dtype=np.float32).reshape(self.nsubint, -1, self.nchans)
+        # older files have a single scale and offset for all polarisations
+        scale = np.broadcast_to(scale, (self.nsubint, self.npol, self.nchans))
+        offset = np.broadcast_to(offset, (self.nsubint, self.npol, self.nchans))
+        if self._flip:
+            scale = scale[..., ::-1]
+            offset = offset[..., ::-1]
+        # value = (raw - ZERO_OFF) * DAT_SCL + DAT_OFFS, summed over the polarisations
+        self._scale = np.ascontiguousarray(scale[:, self._pols])
+        self._offset = (offset[:, self._pols] - zero_off * scale[:, self._pols]).sum(axis=1).astype(np.float32)
+        self.raw = (len(self._pols) == 1 and self.nbits_in <= 8
+                    and np.all(self._scale == 1) and np.all(self._offset == 0))
+        if self.raw:
+            self.nbits = self.nbits_in
+            self.dtype = np.dtype(np.uint8)
+        else:
+            self.nbits = 32
+            self.dtype = np.dtype(np.float32)
+        self._local = threading.local()
+
+    def nspectra(self):
+        """
+        Returns: Number of spectra in the file
+        """
+        return self.nsubint * self.nsblk
+
+    def refresh(self):
+        """
+        PSRFITS files cannot be followed while they are being written
+
+        :return: False
+        """
+        return False
+
+    def _samples(self, row, start, end, chan_start, nchan):
+        """
+        Unpacked samples of one subintegration
+
+        :param int row: subintegration
+        :param int start: first sample in the subintegration
+        :param int end: end sample in the subintegration
+        :param int chan_start: first channel, counted from the highest frequency
+        :param int nchan: number of channels
+        :return: uint8 array with shape (time, polarisation, frequency), highest frequency first
+        """
+        raw = self._data[row].reshape(self.nsblk, self.npol, self._bytes_per_sample)[start:end]
+        if self.nbits_in < 8:
+            raw = np.take(UNPACK_TABLES_MSB[self.nbits_in], raw, axis=0).reshape(end - start, self.npol, -1)
+        if self._flip:
+            # a reversed view, channel c is channel nchans - 1 - c of the file
+            raw = raw[:, :, ::-1]
+        return raw[:, :, chan_start:chan_start + nchan]
+
+    def _buffer(self, nsamp, nchan):
+        """
+        Get the reusable buffers of the calling thread
+
+        :param int nsamp: number of spectra
+        :param int nchan: number of channels
+        :return: output and scratch arrays with shape (nsamp, nchan)
+        """
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None or buffers[0].shape[0] < nsamp or buffers[0].shape[1] != nchan:
+            buffers = (np.empty((nsamp, nchan), dtype=self.dtype), np.empty((nsamp, nchan), dtype=np.float32))
+            self._local.buffers = buffers
+        return buffers[0][:nsamp], buffers[1][:nsamp]
+
+    def get_data(self, nstart, nsamp, chan_start=0, nchan=None):
+        """
+        Return nsamp time slices starting at nstart.
+        The returned array is reused by the next call from the same thread
+
+        :param int nstart: Starting spectra number to start reading from.
+        :param int nsamp: Number of spectra to read.
+        :param int chan_start: First channel to read.
+        :param int nchan: Number of channels to read, default is up to the last channel.
+        :return: array with shape (time, frequency)
+        """
+        if nchan is None:
+            nchan = self.nchans - chan_start
+        nstart = int(nstart)
+        nsamp = max(min(int(nsamp), self.nspectra() - nstart), 0)
+        row, start = divmod(nstart, self.nsblk)
+        if self.raw and nsamp > 0 and start + nsamp <= self.nsblk:
+            # within one subintegration the data can be returned without copying
+            return self._samples(row, start, start + nsamp, chan_start, nchan)[:, 0]
+        out, scratch = self._buffer(nsamp, nchan)
+        chans = slice(chan_start, chan_start + nchan)
+        sample = nstart
+        while sample < nstart + nsamp:
+            # one subintegration at a time, each has its own scale and offset
+            row, start = divmod(sample, self.nsblk)
+            end = min(self.nsblk, start + nstart + nsamp - sample)
+            samples = self._samples(row, start, end, chan_start, nchan)
+            rows = slice(sample - nstart, sample - nstart + end - start)
+            if self.raw:
+                out[rows] = samples[:, 0]
+            else:
+                np.multiply(samples[:, self._pols[0]], self._scale[row, 0, chans], out=out[rows])
+                for i, pol in enumerate(self._pols[1:], 1):
+                    np.multiply(samples[:, pol], self._scale[row, i, chans], out=scratch[rows])
+                    np.add(out[rows], scratch[rows], out=out[rows])
+                np.add(out[rows], self._offset[row, chans], out=out[rows])
+            sample += end - start
+        return out
+
+    def close(self):
+        """
+        Close the file
+        """
+        self.hdul.close()
@@ -0,0 +1,102 @@
+import threading
+
+import numpy as np
+
+from .wrapper import FilterbankWrapper
+
+
+class RequantizedFile(FilterbankWrapper):
+    """
+    Filterbank reader that requantizes 16 or 32-bit data to 8 bits on the fly.
+    Each channel is scaled to mean 128 and a standard deviation of 128 / nsigma, values are rounded and clipped.
+    All other attributes are taken from the wrapped filterbank.
+
+    :param SigprocFile filterbank: input filterbank
+    :param str mode: block: estimate the offset and scale from the first nstat spectra,
+                     running: update them with the statistics of every page that is read.
+                     In running mode the data must be read in order, each spectrum once
+    :param int nstat: number of leading spectra used to estimate the offset and scale in block mode
+    :param float nsigma: number of standard deviations between the mean and the edges of the 8-bit range
+    """
+
+    nbits = 8
+    dtype = np.uint8
+
+    def __init__(self, filterbank, mode='block', nstat=8192, nsigma=6.):
+        if mode not in ('block', 'running'):
+            raise ValueError(f'Unknown requantization mode: {mode}')
+        super().__init__(filterbank)
+        self.mode = mode
+        self.nsigma = nsigma
+        self._lock = threading.Lock()
+        # running sums of the number of samples, values and squared values per channel
+        self._count = 0
+        # first spectrum that is not in the running statistics yet
+        self._end = 0
+        self._sum = np.zeros(filterbank.nchans)
+        self._sumsq = np.zeros(filterbank.nchans)
+        self.scale = np.zeros(filterbank.nchans, dtype=np.float32)
+        self.offset = np.full(filterbank.nchans, 128.5, dtype=np.float32)
+        # the output depends on the data read before, so reads cannot be reordered or repeated
+        self.stateful = mode == 'running'
+        if mode == 'block':
+            self._update(filterbank.get_data(0, nstat).astype(np.float32))
+
+    def _update(self, data, nstart=0):
+        """
+        Add a block of data to the statistics and recompute the offset and scale
+
+        :param np.ndarray data: float32 block with shape (time, frequency)
+        :param int nstart: first spectrum of the block, which must follow the data already added
+        :return: scale and offset including this block
+        """
+        block_sum = data.sum(axis=0, dtype=np.float64)
+        block_sumsq = np.einsum('ij,ij->j', data, data, dtype=np.float64)
+        with self._lock:
+            if nstart != self._end:
+                raise ValueError(f'Running requantization statistics must be updated in order, '
+                                 f'expected spectrum {self._end}, got {nstart}')
+            self._end += len(data)
+            self._count += len(data)
+            self._sum += block_sum
+            self._sumsq += block_sumsq
+            mean = self._sum / self._count
+            std = np.sqrt(np.maximum(self._sumsq / self._count - mean ** 2, 0))
+            # output = data * scale + offset, constant channels are set to the mean value.
+            # the extra .5 in the offset turns truncation to uint8 into rounding
+            scale = np.divide(128. / self.nsigma, std, out=np.zeros_like(std), where=std > 0)
+            self.scale = scale.astype(np.float32)
+            self.offset = (128.5 - mean * scale).astype(np.float32)
+            return self.scale, self.offset
+
+    def _buffers(self, nsamp):
+        """
+        Get the reusable buffers of the calling thread
+
+        :param int nsamp: number of spectra
+        :return: float32 and uint8 buffers with shape (nsamp, nchans)
+        """
+        shape = (nsamp, self.filterbank.nchans)
+        return self._buffer('work', shape, np.float32), self._buffer('out', shape, np.uint8)
+
+    def get_data(self, nstart, nsamp):
+        """
+        Return nsamp requantized time slices starting at nstart.
+        The returned array is reused by the next call from the same thread
+
+        :param int nstart: Starting spectra number to start reading from.
+        :param int nsamp: Number of spectra to read.
+        :return: uint8 array with shape (time, frequency)
+        """
+        data = self.filterbank.get_data(nstart, nsamp)
+        work, out = self._buffers(len(data))
+        np.copyto(work, data, casting='unsafe')
+        if self.mode == 'running':
+            scale, offset = self._update(work, nstart)
+        else:
+            scale, offset = self.scale, self.offset
+        np.multiply(work, scale, out=work)
+        np.add(work, offset, out=work)
+        np.clip(work, 0, 255, out=work)
+        np.copyto(out, work, casting='unsafe')
+        return out
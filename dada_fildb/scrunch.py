@@ -0,0 +1,80 @@
+import numpy as np
+
+from .wrapper import FilterbankWrapper, accumulator_dtype, sum_to_mean
+
+
+class ScrunchedFile(FilterbankWrapper):
+    """
+    Filterbank reader that reduces the time and frequency resolution on the fly.
+    Each output sample is the mean of tscrunch consecutive spectra and fscrunch adjacent channels,
+    summed in a wider accumulator type and converted back to the data type of the input.
+    The header attributes (tsamp, nchans, fch1, foff) and number of spectra describe the reduced data,
+    all other attributes are taken from the wrapped filterbank.
+
+    :param SigprocFile filterbank: input filterbank
+    :param int tscrunch: number of spectra to add
+    :param int fscrunch: number of channels to add, must divide the number of channels
+    """
+
+    def __init__(self, filterbank, tscrunch=1, fscrunch=1):
+        if tscrunch < 1 or fscrunch < 1:
+            raise ValueError(f'Scrunch factors must be at least 1, got tscrunch={tscrunch}, fscrunch={fscrunch}')
+        if filterbank.nchans % fscrunch != 0:
+            raise ValueError(f'Number of channels ({filterbank.nchans}) is not divisible by fscrunch={fscrunch}')
+        super().__init__(filterbank)
+        self.tscrunch = tscrunch
+        self.fscrunch = fscrunch
+        self.tsamp = filterbank.tsamp * tscrunch
+        self.nchans = filterbank.nchans // fscrunch
+        self.foff = filterbank.foff * fscrunch
+        # centre frequency of the first group of channels
+        self.fch1 = filterbank.fch1 + .5 * (fscrunch - 1) * filterbank.foff
+        self.dtype = np.dtype(filterbank.dtype)
+        self._acc_dtype = accumulator_dtype(self.dtype)
+
+    def nspectra(self):
+        """
+        Returns: Number of complete output spectra
+        """
+        return int(self.filterbank.nspectra()) // self.tscrunch
+
+    def _buffers(self, nsamp):
+        """
+        Get the reusable buffers of the calling thread
+
+        :param int nsamp: number of output spectra
+        :return: accumulators with shape (nsamp, input nchans) and (nsamp, nchans), output buffer
+        """
+        return (self._buffer('tacc', (nsamp, self.filterbank.nchans), self._acc_dtype),
+                self._buffer('acc', (nsamp, self.nchans), self._acc_dtype),
+                self._buffer('out', (nsamp, self.nchans), self.dtype))
+
+    def get_data(self, nstart, nsamp):
+        """
+        Return nsamp reduced time slices starting at nstart.
+        The returned array is reused by the next call from the same thread
+
+        :param int nstart: Starting output spectrum number to start reading from.
+        :param int nsamp: Number of output spectra to read.
+        :return: array with shape (time, frequency)
+        """
+        if self.tscrunch == 1 and self.fscrunch == 1:
+            return self.filterbank.get_data(nstart, nsamp)
+        data = self.filterbank.get_data(int(nstart) * self.tscrunch, int(nsamp) * self.tscrunch)
+        # only complete groups of spectra
+        nout = len(data) // self.tscrunch
+        tacc, acc, out = self._buffers(nout)
+        # adding whole slices is much faster than a sum over the reshaped axes
+        blocks = data[:nout * self.tscrunch].reshape(nout, self.tscrunch, self.filterbank.nchans)
+        np.copyto(tacc, blocks[:, 0])
+        for i in range(1, self.tscrunch):
+            np.add(tacc, blocks[:, i], out=tacc)
+        if self.fscrunch == 1:
+            acc = tacc
+        else:
+            np.copyto(acc, tacc[:, ::self.fscrunch])
+            for i in range(1, self.fscrunch):
+                np.add(acc, tacc[:, i::self.fscrunch], out=acc)
+        sum_to_mean(acc, self.tscrunch * self.fscrunch)
+        np.copyto(out, acc, casting='unsafe')
+        return out
@@ -0,0 +1,63 @@
+from .wrapper import FilterbankWrapper
+
+
+class SelectedFile(FilterbankWrapper):
+    """
+    Time window and channel range of a filterbank, read as a filterbank of its own.
+    The header attributes (tstart, fch1, nchans) and number of spectra describe the selection,
+    all other attributes are taken from the wrapped filterbank.
+
+    :param SigprocFile filterbank: input filterbank
+    :param int start: first spectrum of the window
+    :param int nsamp: number of spectra in the window, default is up to the end of the file,
+                      also if the file is still growing
+    :param int chan_start: first channel of the selection, in the channel order of the file
+    :param int nchan: number of channels in the selection, default is up to the last channel
+    """
+
+    def __init__(self, filterbank, start=0, nsamp=None, chan_start=0, nchan=None):
+        super().__init__(filterbank)
+        total = int(filterbank.nspectra())
+        if nchan is None:
+            nchan = filterbank.nchans - chan_start
+        if not 0 <= start < total:
+            raise ValueError(f'Start sample {start} is outside of the file, which has {total} samples')
+        if nsamp is not None and nsamp < 1:
+            raise ValueError(f'Duration must be at least one sample, got {nsamp} samples')
+        if not (0 <= chan_start and nchan > 0 and chan_start + nchan <= filterbank.nchans):
+            raise ValueError(f'Channels {chan_start}:{chan_start + nchan} are outside of the file, '
+                             f'which has {filterbank.nchans} channels')
+        self.start = start
+        self.nsamp = nsamp
+        self.chan_start = chan_start
+        self.nchans = nchan
+        self.tstart = filterbank.tstart + start * filterbank.tsamp / 86400.
+        self.fch1 = filterbank.fch1 + chan_start * filterbank.foff
+
+    def nspectra(self):
+        """
+        Returns: Number of spectra in the selection
+        """
+        available = int(self.filterbank.nspectra()) - self.start
+        if self.nsamp is None:
+            return available
+        return min(self.nsamp, available)
+
+    def complete(self):
+        """
+        Returns: Whether the whole window is available, after which the selection does not grow with the file.
+            Always False if the window extends up to the end of the file
+        """
+        return self.nsamp is not None and int(self.filterbank.nspectra()) - self.start >= self.nsamp
+
+    def get_data(self, nstart, nsamp):
+        """
+        Return nsamp time slices of the selection starting at nstart.
+
+        :param int nstart: Starting spectra number to start reading from, relative to the start of the selection.
+        :param int nsamp: Number of spectra to read.
+        :return: np.ndarray: data.
+        """
+        nstart = int(nstart)
+        nsamp = max(min(int(nsamp), self.nspectra() - nstart), 0)
+        return self.filterbank.get_data(self.start + nstart, nsamp, self.chan_start, self.nchans)
@@ -1,13 +1,34 @@
 #!/usr/bin/env python
 
+import logging
 import mmap
 import os
 import struct
 import sys
+import threading
 from collections import OrderedDict
 
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
+
+def _unpack_table(nbits):
+    """
+    Lookup table of the samples packed into each possible byte value,
+    the first sample is stored in the least significant bits
+    Args:
+        nbits (int): Number of bits per sample
+    Returns:
+        np.ndarray: (256, 8 // nbits) table of uint8 samples
+    """
+    shifts = np.arange(8 // nbits, dtype=np.uint8) * nbits
+    return (np.arange(256, dtype=np.uint8)[:, None] >> shifts) & np.uint8(2 ** nbits - 1)
+
+
+# lookup tables for all supported sub-byte sample sizes
+UNPACK_TABLES = {nbits: _unpack_table(nbits) for nbits in (1, 2, 4)}
+
 
 class SigprocFile:
     """
@@ -15,6 +36,11 @@ class SigprocFile:
     Original Source from Paul Demorest's [pysigproc.py](https://github.com/demorest/pysigproc/blob/master/pysigproc.py).
     Args:
         fp (str): file name
+        backend (str): how data is read: copy: copy from a memory map of the file,
+            mmap: return read-only views of the memory map, with kernel readahead hints for sequential reading,
+            pread: read into a reusable buffer with pread, without memory mapping the file.
+            The mmap and pread backends drop data that has been read from the page cache
+        header_cache (HeaderCache): cache to get the header from instead of parsing the file
         copy_hdr (bool): copy header from another SigprocFile class object
     Attributes:
         rawdatafile (str): Raw data file
@@ -59,18 +85,48 @@ class SigprocFile:
     _type["tstart"] = "double"
     _type["tsamp"] = "double"
     _type["nifs"] = "int"
+    _type["refdm"] = "double"
+    _type["period"] = "double"
+    _type["nsamples"] = "int"
+
+    backends = ("copy", "mmap", "pread")
 
-    def __init__(self, fname):
+    def __init__(self, fname, backend="copy", header_cache=None):
         # init all items to None
         for k in list(self._type.keys()):
             setattr(self, k, None)
 
-        if os.path.isfile(fname) and os.stat(fname).st_size != 0:
-            self.fp = open(fname, 'rb')
+        if backend not in self.backends:
+            raise ValueError("Unknown backend: %s" % backend)
+        self.backend = backend
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # end of the region already released from the page cache by the mmap and pread backends
+        self._released = 0
+
+        # a single open and fstat, a file that does not exist yet or is empty has no header
+        try:
+            fp = open(fname, 'rb')
+        except (FileNotFoundError, IsADirectoryError):
+            return
+        filesize = os.fstat(fp.fileno()).st_size
+        if filesize == 0:
+            fp.close()
+            return
+        self.fp = fp
+        self.filesize = filesize
+        if header_cache is None:
             self.read_header()
+        else:
+            header, self.hdrbytes, _ = header_cache.header(fname)
+            for k, v in header.items():
+                setattr(self, k, v)
+        if backend != "pread":
             self._mmdata = mmap.mmap(
                 self.fp.fileno(), 0, mmap.MAP_PRIVATE, mmap.PROT_READ
             )
+        if backend == "mmap" and hasattr(mmap, "MADV_SEQUENTIAL"):
+            self._mmdata.madvise(mmap.MADV_SEQUENTIAL)
 
     @classmethod
     def new_file(cls, fname, header):
@@ -164,39 +220,179 @@ class SigprocFile:
         out = fp.read(nchar)
         return out, nchar + 4
 
-    def read_header(self):
+    @staticmethod
+    def _peek_string(buf, pos):
         """
-        Read the header
+        Decode the sigproc-format string at a position in a buffer.
+        Args:
+            buf (bytes): buffer
+            pos (int): position of the string
+        Returns:
+            string (None if there is no valid string), position after the string
         """
-        self.hdrbytes = 0
-        (s, n) = self.get_string(self.fp)
-        if s != b"HEADER_START":
-            self.hdrbytes = 0
-            return None
-        self.hdrbytes += n
+        if pos + 4 > len(buf):
+            raise EOFError("Header extends beyond buffer")
+        nchar = struct.unpack_from("i", buf, pos)[0]
+        if nchar > 80 or nchar < 1:
+            return None, pos
+        if pos + 4 + nchar > len(buf):
+            raise EOFError("Header extends beyond buffer")
+        return bytes(buf[pos + 4:pos + 4 + nchar]), pos + 4 + nchar
+
+    @classmethod
+    def _is_keyword(cls, buf, pos):
+        """
+        Check whether a keyword-like string starts at a position in a buffer
+        Args:
+            buf (bytes): buffer
+            pos (int): position
+        Returns:
+            bool
+        """
+        try:
+            s, _ = cls._peek_string(buf, pos)
+        except EOFError:
+            return False
+        return s is not None and s.replace(b"_", b"").isalnum()
+
+    @classmethod
+    def _skip_candidates(cls, buf, pos):
+        """
+        Possible starts of the next keyword after an unknown keyword, whose value type is not known.
+        The value can be empty, a number of 1, 4 or 8 bytes, or a string
+        Args:
+            buf (bytes): buffer
+            pos (int): position of the value of the unknown keyword
+        Returns:
+            list: positions where a keyword-like string starts, shortest skip first
+        """
+        candidates = [pos, pos + 1, pos + 4, pos + 8]
+        s, end = cls._peek_string(buf, pos) if pos + 4 <= len(buf) else (None, pos)
+        if s is not None:
+            candidates.append(end)
+        return sorted(candidate for candidate in set(candidates) if cls._is_keyword(buf, candidate))
+
+    @classmethod
+    def _parse_keywords(cls, buf, pos):
+        """
+        Parse the header keywords from a position up to HEADER_END.
+        Every way of skipping the value of an unknown keyword is followed up to HEADER_END
+        Args:
+            buf (bytes): buffer
+            pos (int): position of the first keyword
+        Returns:
+            list of (dict of header values, header size in bytes, list of unknown keywords),
+            one for each way the header can be parsed
+        Raises:
+            ValueError: if the header cannot be parsed
+            EOFError: if the header extends beyond the buffer
+        """
+        header = {}
+        unknown = []
         while True:
-            (s, n) = self.get_string(self.fp)
+            s, pos = cls._peek_string(buf, pos)
+            if s is None:
+                raise ValueError("Invalid keyword in header at byte %d" % pos)
             s = s.decode()
-            self.hdrbytes += n
             if s == "HEADER_END":
-                return
-            if self._type[s] == "string":
-                (v, n) = self.get_string(self.fp)
-                self.hdrbytes += n
-                setattr(self, s, v)
+                return [(header, pos, unknown)]
+            if s not in cls._type:
+                parses = []
+                eof = None
+                for candidate in cls._skip_candidates(buf, pos):
+                    try:
+                        rest = cls._parse_keywords(buf, candidate)
+                    except EOFError as e:
+                        eof = e
+                        continue
+                    except ValueError:
+                        continue
+                    parses.extend((dict(header, **values), size, unknown + [s] + skipped)
+                                  for values, size, skipped in rest)
+                if not parses:
+                    if eof is not None:
+                        # the header may continue beyond the buffer
+                        raise eof
+                    raise ValueError("Cannot skip value of unknown header keyword %s" % s)
+                return parses
+            elif cls._type[s] == "string":
+                header[s], pos = cls._peek_string(buf, pos)
             else:
-                datatype = self._type[s][0]
+                datatype = cls._type[s][0]
                 datasize = struct.calcsize(datatype)
-                val = struct.unpack(datatype, self.fp.read(datasize))[0]
-                setattr(self, s, val)
-                self.hdrbytes += datasize
+                if pos + datasize > len(buf):
+                    raise EOFError("Header extends beyond buffer")
+                header[s] = struct.unpack_from(datatype, buf, pos)[0]
+                pos += datasize
+
+    @classmethod
+    def parse_header(cls, buf):
+        """
+        Parse a filterbank header from memory. Unknown keywords are skipped.
+        If the value of an unknown keyword can be skipped in several ways that parse up to HEADER_END,
+        the way that keeps all known keywords found by the others is used, a skip that jumps over
+        known keywords is never chosen silently
+        Args:
+            buf (bytes): buffer starting at the start of the file
+        Returns:
+            dict of header values, header size in bytes.
+            If the buffer does not start with a header, an empty dict and zero.
+        Raises:
+            EOFError: if the header extends beyond the buffer
+            ValueError: if the header cannot be parsed, or unknown keywords make it ambiguous
+        """
+        s, pos = cls._peek_string(buf, 0)
+        if s != b"HEADER_START":
+            return {}, 0
+        parses = cls._parse_keywords(buf, pos)
+        for header, size, unknown in parses:
+            if all(size == other_size and other.items() <= header.items() for other, other_size, _ in parses):
+                break
+        else:
+            raise ValueError("Ambiguous header, unknown keywords can be skipped in ways that give different "
+                             "values of known keywords")
+        for keyword in unknown:
+            logger.warning("Skipping unknown header keyword %s", keyword)
+        return header, size
+
+    @classmethod
+    def load_header(cls, fp):
+        """
+        Read a header with a single read (unless the header is unusually large) and parse it from memory
+        Args:
+            fp: file object to read the header from
+        Returns:
+            dict of header values, header size in bytes
+        """
+        size = 4096
+        while True:
+            fp.seek(0)
+            buf = fp.read(size)
+            try:
+                header, hdrbytes = cls.parse_header(buf)
+                break
+            except EOFError:
+                if len(buf) < size:
+                    # reached end of file
+                    raise
+                size *= 4
+        fp.seek(hdrbytes)
+        return header, hdrbytes
+
+    def read_header(self):
+        """
+        Read the header
+        """
+        header, self.hdrbytes = self.load_header(self.fp)
+        for k, v in header.items():
+            setattr(self, k, v)
 
     @property
     def dtype(self):
         """
-        Returns: dtype of the data
+        Returns: dtype of the data, data with less than 8 bits per sample is unpacked to uint8
         """
-        if self.nbits == 8:
+        if self.nbits in UNPACK_TABLES or self.nbits == 8:
             return np.uint8
         elif self.nbits == 16:
             return np.uint16
@@ -210,13 +406,13 @@ class SigprocFile:
         """
         Returns: bytes per spectrum
         """
-        return self.nbits * self.nchans * self.nifs / 8
+        return self.nbits * self.nchans * self.nifs // 8
 
     def nspectra(self):
         """
         Returns: Number of specrta in the file
         """
-        return (self._mmdata.size() - self.hdrbytes) / self.bytes_per_spectrum
+        return (self.filesize - self.hdrbytes) / self.bytes_per_spectrum
 
     def native_nspectra(self):
         """
@@ -224,26 +420,188 @@ class SigprocFile:
         Returns:Number of specta in the file
         """
 
-        return (self._mmdata.size() - self.hdrbytes) / self.bytes_per_spectrum
+        return (self.filesize - self.hdrbytes) / self.bytes_per_spectrum
 
-    def get_data(self, nstart, nsamp):
+    def refresh(self):
+        """
+        Update the size of a file that is still being written.
+        The grown file is mapped again, only the appended region has to be paged in,
+        the previous map is released once no views of it remain.
+        Returns:
+            bool: whether the file has grown
+        """
+        filesize = os.fstat(self.fp.fileno()).st_size
+        if filesize <= self.filesize:
+            return False
+        if self.backend != "pread":
+            mmdata = mmap.mmap(self.fp.fileno(), 0, mmap.MAP_PRIVATE, mmap.PROT_READ)
+            if self.backend == "mmap" and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mmdata.madvise(mmap.MADV_SEQUENTIAL)
+            self._mmdata = mmdata
+        # the new size is only used once the map covers it
+        self.filesize = filesize
+        return True
+
+    def _advise(self, b0, b1):
+        """
+        Tell the kernel that the next window after a read will be needed soon
+        Args:
+            b0 (int): first byte of the read
+            b1 (int): end of the read
+        """
+        if not hasattr(mmap, "MADV_WILLNEED"):
+            return
+        pagesize = mmap.PAGESIZE
+        window = b1 - b0
+        # madvise requires page-aligned start addresses
+        start = b1 // pagesize * pagesize
+        end = min(b1 + window, self.filesize)
+        if end > start:
+            self._mmdata.madvise(mmap.MADV_WILLNEED, start, end - start)
+
+    def _release(self, b0, b1):
+        """
+        Drop the data more than one window before a read from the page cache.
+        MADV_DONTNEED only unmaps the pages from this process, posix_fadvise evicts them from the page cache
+        Args:
+            b0 (int): first byte of the read
+            b1 (int): end of the read
+        """
+        pagesize = mmap.PAGESIZE
+        # keep one window behind this read, it may still be in use by other threads
+        release = max(b0 - (b1 - b0), 0) // pagesize * pagesize
+        with self._lock:
+            if release <= self._released:
+                return
+            if self.backend == "mmap" and hasattr(mmap, "MADV_DONTNEED"):
+                self._mmdata.madvise(mmap.MADV_DONTNEED, self._released, release - self._released)
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(self.fp.fileno(), self._released, release - self._released,
+                                 os.POSIX_FADV_DONTNEED)
+            self._released = release
+
+    def _read(self, b0, b1):
+        """
+        Read a range of bytes from the file.
+        With the pread backend, the returned buffer is reused by the next call from the same thread
+        Args:
+            b0 (int): first byte
+            b1 (int): end of the range
+        Returns:
+            buffer with the data
+        """
+        if self.backend == "copy":
+            return self._mmdata[b0:b1]
+        elif self.backend == "mmap":
+            self._advise(b0, b1)
+            self._release(b0, b1)
+            return memoryview(self._mmdata)[b0:b1]
+        self._release(b0, b1)
+        nbytes = b1 - b0
+        if not hasattr(os, "preadv"):
+            return os.pread(self.fp.fileno(), nbytes, b0)
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or len(buffer) < nbytes:
+            buffer = bytearray(nbytes)
+            self._local.buffer = buffer
+        view = memoryview(buffer)[:nbytes]
+        nread = 0
+        while nread < nbytes:
+            # pread may return fewer bytes than requested
+            n = os.preadv(self.fp.fileno(), [view[nread:]], b0 + nread)
+            if n == 0:
+                break
+            nread += n
+        return view[:nread]
+
+    @staticmethod
+    def unpack_bits(packed, nbits):
+        """
+        Unpack sub-byte samples to one sample per byte.
+        Args:
+            packed (np.ndarray): uint8 data with the packed samples along the last axis
+            nbits (int): Number of bits per sample
+        Returns:
+            np.ndarray: uint8 data with the last axis 8 // nbits times longer
+        """
+        table = UNPACK_TABLES[nbits]
+        # one table lookup per byte gives all of its samples at once
+        unpacked = np.take(table, packed, axis=0)
+        return unpacked.reshape(packed.shape[:-1] + (-1, ))
+
+    def get_data(self, nstart, nsamp, chan_start=0, nchan=None):
         """
         Return nsamp time slices starting at nstart.
+        Only the bytes from the first to the last selected sample are read from the file.
         Args:
             nstart (int): Starting spectra number to start reading from.
             nsamp (int): Number of spectra to read.
+            chan_start (int): First channel to read.
+            nchan (int): Number of channels to read, default is up to the last channel.
         Returns:
             np.ndarray: data.
         """
-        bstart = int(nstart) * self.bytes_per_spectrum
-        nbytes = int(nsamp) * self.bytes_per_spectrum
-        b0 = self.hdrbytes + bstart
-        b1 = b0 + nbytes
+        if nchan is None:
+            nchan = self.nchans - chan_start
+        bps = self.bytes_per_spectrum
+        # do not read beyond the end of the file
+        nstart = int(nstart)
+        nsamp = max(min(int(nsamp), (self.filesize - self.hdrbytes) // bps - nstart), 0)
+        b0 = self.hdrbytes + nstart * bps
 
-        data = np.frombuffer(
-            self._mmdata[int(b0): int(b1)], dtype=self.dtype
-        ).reshape((-1, self.nifs, self.nchans))
-        return data[:, 0, :]
+        if self.nbits < 8:
+            packed = np.frombuffer(
+                self._read(b0, b0 + nsamp * bps), dtype=np.uint8
+            ).reshape((-1, self.nifs, self.nchans * self.nbits // 8))
+            # only unpack the first IF
+            return self.unpack_bits(packed[:, 0, :], self.nbits)[:, chan_start:chan_start + nchan]
+
+        if nsamp == 0:
+            return np.empty((0, nchan), dtype=self.dtype)
+        itemsize = self.nbits // 8
+        # read from the first selected channel of the first spectrum
+        # up to the last selected channel of the last spectrum
+        b0 += chan_start * itemsize
+        b1 = b0 + (nsamp - 1) * bps + nchan * itemsize
+        # the first IF is at the start of each spectrum
+        return np.ndarray((nsamp, nchan), dtype=self.dtype, buffer=self._read(b0, b1),
+                          strides=(bps, itemsize))
+
+    def get_spectra(self, nstart, nsamp, chan_start=0, nchan=None):
+        """
+        Return nsamp time slices of all IFs starting at nstart.
+        The IFs are read together, each byte of the range is read only once.
+        Args:
+            nstart (int): Starting spectra number to start reading from.
+            nsamp (int): Number of spectra to read.
+            chan_start (int): First channel to read.
+            nchan (int): Number of channels to read, default is up to the last channel.
+        Returns:
+            np.ndarray: data with shape (time, IF, frequency).
+        """
+        if nchan is None:
+            nchan = self.nchans - chan_start
+        bps = self.bytes_per_spectrum
+        nstart = int(nstart)
+        nsamp = max(min(int(nsamp), (self.filesize - self.hdrbytes) // bps - nstart), 0)
+        b0 = self.hdrbytes + nstart * bps
+
+        if self.nbits < 8:
+            packed = np.frombuffer(
+                self._read(b0, b0 + nsamp * bps), dtype=np.uint8
+            ).reshape((-1, self.nifs, self.nchans * self.nbits // 8))
+            # a single table lookup unpacks all IFs
+            return self.unpack_bits(packed, self.nbits)[:, :, chan_start:chan_start + nchan]
+
+        if nsamp == 0:
+            return np.empty((0, self.nifs, nchan), dtype=self.dtype)
+        itemsize = self.nbits // 8
+        # read from the first selected channel of the first IF of the first spectrum
+        # up to the last selected channel of the last IF of the last spectrum
+        b0 += chan_start * itemsize
+        b1 = b0 + (nsamp - 1) * bps + ((self.nifs - 1) * self.nchans + nchan) * itemsize
+        return np.ndarray((nsamp, self.nifs, nchan), dtype=self.dtype, buffer=self._read(b0, b1),
+                          strides=(bps, self.nchans * itemsize, itemsize))
 
     def unpack(self, nstart, nsamp):
         """
@@ -261,15 +619,10 @@ class SigprocFile:
         b0 = self.hdrbytes + bstart
         b1 = b0 + nbytes
         # reshape with the frequency axis reduced by packing factor
-        fac = 8 / self.nbits
-        d = np.frombuffer(self._mmdata[b0:b1], dtype=np.uint8).reshape(
-            (nsamp, self.nifs, self.nchans / fac)
+        d = np.frombuffer(self._read(b0, b1), dtype=np.uint8).reshape(
+            (-1, self.nifs, self.nchans * self.nbits // 8)
         )
-        unpacked = np.empty((nsamp, self.nifs, self.nchans), dtype=np.float32)
-        for i in range(fac):
-            mask = 2 ** (self.nbits * i) * (2 ** self.nbits - 1)
-            unpacked[..., i::fac] = (d & mask) / 2 ** (i * self.nbits)
-        return unpacked
+        return self.unpack_bits(d, self.nbits).astype(np.float32)
 
     def native_tsamp(self):
         """
@@ -295,6 +648,12 @@ class SigprocFile:
         """
         return self.nchans
 
+    def close(self):
+        """
+        Close the file
+        """
+        self.fp.close()
+
     def write_header(self, filename):
         """
         Write the filterbank header
@@ -0,0 +1,135 @@
+import threading
+from time import time
+
+import numpy as np
+
+# MJD of the unix epoch
+MJD_UNIX_EPOCH = 40587.
+NOISE_TYPES = ('gaussian', 'bandpass')
+
+
+def noise_pool(nchans, nspectra=16384, noise='gaussian', mean=128., std=16., seed=None):
+    """
+    Generate a block of 8-bit noise to draw synthetic data from
+
+    :param int nchans: number of channels
+    :param int nspectra: number of spectra in the pool
+    :param str noise: gaussian: the same mean and standard deviation in every channel,
+                      bandpass: mean and standard deviation fall off towards the edges of the band
+    :param float mean: mean in the centre of the band
+    :param float std: standard deviation in the centre of the band
+    :param int seed: seed of the random number generator
+    :return: uint8 array with shape (nspectra, nchans)
+    """
+    if noise not in NOISE_TYPES:
+        raise ValueError(f'Unknown noise type: {noise}')
+    rng = np.random.default_rng(seed)
+    if noise == 'gaussian':
+        shape = np.ones(nchans, dtype=np.float32)
+    else:
+        # smooth roll-off towards the edges of the band, the noise scales with the signal
+        shape = (np.sin(np.pi * (np.arange(nchans) + .5) / nchans) ** .25).astype(np.float32)
+    pool = rng.standard_normal((nspectra, nchans), dtype=np.float32)
+    pool *= std * shape
+    pool += mean * shape + .5
+    np.clip(pool, 0, 255, out=pool)
+    return pool.astype(np.uint8)
+
+
+class SyntheticFile:
+    """
+    Source of 8-bit noise with the interface of a filterbank reader, without any input file.
+    Reads are views of a random part of a precomputed noise pool,
+    so data is generated much faster than it can be read from disk.
+    The same seed and read position always give the same data.
+
+    :param int nchans: number of channels
+    :param float tsamp: sampling time (s)
+    :param float fch1: frequency of the first channel (MHz)
+    :param float foff: channel width (MHz)
+    :param int nsamp: number of spectra, None for an endless stream
+    :param np.ndarray pool: uint8 noise pool with shape (nspectra, nchans), default from noise_pool
+    :param int seed: seed of the read positions in the pool
+    :param float tstart: start MJD, default is now
+    :param str source_name: source name
+    """
+
+    nbits = 8
+    nifs = 1
+    dtype = np.uint8
+
+    def __init__(self, nchans, tsamp, fch1, foff, nsamp=None, pool=None, seed=0, tstart=None,
+                 source_name='SYNTHETIC'):
+        if pool is None:
+            pool = noise_pool(nchans, seed=seed)
+        if pool.shape[1] != nchans:
+            raise ValueError(f'Noise pool has {pool.shape[1]} channels, expected {nchans}')
+        if nsamp is not None and nsamp < 1:
+            raise ValueError(f'Duration must be at least one sample, got {nsamp} samples')
+        self.nchans = nchans
+        self.tsamp = tsamp
+        self.fch1 = fch1
+        self.foff = foff
+        self.nsamp = nsamp
+        self.pool = pool
+        self.seed = seed
+        self.tstart = time() / 86400. + MJD_UNIX_EPOCH if tstart is None else tstart
+        self.source_name = source_name
+        self.src_raj = 0.
+        self.src_dej = 0.
+        self.az_start = 0.
+        self.za_start = 0.
+        self._local = threading.local()
+
+    def nspectra(self):
+        """
+        Returns: Number of spectra, infinite for an endless stream
+        """
+        return np.inf if self.nsamp is None else self.nsamp
+
+    def _offset(self, nstart, nsamp):
+        """
+        Position in the pool of a read, a hash of the seed and read position
+
+        :param int nstart: first spectrum of the read
+        :param int nsamp: number of spectra, at most the length of the pool
+        :return: first spectrum in the pool
+        """
+        return ((nstart + 1) * 2654435761 + self.seed * 40503) % (len(self.pool) - nsamp + 1)
+
+    def get_data(self, nstart, nsamp, chan_start=0, nchan=None):
+        """
+        Return nsamp time slices starting at nstart.
+        Reads longer than the pool are assembled in a buffer that is reused by the next call from the same thread
+
+        :param int nstart: Starting spectra number to start reading from.
+        :param int nsamp: Number of spectra to read.
+        :param int chan_start: First channel to read.
+        :param int nchan: Number of channels to read, default is up to the last channel.
+        :return: uint8 array with shape (time, frequency)
+        """
+        if nchan is None:
+            nchan = self.nchans - chan_start
+        nstart = int(nstart)
+        nsamp = max(int(min(nsamp, self.nspectra() - nstart)), 0)
+        npool = len(self.pool)
+        if nsamp <= npool:
+            offset = self._offset(nstart, nsamp)
+            return self.pool[offset:offset + nsamp, chan_start:chan_start + nchan]
+
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or buffer.shape[0] < nsamp or buffer.shape[1] != nchan:
+            buffer = np.empty((nsamp, nchan), dtype=np.uint8)
+            self._local.buffer = buffer
+        out = buffer[:nsamp]
+        for start in range(0, nsamp, npool):
+            n = min(npool, nsamp - start)
+            offset = self._offset(nstart + start, n)
+            out[start:start + n] = self.pool[offset:offset + n, chan_start:chan_start + nchan]
+        return out
+
+    def close(self):
+        """
+        Nothing to close
+        """
+        pass
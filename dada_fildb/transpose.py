@@ -0,0 +1,101 @@
+import numpy as np
+
+# edge length of the square tiles used for transposing, in samples
+TILE = 128
+# position of the IF axis in the slab of one beam:
+# major: IF changes slower than time and frequency, interleaved: IF changes fastest
+IF_LAYOUTS = ('major', 'interleaved')
+
+
+def is_frequency_major(order):
+    """
+    Check whether frequency is the slowest changing axis of a ringbuffer data order
+
+    :param str order: ringbuffer data order
+    :return: True if frequency changes slower than time
+    """
+    return order[0] in 'Ff'
+
+
+def page_shape(order, nchans, pagesize, nifs=1, layout='major'):
+    """
+    Shape of the slab of one beam in a ringbuffer page
+
+    :param str order: ringbuffer data order
+    :param int nchans: number of frequency channels
+    :param int pagesize: number of time samples per page
+    :param int nifs: number of IFs
+    :param str layout: position of the IF axis if there are multiple IFs, see IF_LAYOUTS
+    :return: shape tuple
+    """
+    if is_frequency_major(order):
+        shape = (nchans, pagesize)
+    else:
+        shape = (pagesize, nchans)
+    if nifs == 1:
+        return shape
+    if layout not in IF_LAYOUTS:
+        raise ValueError(f'Unknown IF layout: {layout}')
+    if layout == 'major':
+        return (nifs, ) + shape
+    return shape + (nifs, )
+
+
+def if_slabs(beam_page, nifs=1, layout='major'):
+    """
+    Split the slab of one beam in a ringbuffer page into the 2D slab of each IF
+
+    :param np.ndarray beam_page: slab of one beam with the shape given by page_shape
+    :param int nifs: number of IFs
+    :param str layout: position of the IF axis if there are multiple IFs, see IF_LAYOUTS
+    :return: list of 2D views of beam_page, one for each IF
+    """
+    if nifs == 1:
+        return [beam_page]
+    if layout == 'major':
+        return list(beam_page)
+    return [beam_page[..., i] for i in range(nifs)]
+
+
+def tf_view(beam_page, order):
+    """
+    View a single-beam slab of a ringbuffer page in the time, frequency order of the filterbank files
+
+    :param np.ndarray beam_page: 2D slab of one beam in ringbuffer order
+    :param str order: ringbuffer data order
+    :return: view of beam_page with shape (time, frequency), highest frequency first
+    """
+    if is_frequency_major(order):
+        beam_page = beam_page.T
+    if 'F' in order:
+        # ringbuffer has lowest-freq first
+        beam_page = beam_page[:, ::-1]
+    return beam_page
+
+
+def reorder(data, order, out, tile=TILE):
+    """
+    Copy a block of filterbank data into the slab of one beam in a ringbuffer page.
+    Transposes are done in square tiles that fit in cache, the frequency flip is fused into the copy.
+    If the block is shorter than the page, the remainder of the page is set to zero
+
+    :param np.ndarray data: block with shape (time, frequency), highest frequency first
+    :param str order: ringbuffer data order
+    :param np.ndarray out: 2D slab of one beam in ringbuffer order
+    :param int tile: edge length of the transpose tiles in samples
+    """
+    dest = tf_view(out, order)
+    nsamp, nchans = data.shape
+    if is_frequency_major(order):
+        for t0 in range(0, nsamp, tile):
+            t1 = min(t0 + tile, nsamp)
+            src_rows = data[t0:t1]
+            dest_rows = dest[t0:t1]
+            for f0 in range(0, nchans, tile):
+                np.copyto(dest_rows[:, f0:f0 + tile], src_rows[:, f0:f0 + tile], casting='unsafe')
+    else:
+        # both sides are row-major, a single copy is already cache friendly
+        np.copyto(dest[:nsamp], data, casting='unsafe')
+    if nsamp < dest.shape[0]:
+        # pad the page with zeroes
+        dest[nsamp:] = 0
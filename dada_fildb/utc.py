@@ -0,0 +1,63 @@
+import math
+from datetime import date, timedelta
+
+# MJD of day 0
+MJD_EPOCH = date(1858, 11, 17)
+# months at the end of which a leap second was inserted in UTC, since leap seconds were introduced in 1972.
+# A new leap second has to be added here once it is announced by the IERS
+LEAP_SECOND_MONTHS = ((1972, 6), (1972, 12), (1973, 12), (1974, 12), (1975, 12), (1976, 12), (1977, 12),
+                      (1978, 12), (1979, 12), (1981, 6), (1982, 6), (1983, 6), (1985, 6), (1987, 12),
+                      (1989, 12), (1990, 12), (1992, 6), (1993, 6), (1994, 6), (1995, 12), (1997, 6),
+                      (1998, 12), (2005, 12), (2008, 12), (2012, 6), (2015, 6), (2016, 12))
+
+
+def _last_day(year, month):
+    """
+    MJD of the last day of a month
+
+    :param int year: year
+    :param int month: month
+    :return: MJD
+    """
+    first_of_next = date(year + month // 12, month % 12 + 1, 1)
+    return (first_of_next - MJD_EPOCH).days - 1
+
+
+# MJD of the days that end with a leap second
+LEAP_SECOND_DAYS = frozenset(_last_day(year, month) for year, month in LEAP_SECOND_MONTHS)
+
+
+def mjd_to_isot(mjd):
+    """
+    Convert a UTC MJD to an ISO 8601 date and time with millisecond precision,
+    identical to Time(mjd, format='mjd').isot of astropy, without importing astropy.
+    Days that end with a leap second have 86401 seconds, so their last second is 23:59:60
+
+    :param float mjd: MJD (UTC)
+    :return: date and time as YYYY-MM-DDThh:mm:ss.sss
+    """
+    day = math.floor(mjd)
+    # exact for any MJD after day 0
+    fraction = mjd - day
+    leap = day in LEAP_SECOND_DAYS
+    if leap:
+        # the fraction of a leap second day is a fraction of 86401 seconds
+        fraction += fraction / 86400.
+    # milliseconds since midnight, rounded like ERFA
+    ms = int(math.floor(1000. * (86400. * fraction) + .5))
+    hour, ms = divmod(ms, 3600000)
+    minute, ms = divmod(ms, 60000)
+    second, ms = divmod(ms, 1000)
+    if hour > 23:
+        # rounded up to the end of the day
+        if not leap:
+            day += 1
+            hour = minute = second = 0
+        elif second > 0:
+            # past the leap second
+            day += 1
+            hour = minute = 0
+            second -= 1
+        else:
+            hour, minute, second = 23, 59, 60
+    return f'{MJD_EPOCH + timedelta(days=day)}T{hour:02d}:{minute:02d}:{second:02d}.{ms:03d}'
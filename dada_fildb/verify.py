@@ -0,0 +1,310 @@
+import argparse
+import json
+import logging
+import queue
+import sys
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import numpy as np
+
+from .bandpass import load_corrector
+from .dada_fildb import add_source_arguments, beam_layout, create_header, loop_count, open_filterbanks, read_ifs
+
+logger = logging.getLogger(__name__)
+
+# header keys that describe the data layout
+HEADER_KEYS = ('NCHAN', 'NBIT', 'NPOL', 'TSAMP', 'BW', 'MIN_FREQUENCY', 'RESOLUTION', 'SAMPLES_PER_BATCH')
+
+
+def expected_page(filterbanks, page, pagesize, order, corrector=None):
+    """
+    Build a ringbuffer page directly from the filterbank data, without the page pipeline of dada_fildb
+
+    :param list filterbanks: reader of each beam
+    :param int page: page index
+    :param int pagesize: number of time samples per page
+    :param str order: ringbuffer data order
+    :param BandpassCorrector corrector: if given, mask channels and normalise the bandpass
+    :return: uint8 array with the page
+    """
+    nifs, layout = beam_layout(filterbanks[0])
+    data = np.zeros((len(filterbanks), nifs, pagesize, filterbanks[0].nchans), dtype=np.uint8)
+    for beam, filterbank in enumerate(filterbanks):
+        for i, if_data in enumerate(read_ifs(filterbank, page * pagesize, pagesize)):
+            if corrector is not None:
+                if_data = corrector.correct(if_data, beam)
+            data[beam, i, :len(if_data)] = if_data
+    if 'F' in order:
+        data = data[..., ::-1]
+    if order[0] in 'Ff':
+        data = data.transpose(0, 1, 3, 2)
+    if layout == 'interleaved':
+        data = np.moveaxis(data, 1, -1)
+    return np.ascontiguousarray(data).ravel()
+
+
+class Verifier:
+    """
+    Compare pages read from a ringbuffer to the expected pages.
+    Checksums of received and expected pages are computed on background threads,
+    received pages are classified in order as correct, mismatched, dropped or duplicated.
+    If the output of a reader depends on the data read before, such as with running requantization,
+    the expected pages are built in page order on a single thread, each page once
+
+    :param list filterbanks: reader of each beam
+    :param str order: ringbuffer data order
+    :param int pagesize: number of time samples per page
+    :param int npage: number of pages expected, None if unknown
+    :param int npage_loop: number of pages in one loop in loop mode, None otherwise
+    :param int nthread: number of threads to compute checksums
+    :param int window: number of pages to look ahead and back for dropped or duplicated pages
+    :param BandpassCorrector corrector: if given, the pages have masked channels and a normalised bandpass
+    """
+
+    def __init__(self, filterbanks, order, pagesize, npage=None, npage_loop=None, nthread=4, window=8,
+                 corrector=None):
+        self.filterbanks = filterbanks
+        self.corrector = corrector
+        self.order = order
+        self.pagesize = pagesize
+        self.npage = npage
+        self.npage_loop = npage_loop
+        self.window = window
+        self.nbyte = len(filterbanks) * filterbanks[0].nchans * beam_layout(filterbanks[0])[0] * pagesize
+        self._executor = ThreadPoolExecutor(max_workers=nthread, thread_name_prefix='verify')
+        if any(getattr(filterbank, 'stateful', False) for filterbank in filterbanks):
+            self._source_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='verify_source')
+        else:
+            self._source_executor = None
+        # next expected page that is built from a stateful source
+        self._next_source = 0
+        # expected pages below this one have been forgotten
+        self._pruned = 0
+        # reusable copies of received pages, the ringbuffer page is released as soon as it is copied
+        self._free = queue.Queue()
+        for _ in range(2 * nthread):
+            self._free.put(np.empty(self.nbyte, dtype=np.uint8))
+        self._pending = deque()
+        self._expected = {}
+        self.next_page = 0
+        self.received = 0
+        self.correct = 0
+        self.mismatched = []
+        self.dropped = []
+        self.duplicated = []
+
+    def _expected_checksum(self, page):
+        """
+        Get the future of the checksum of an expected page, start computing it if needed
+
+        :param int page: page index
+        :return: Future
+        """
+        source_page = page if self.npage_loop is None else page % self.npage_loop
+        if source_page in self._expected:
+            return self._expected[source_page]
+        if self._source_executor is None:
+            self._expected[source_page] = self._executor.submit(self._expected_crc, source_page)
+        else:
+            if source_page < self._next_source:
+                raise RuntimeError(f'Expected page {source_page} was already built from a stateful source')
+            # a single thread runs the pages in the order they are submitted
+            for p in range(self._next_source, source_page + 1):
+                self._expected[p] = self._source_executor.submit(self._expected_crc, p)
+            self._next_source = source_page + 1
+        return self._expected[source_page]
+
+    def _expected_crc(self, page):
+        return zlib.crc32(expected_page(self.filterbanks, page, self.pagesize, self.order, corrector=self.corrector))
+
+    def _checksum(self, buffer):
+        crc = zlib.crc32(buffer)
+        self._free.put(buffer)
+        return crc
+
+    def add(self, data):
+        """
+        Add a page read from the ringbuffer
+
+        :param np.ndarray data: uint8 page
+        """
+        if data.nbytes != self.nbyte:
+            raise ValueError(f'Page size is {data.nbytes} bytes, expected {self.nbyte}')
+        buffer = self._free.get()
+        np.copyto(buffer, data)
+        self._pending.append(self._executor.submit(self._checksum, buffer))
+        # start on the expected pages ahead of time
+        for page in range(self.received, self.received + self.window):
+            if self.npage is None or page < self.npage:
+                self._expected_checksum(page)
+        self.received += 1
+        while self._pending and self._pending[0].done():
+            self._classify(self._pending.popleft().result())
+
+    def _classify(self, crc):
+        """
+        Match the checksum of the next received page to the expected pages
+
+        :param int crc: checksum of the received page
+        """
+        page = self.next_page
+        if (self.npage is None or page < self.npage) and crc == self._expected_checksum(page).result():
+            self.correct += 1
+            self.next_page += 1
+        else:
+            # a later page means pages were dropped, an earlier page that it was duplicated
+            for offset in range(1, self.window + 1):
+                later = page + offset
+                if (self.npage is None or later < self.npage) and crc == self._expected_checksum(later).result():
+                    self.dropped.extend(range(page, later))
+                    self.correct += 1
+                    self.next_page = later + 1
+                    break
+                earlier = page - offset
+                if earlier >= 0 and crc == self._expected_checksum(earlier).result():
+                    self.duplicated.append(earlier)
+                    break
+            else:
+                self.mismatched.append(page)
+                self.next_page += 1
+        # forget expected pages that can no longer be matched, several at once if pages were dropped
+        if self.npage_loop is None:
+            for p in range(self._pruned, self.next_page - self.window):
+                self._expected.pop(p, None)
+            self._pruned = max(self._pruned, self.next_page - self.window)
+
+    def finish(self):
+        """
+        Wait for the remaining pages and stop the background threads
+        """
+        while self._pending:
+            self._classify(self._pending.popleft().result())
+        self._executor.shutdown()
+        if self._source_executor is not None:
+            self._source_executor.shutdown()
+
+    def report(self):
+        """
+        Result of the verification
+
+        :return: dict
+        """
+        missing = 0 if self.npage is None else max(self.npage - self.next_page, 0)
+        return {'received': self.received, 'expected': self.npage, 'correct': self.correct,
+                'mismatched': self.mismatched, 'dropped': self.dropped, 'duplicated': self.duplicated,
+                'missing': missing,
+                'ok': not (self.mismatched or self.dropped or self.duplicated or missing)}
+
+
+def verify(key, order, pagesize, loop=None, nthread=4, window=8, dada_reader=None, mask=None, bandpass=None,
+           **source):
+    """
+    Read a ringbuffer written by dada_fildb and verify the header and every page
+
+    :param str key: hexadecimal shared memory key
+    :param str order: ringbuffer data order
+    :param int pagesize: number of time samples per page
+    :param loop: number of loops of the replay, can be infinite
+    :param int nthread: number of threads to compute checksums
+    :param int window: number of pages to look ahead and back for dropped or duplicated pages
+    :param Reader dada_reader: ringbuffer reader, default is to connect to the ringbuffer
+    :param str mask: path to the channel mask file given to dada_fildb
+    :param str bandpass: path to the bandpass file given to dada_fildb
+    :param source: options that define the data, see open_filterbanks
+    :return: dict with the result
+    """
+    filterbanks = open_filterbanks(**source)
+    corrector = None
+    if mask is not None or bandpass is not None:
+        corrector = load_corrector(mask, bandpass, [order], len(filterbanks), filterbanks[0].nchans,
+                                   nsigma=source.get('nsigma', 6.))
+    nspectra = filterbanks[0].nspectra()
+    npage_loop = None
+    if np.isinf(nspectra):
+        npage = None
+    elif loop is None:
+        npage = int(np.ceil(nspectra / pagesize))
+    else:
+        # dada_fildb only loops over whole pages
+        npage_loop = int(nspectra // pagesize)
+        if npage_loop == 0:
+            for filterbank in filterbanks:
+                filterbank.close()
+            raise ValueError(f'Cannot loop over {nspectra} spectra, less than one page of {pagesize} samples')
+        npage = None if np.isinf(loop) else loop * npage_loop
+
+    if dada_reader is None:
+        from psrdada import Reader
+        dada_reader = Reader(int(key, 16))
+    header = dada_reader.getHeader()
+    expected_header = create_header(filterbanks[0], nbeam=len(filterbanks), pagesize=pagesize,
+                                    flip_band='F' in order)
+    header_mismatches = {k: {'received': header.get(k), 'expected': expected_header[k]}
+                         for k in HEADER_KEYS if header.get(k) != expected_header[k]}
+    for k, values in header_mismatches.items():
+        logger.error(f'Header {k} is {values["received"]}, expected {values["expected"]}')
+
+    verifier = Verifier(filterbanks, order, pagesize, npage=npage, npage_loop=npage_loop, nthread=nthread,
+                        window=window, corrector=corrector)
+    tstart = None
+    try:
+        for page in dada_reader:
+            if tstart is None:
+                tstart = perf_counter()
+            verifier.add(np.asarray(page))
+    finally:
+        elapsed = perf_counter() - tstart if tstart is not None else 0.
+        verifier.finish()
+        dada_reader.disconnect()
+        for f in filterbanks:
+            f.close()
+
+    result = verifier.report()
+    result['header_mismatches'] = header_mismatches
+    result['ok'] = result['ok'] and not header_mismatches
+    result['seconds'] = elapsed
+    nbyte = result['received'] * verifier.nbyte
+    result['pages_per_second'] = result['received'] / elapsed if elapsed > 0 else 0.
+    result['gbps'] = nbyte / elapsed / 1e9 if elapsed > 0 else 0.
+    logger.info(f'Received {result["received"]} pages in {elapsed:.3f} s ({result["gbps"]:.3f} GB/s): '
+                f'{result["correct"]} correct, {len(result["mismatched"])} mismatched, '
+                f'{len(result["dropped"])} dropped, {len(result["duplicated"])} duplicated, '
+                f'{result["missing"]} missing at the end')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify the data that dada_fildb writes to a ringbuffer. '
+                                                 'Give the same data options as to dada_fildb')
+    parser.add_argument('-k', '--key', default='dada',
+                        help='Hexadecimal shared memory key (Default: %(default)s)')
+    parser.add_argument('-o', '--order', default='FT', choices=['TF', 'Tf', 'FT', 'fT'],
+                        help='Data order of the ringbuffer (Default: %(default)s)')
+    parser.add_argument('-p', '--pagesize', type=int, required=True,
+                        help='Number of time samples in one ringbuffer page')
+    add_source_arguments(parser)
+    parser.add_argument('--loop', type=loop_count,
+                        help='Number of times the data are replayed, or forever')
+    parser.add_argument('--nthread', type=int, default=4,
+                        help='Number of threads to compute checksums (Default: %(default)s)')
+    parser.add_argument('--window', type=int, default=8,
+                        help='Number of pages to look ahead and back for dropped or duplicated pages '
+                             '(Default: %(default)s)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+
+    args = parser.parse_args()
+    if not args.files and not args.synthetic:
+        parser.error('either --files or --synthetic is required')
+
+    kwargs = vars(args)
+    verbose = kwargs.pop('verbose')
+    logging.basicConfig(format='%(asctime)s %(name)s %(levelname)s: %(message)s',
+                        level=logging.DEBUG if verbose else logging.INFO)
+
+    result = verify(**kwargs)
+    print(json.dumps(result))
+    if not result['ok']:
+        sys.exit(1)
@@ -0,0 +1,132 @@
+import numpy as np
+
+from .sigproc import SigprocFile
+from .wrapper import FilterbankWrapper
+
+
+class VirtualSigprocFile(FilterbankWrapper):
+    """
+    Consecutive filterbank files of one beam, read as one continuous filterbank.
+    The header attributes are those of the first file, except for the number of spectra.
+
+    :param list fnames: paths to the files, in time order
+    :param type reader: class used to open each file
+    """
+
+    # header attributes that must be identical in all files
+    _constant = ('nchans', 'nbits', 'nifs', 'tsamp', 'fch1', 'foff')
+
+    def __init__(self, fnames, reader=SigprocFile):
+        if len(fnames) == 0:
+            raise ValueError('At least one file is required')
+        self.files = [reader(fname) for fname in fnames]
+        super().__init__(self.files[0])
+        self._check_continuity(fnames)
+        # index of the first spectrum of each file in the virtual stream, plus the total
+        nspectra = [int(f.nspectra()) for f in self.files]
+        self.offsets = np.concatenate([[0], np.cumsum(nspectra)]).astype(int)
+
+    def _check_continuity(self, fnames):
+        """
+        Verify that the files have the same layout and follow each other without gaps
+
+        :param list fnames: paths to the files
+        """
+        first = self.files[0]
+        for fname, prev, f in zip(fnames[1:], self.files[:-1], self.files[1:]):
+            for key in self._constant:
+                if getattr(f, key) != getattr(first, key):
+                    raise ValueError(f'{key} of {fname} ({getattr(f, key)}) differs from '
+                                     f'that of {fnames[0]} ({getattr(first, key)})')
+            expected_tstart = prev.tstart + int(prev.nspectra()) * prev.tsamp / 86400.
+            gap = (f.tstart - expected_tstart) * 86400.
+            if abs(gap) > .5 * first.tsamp:
+                raise ValueError(f'{fname} does not follow the previous file: '
+                                 f'expected start MJD {expected_tstart:.12f}, got {f.tstart:.12f} '
+                                 f'(gap of {gap:.6f} s)')
+
+    def nspectra(self):
+        """
+        Returns: Number of spectra in all files together
+        """
+        return self.offsets[-1]
+
+    def refresh(self):
+        """
+        Update the number of spectra of the last file, which may still be growing
+
+        :return: whether the last file has grown
+        """
+        grown = self.files[-1].refresh()
+        if grown:
+            # replace the whole array, so other threads never see a partial update
+            self.offsets = np.append(self.offsets[:-1], self.offsets[-2] + int(self.files[-1].nspectra()))
+        return grown
+
+    def _concatenate(self, method, nstart, nsamp, chan_start, nchan):
+        """
+        Read nsamp time slices starting at nstart with a read method of the files,
+        joining the parts of the files the slices span
+
+        :param str method: name of the read method of the files
+        :param int nstart: Starting spectra number to start reading from.
+        :param int nsamp: Number of spectra to read.
+        :param int chan_start: First channel to read.
+        :param int nchan: Number of channels to read, default is up to the last channel.
+        :return: np.ndarray: data.
+        """
+        if nchan is None:
+            nchan = self.nchans - chan_start
+        nstart = int(nstart)
+        nend = min(nstart + int(nsamp), self.offsets[-1])
+        ind = min(max(np.searchsorted(self.offsets, nstart, side='right') - 1, 0), len(self.files) - 1)
+        if nend <= self.offsets[ind + 1]:
+            # all data is in one file
+            return getattr(self.files[ind], method)(nstart - self.offsets[ind], nsamp, chan_start, nchan)
+
+        out = None
+        sample = nstart
+        while sample < nend:
+            nread = min(nend, self.offsets[ind + 1]) - sample
+            start = sample - nstart
+            data = getattr(self.files[ind], method)(sample - self.offsets[ind], nread, chan_start, nchan)
+            if out is None:
+                # one buffer for each read method, for reads that span multiple files
+                out = self._buffer(method, (nend - nstart, ) + data.shape[1:], self.dtype)
+            out[start:start + nread] = data
+            sample += nread
+            ind += 1
+        return out
+
+    def get_data(self, nstart, nsamp, chan_start=0, nchan=None):
+        """
+        Return nsamp time slices starting at nstart.
+        If the slices span more than one file, the returned array is reused by the next call from the same thread
+
+        :param int nstart: Starting spectra number to start reading from.
+        :param int nsamp: Number of spectra to read.
+        :param int chan_start: First channel to read.
+        :param int nchan: Number of channels to read, default is up to the last channel.
+        :return: np.ndarray: data.
+        """
+        return self._concatenate('get_data', nstart, nsamp, chan_start, nchan)
+
+    def get_spectra(self, nstart, nsamp, chan_start=0, nchan=None):
+        """
+        Return nsamp time slices of all IFs starting at nstart.
+        If the slices span more than one file, the returned array is reused by the next call from the same thread
+
+        :param int nstart: Starting spectra number to start reading from.
+        :param int nsamp: Number of spectra to read.
+        :param int chan_start: First channel to read.
+        :param int nchan: Number of channels to read, default is up to the last channel.
+        :return: np.ndarray: data with shape (time, IF, frequency).
+        """
+        return self._concatenate('get_spectra', nstart, nsamp, chan_start, nchan)
+
+    def close(self):
+        """
+        Close all files
+        """
+        for f in self.files:
+            f.close()
@@ -0,0 +1,78 @@
+import threading
+
+import numpy as np
+
+
+def accumulator_dtype(dtype):
+    """
+    Type wide enough to add up many samples of the given type without overflowing
+
+    :param dtype: data type of the samples
+    :return: accumulator type
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return np.float32
+    elif dtype.itemsize <= 2:
+        return np.uint32 if dtype.kind == 'u' else np.int32
+    return np.int64
+
+
+def sum_to_mean(acc, factor):
+    """
+    Turn sums of samples into their mean in place, integers are rounded to the nearest value
+
+    :param np.ndarray acc: sums, in the type given by accumulator_dtype
+    :param int factor: number of samples in each sum
+    """
+    if acc.dtype.kind == 'f':
+        np.divide(acc, factor, out=acc)
+    else:
+        np.add(acc, factor // 2, out=acc)
+        np.floor_divide(acc, factor, out=acc)
+
+
+class FilterbankWrapper:
+    """
+    Base class of readers that wrap another filterbank reader.
+    Attributes that are not set on the wrapper are taken from the wrapped reader,
+    and each thread has its own reusable buffers, so that reads from several threads do not interfere
+
+    :param SigprocFile filterbank: wrapped reader
+    """
+
+    def __init__(self, filterbank):
+        self.filterbank = filterbank
+        self._local = threading.local()
+
+    def _wrapped(self):
+        """
+        Returns: the reader that attributes not set on this object are taken from
+        """
+        return self.__dict__['filterbank']
+
+    def __getattr__(self, name):
+        # only called for attributes not set on this object. Before the wrapped reader is set,
+        # e.g. while copying or unpickling, there is nothing to take the attribute from
+        try:
+            wrapped = self._wrapped()
+        except (KeyError, IndexError):
+            raise AttributeError(name) from None
+        return getattr(wrapped, name)
+
+    def _buffer(self, name, shape, dtype):
+        """
+        Get a reusable buffer of the calling thread
+
+        :param str name: name of the buffer
+        :param tuple shape: shape of the buffer
+        :param dtype: data type
+        :return: array with the given shape and type, the first axis may have been allocated longer
+        """
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buffer = buffers.get(name)
+        if buffer is None or len(buffer) < shape[0] or buffer.shape[1:] != tuple(shape[1:]) or buffer.dtype != dtype:
+            buffer = buffers[name] = np.empty(shape, dtype=dtype)
+        return buffer[:shape[0]]
@@ -25,7 +25,10 @@ setup(name='dada_fildb',
       install_requires=['numpy>=1.17',
                         'astropy'],
       entry_points={'console_scripts':
-                    ['dada_fildb=dada_fildb.dada_fildb:main']},
+                    ['dada_fildb=dada_fildb.dada_fildb:main',
+                     'dada_fildb_headers=dada_fildb.header_cache:main',
+                     'dada_fildb_verify=dada_fildb.verify:main',
+                     'dada_fildb_controller=dada_fildb.controller:main']},
       classifiers=['License :: OSI Approved :: Apache Software License',
                    'Programming Language :: Python :: 3',
                    'Operating System :: OS Independent'],
@@ -0,0 +1,77 @@
+#
+# In-process stand-ins for the psrdada ringbuffer Writer and Reader, shared by the tests.
+# Unlike MemoryWriter of the benchmarks, the writer keeps a copy of every page it receives
+import numpy as np
+
+
+class PageWriter:
+    """
+    Ringbuffer writer that keeps a copy of every page, and optionally stops or fails after a number of pages
+
+    :param int nbyte: page size in bytes, default is to take it from the header
+    :param int max_pages: stop handing out pages after this many, like a reader that stops reading
+    :param int fail_after: raise an IOError after this many pages
+    """
+
+    def __init__(self, nbyte=None, max_pages=None, fail_after=None):
+        self.max_pages = max_pages
+        self.fail_after = fail_after
+        self.header = None
+        self.buffer = None if nbyte is None else np.zeros(nbyte, dtype=np.uint8)
+        self.pages = []
+        self.eod = False
+        self.connected = True
+        # whether a page has been handed out and not stored yet
+        self._open = False
+
+    def setHeader(self, header):
+        self.header = header
+        self.buffer = np.zeros(int(header['RESOLUTION']), dtype=np.uint8)
+
+    def _store(self):
+        if self._open:
+            self.pages.append(self.buffer.copy())
+            self._open = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        # the previous page is done once the next one is requested
+        self._store()
+        if self.eod or len(self.pages) == self.max_pages:
+            raise StopIteration
+        if self.fail_after is not None and len(self.pages) >= self.fail_after:
+            raise IOError('ringbuffer error')
+        self._open = True
+        return self.buffer
+
+    def markEndOfData(self):
+        self._store()
+        self.eod = True
+
+    def disconnect(self):
+        self.connected = False
+
+
+class PageReader:
+    """
+    Ringbuffer reader that hands out a fixed list of pages
+
+    :param dict header: ringbuffer header
+    :param list pages: pages to hand out
+    """
+
+    def __init__(self, header, pages):
+        self.header = header
+        self.pages = pages
+        self.connected = True
+
+    def getHeader(self):
+        return self.header
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def disconnect(self):
+        self.connected = False
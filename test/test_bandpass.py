@@ -0,0 +1,101 @@
+import os
+import unittest
+
+import numpy as np
+
+from dada_fildb.bandpass import MASK_VALUE, BandpassCorrector, load_bandpass, load_mask
+from dada_fildb.transpose import page_shape, reorder
+
+
+class TestBandpass(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Set configuration
+        """
+        self.nchans = 64
+        self.nbeam = 2
+        self.nsamp = 100
+        self.pagesize = 128
+        self.orders = ['TF', 'Tf', 'FT', 'fT']
+        self.mask_file = 'test_bandpass.mask'
+        self.bandpass_file = 'test_bandpass.txt'
+        self.data = np.random.randint(0, 256, size=(self.nbeam, self.nsamp, self.nchans)).astype(np.uint8)
+
+    def tearDown(self):
+        """
+        Remove test files
+        """
+        for fname in (self.mask_file, self.bandpass_file):
+            if os.path.isfile(fname):
+                os.remove(fname)
+
+    def test_load(self):
+        """
+        Masks are read as channels and ranges, bandpasses for all beams or per beam
+        """
+        with open(self.mask_file, 'w') as f:
+            f.write('# persistent RFI\n3, 10:12\n60:\n')
+        mask = load_mask(self.mask_file, self.nchans)
+        self.assertListEqual(list(np.flatnonzero(mask)), [3, 10, 11, 60, 61, 62, 63])
+        with self.assertRaises(ValueError):
+            load_mask(self.mask_file, 32)
+
+        bandpass = np.random.uniform(1, 100, size=(self.nchans, 2 * self.nbeam))
+        np.savetxt(self.bandpass_file, bandpass)
+        mean, std = load_bandpass(self.bandpass_file, self.nchans, self.nbeam)
+        np.testing.assert_allclose(mean[1], bandpass[:, 2])
+        np.testing.assert_allclose(std[1], bandpass[:, 3])
+        np.savetxt(self.bandpass_file, bandpass[:, :2])
+        mean, std = load_bandpass(self.bandpass_file, self.nchans, self.nbeam)
+        self.assertEqual(mean.shape, (self.nbeam, self.nchans))
+        np.testing.assert_allclose(std[1], bandpass[:, 1])
+        with self.assertRaises(ValueError):
+            load_bandpass(self.bandpass_file, 32, self.nbeam)
+
+    def check_pages(self, corrector):
+        """
+        Pages corrected in place equal the reference correction, the padding is not changed
+        """
+        for order in self.orders:
+            for beam in range(self.nbeam):
+                out = np.empty(page_shape(order, self.nchans, self.pagesize), dtype=np.uint8)
+                reorder(self.data[beam], order, out)
+                corrector.apply(out, order, beam, self.nsamp)
+                expected = np.empty_like(out)
+                reorder(corrector.correct(self.data[beam], beam), order, expected)
+                np.testing.assert_array_equal(out, expected)
+
+    def test_mask(self):
+        """
+        Masked channels are set to a constant
+        """
+        mask = np.zeros(self.nchans, dtype=bool)
+        mask[[0, 5, 6, 7, 40]] = True
+        corrector = BandpassCorrector(self.orders, self.nbeam, self.nchans, mask=mask)
+        corrected = corrector.correct(self.data[0], 0)
+        self.assertTrue(np.all(corrected[:, mask] == MASK_VALUE))
+        np.testing.assert_array_equal(corrected[:, ~mask], self.data[0][:, ~mask])
+        self.check_pages(corrector)
+
+    def test_normalise(self):
+        """
+        Normalised channels have mean 128, masked and constant channels are set to a constant
+        """
+        mean = np.random.uniform(50, 200, size=(self.nbeam, self.nchans))
+        std = np.random.uniform(5, 20, size=(self.nbeam, self.nchans))
+        std[1, 3] = 0
+        mask = np.zeros(self.nchans, dtype=bool)
+        mask[10:20] = True
+        data = np.clip(np.random.normal(mean[:, None], std[:, None], size=(self.nbeam, 10000, self.nchans)),
+                       0, 255).astype(np.uint8)
+        corrector = BandpassCorrector(self.orders, self.nbeam, self.nchans, mask=mask, mean=mean, std=std)
+        corrected = corrector.correct(data[0], 0)
+        self.assertTrue(np.all(corrected[:, mask] == MASK_VALUE))
+        np.testing.assert_allclose(corrected[:, ~mask].mean(axis=0), 128, atol=3)
+        self.assertTrue(np.all(corrector.correct(data[1], 1)[:, 3] == MASK_VALUE))
+        self.check_pages(corrector)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from dada_fildb.controller import Controller, FileCache, JobStats, load_manifest
+from dada_fildb.dada_fildb import get_data, open_filterbanks
+from dada_fildb.sigproc import SigprocFile
+
+from ringbuffer import PageWriter
+
+
+class TestController(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Create a filterbank file and a manifest location
+        """
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.tmpdir.name, 'test.fil')
+        self.manifest = os.path.join(self.tmpdir.name, 'manifest.json')
+        self.nchans = 16
+        self.data = np.random.randint(0, 256, size=(100, self.nchans)).astype(np.uint8)
+        header = {'source_name': 'FAKE',
+                  'fch1': 1520.,
+                  'foff': -1.,
+                  'nchans': self.nchans,
+                  'nbits': 8,
+                  'tstart': 55000.0,
+                  'tsamp': 1e-3,
+                  'nifs': 1}
+        filterbank = SigprocFile.new_file(self.fname, header)
+        filterbank.append_spectra(self.data, self.fname)
+        filterbank.close()
+
+    def tearDown(self):
+        """
+        Remove files
+        """
+        self.tmpdir.cleanup()
+
+    def write_manifest(self, manifest):
+        """
+        Write a manifest and load it
+
+        :param manifest: manifest contents
+        :return: list of jobs
+        """
+        with open(self.manifest, 'w') as f:
+            json.dump(manifest, f)
+        return load_manifest(self.manifest)
+
+    def test_manifest(self):
+        """
+        Jobs get the defaults and a name, command line values are parsed, invalid jobs are reported
+        """
+        jobs = self.write_manifest({'defaults': {'pagesize': 64, 'loop': 'forever'},
+                                    'jobs': [{'files': [self.fname], 'key': 'dada'},
+                                             {'files': [self.fname], 'key': ['dadb', 'dadc'],
+                                              'order': ['TF', 'FT'], 'channels': [2, 10], 'loop': 3}]})
+        self.assertEqual([job['name'] for job in jobs], ['dada', 'dadb,dadc'])
+        self.assertEqual(jobs[0]['order'], 'FT')
+        self.assertTrue(np.isinf(jobs[0]['loop']))
+        self.assertEqual(jobs[1]['loop'], 3)
+        self.assertEqual(jobs[1]['channels'], (2, 10))
+
+        self.assertEqual(len(self.write_manifest([{'synthetic': True, 'key': 'dada', 'pagesize': 64}])), 1)
+        for manifest in ([{'files': [self.fname], 'key': 'dada', 'pagesize': 64, 'pagsize': 64}],
+                         [{'files': [self.fname], 'key': 'dada'}],
+                         [{'files': [self.fname], 'key': 'dada', 'pagesize': 64}] * 2,
+                         {'jobs': []}):
+            with self.assertRaises(ValueError):
+                self.write_manifest(manifest)
+
+    def test_file_cache(self):
+        """
+        Replays of the same file share a single open file, which is closed when the last replay closes it
+        """
+        cache = FileCache()
+        beams = [open_filterbanks([self.fname], channels=(0, 8), file_cache=cache)[0],
+                 open_filterbanks([self.fname], file_cache=cache)[0]]
+        self.assertEqual(len(cache), 1)
+        self.assertEqual((cache.nfile, cache.nopen), (1, 2))
+        np.testing.assert_array_equal(beams[0].get_data(10, 20), self.data[10:30, :8])
+        np.testing.assert_array_equal(beams[1].get_data(10, 20), self.data[10:30])
+
+        beams[0].close()
+        self.assertEqual(len(cache), 1)
+        np.testing.assert_array_equal(beams[1].get_data(50, 10), self.data[50:60])
+        beams[1].close()
+        self.assertEqual(len(cache), 0)
+
+        # files read with another backend are not shared
+        beams = [open_filterbanks([self.fname], reader=reader, file_cache=cache)[0] for reader in ('copy', 'pread')]
+        self.assertEqual(len(cache), 2)
+        for beam in beams:
+            beam.close()
+
+    def test_stats(self):
+        """
+        Backpressure is the fraction of the writer time spent waiting for free pages
+        """
+        stats = JobStats('test')
+        stats.start = 0.
+        stats.end = 2.
+        stats.add_page(1000, wait=.3, queue=.1, fill=.1)
+        stats.add_page(1000, wait=.5, queue=0., fill=.1)
+        nbyte, backpressure = stats.interval()
+        self.assertEqual(nbyte, 2000)
+        self.assertAlmostEqual(backpressure, .8 / 1.1)
+        self.assertEqual(stats.interval(), (0, 0.))
+        summary = stats.summary()
+        self.assertTrue(summary['ok'])
+        self.assertEqual(summary['npage'], 2)
+        # gigabytes per second, like verify and the benchmarks
+        self.assertAlmostEqual(summary['gbps'], 2000 / 2. / 1e9)
+        self.assertAlmostEqual(summary['backpressure'] + summary['queue'] + summary['fill'], 1)
+
+    def test_run(self):
+        """
+        Jobs are written concurrently, a failing job is stopped without affecting the others,
+        and every job releases its ringbuffers and files
+        """
+        pagesize = 32
+        npage = int(np.ceil(len(self.data) / pagesize))
+        writers = {'ft': PageWriter(), 'tf': PageWriter(), 'fanout': [PageWriter(), PageWriter()],
+                   'failing': PageWriter(fail_after=1)}
+        jobs = [{'name': 'ft', 'files': [self.fname, self.fname], 'key': 'dada', 'order': 'FT', 'prefetch': 2},
+                {'name': 'tf', 'files': [self.fname], 'key': 'dadb', 'order': 'TF', 'realtime': True,
+                 'speed': 10.},
+                {'name': 'fanout', 'files': [self.fname], 'key': ['dadc', 'dadd'], 'order': ['fT', 'Tf']},
+                {'name': 'failing', 'files': [self.fname], 'key': 'dade', 'order': 'FT'}]
+        for job in jobs:
+            job.update(pagesize=pagesize, writer=writers[job['name']])
+        controller = Controller(jobs, threads=2, report_interval=.01)
+        summary = {job['name']: job for job in controller.run()}
+
+        for name in ('ft', 'tf', 'fanout'):
+            self.assertTrue(summary[name]['ok'])
+        self.assertFalse(summary['failing']['ok'])
+        self.assertIn('ringbuffer error', summary['failing']['error'])
+        self.assertEqual(summary['ft']['npage'], npage)
+        self.assertEqual(summary['fanout']['npage'], 2 * npage)
+
+        filterbanks = open_filterbanks([self.fname])
+        for job in jobs[:3]:
+            job_writers = job['writer'] if isinstance(job['writer'], list) else [job['writer']]
+            orders = job['order'] if isinstance(job['order'], list) else [job['order']]
+            for writer, order in zip(job_writers, orders):
+                self.assertEqual(len(writer.pages), npage)
+                for page, data in enumerate(writer.pages):
+                    expected = np.empty(pagesize * self.nchans, dtype=np.uint8)
+                    get_data(filterbanks, page, pagesize, order, expected)
+                    np.testing.assert_array_equal(data.reshape(len(job['files']), -1)[0], expected)
+        filterbanks[0].close()
+
+        for writer in writers.values():
+            for w in (writer if isinstance(writer, list) else [writer]):
+                self.assertFalse(w.connected)
+        # the file was opened once for all jobs, and closed by all of them
+        self.assertEqual(controller.file_cache.nfile, 1)
+        self.assertEqual(len(controller.file_cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import threading
+import unittest
+
+import numpy as np
+
+from dada_fildb.fanout import FanOut
+
+
+class TestFanOut(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Set configuration
+        """
+        self.nbyte = 16
+        self.npage = 10
+        self.orders = ['FT', 'TF', 'FT']
+        self.nread = 0
+
+    def fill(self, page, outs):
+        """
+        Write a page with a different value for each order, count the number of times a page is read
+        """
+        self.nread += 1
+        for order, out in outs.items():
+            out[:] = page + 100 * (order == 'TF')
+
+    def test_fanout(self):
+        """
+        Each writer gets every page in its own order, while each page is read only once,
+        also when the writers run at different speeds
+        """
+        fanout = FanOut(self.fill, self.orders, self.nbyte, self.npage, depth=2)
+        received = [[] for _ in self.orders]
+
+        def write(index):
+            for page in range(self.npage):
+                out = np.zeros(self.nbyte, dtype=np.uint8)
+                fanout.fill(index, page, out)
+                received[index].append(out)
+
+        threads = [threading.Thread(target=write, args=(i, )) for i in range(len(self.orders))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        fanout.close()
+
+        self.assertEqual(self.nread, self.npage)
+        for order, pages in zip(self.orders, received):
+            expected = [np.full(self.nbyte, page + 100 * (order == 'TF'), dtype=np.uint8)
+                        for page in range(self.npage)]
+            np.testing.assert_array_equal(pages, expected)
+
+    def test_error(self):
+        """
+        An error while reading is raised in every writer
+        """
+        def fill(page, outs):
+            raise IOError('read error')
+
+        fanout = FanOut(fill, self.orders, self.nbyte, self.npage)
+        out = np.zeros(self.nbyte, dtype=np.uint8)
+        for index in range(len(self.orders)):
+            with self.assertRaises(RuntimeError):
+                fanout.fill(index, 0, out)
+        fanout.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import threading
+import unittest
+from time import monotonic
+
+import numpy as np
+
+from dada_fildb.follow import Follower
+from dada_fildb.selection import SelectedFile
+from dada_fildb.sigproc import SigprocFile
+from dada_fildb.virtual import VirtualSigprocFile
+
+
+class TestFollow(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Create filterbank files with only a header
+        """
+        self.nchans = 16
+        self.tsamp = 1e-3
+        self.fnames = ['test_follow0.fil', 'test_follow1.fil']
+        self.header = {'source_name': 'FAKE',
+                       'fch1': 1520.,
+                       'foff': -1.,
+                       'nchans': self.nchans,
+                       'nbits': 8,
+                       'tstart': 55000.0,
+                       'tsamp': self.tsamp,
+                       'nifs': 1}
+        for fname in self.fnames:
+            SigprocFile.new_file(fname, self.header).fp.close()
+        self.data = np.random.randint(0, 256, size=(100, self.nchans)).astype(np.uint8)
+
+    def tearDown(self):
+        """
+        Remove test files
+        """
+        for fname in self.fnames:
+            os.remove(fname)
+
+    def test_refresh(self):
+        """
+        Data appended after opening a file can be read after a refresh
+        """
+        for backend in SigprocFile.backends:
+            filterbank = SigprocFile(self.fnames[0], backend=backend)
+            self.assertEqual(filterbank.nspectra(), 0)
+            self.assertFalse(filterbank.refresh())
+            SigprocFile.append_spectra(self.data[:10], self.fnames[0])
+            self.assertTrue(filterbank.refresh())
+            np.testing.assert_array_equal(filterbank.get_data(0, 10), self.data[:10])
+            SigprocFile.append_spectra(self.data[10:], self.fnames[0])
+            self.assertTrue(filterbank.refresh())
+            np.testing.assert_array_equal(filterbank.get_data(0, 100), self.data)
+            filterbank.close()
+            SigprocFile.new_file(self.fnames[0], self.header).fp.close()
+
+    def test_refresh_virtual(self):
+        """
+        Only the last of a series of consecutive files grows
+        """
+        SigprocFile.append_spectra(self.data[:40], self.fnames[0])
+        header = dict(self.header, tstart=55000. + 40 * self.tsamp / 86400.)
+        SigprocFile.new_file(self.fnames[1], header).fp.close()
+        filterbank = VirtualSigprocFile(self.fnames)
+        self.assertEqual(filterbank.nspectra(), 40)
+        SigprocFile.append_spectra(self.data[40:], self.fnames[1])
+        self.assertTrue(filterbank.refresh())
+        self.assertEqual(filterbank.nspectra(), 100)
+        np.testing.assert_array_equal(filterbank.get_data(0, 100), self.data)
+        filterbank.close()
+
+    def test_follower(self):
+        """
+        The follower waits until data is available in all files, or until they stop growing
+        """
+        filterbanks = [SigprocFile(fname) for fname in self.fnames]
+        follower = Follower(filterbanks, self.fnames, timeout=.2)
+
+        def append():
+            for fname in self.fnames:
+                SigprocFile.append_spectra(self.data[:50], fname)
+
+        timer = threading.Timer(.05, append)
+        timer.start()
+        self.assertTrue(follower.wait_for(50))
+        timer.join()
+        self.assertEqual(follower.available(), 50)
+        # only one file grows
+        SigprocFile.append_spectra(self.data[50:], self.fnames[0])
+        self.assertFalse(follower.wait_for(100))
+        follower.close()
+        for filterbank in filterbanks:
+            filterbank.close()
+
+    def test_window(self):
+        """
+        A time window of fixed length ends as soon as it is complete, also if the files keep growing
+        """
+        for fname in self.fnames:
+            SigprocFile.append_spectra(self.data[:20], fname)
+        filterbanks = [SelectedFile(SigprocFile(fname), start=10, nsamp=30) for fname in self.fnames]
+        follower = Follower(filterbanks, self.fnames, timeout=5.)
+        self.assertFalse(follower.complete())
+
+        def append():
+            for fname in self.fnames:
+                SigprocFile.append_spectra(self.data[20:], fname)
+
+        timer = threading.Timer(.05, append)
+        timer.start()
+        tstart = monotonic()
+        self.assertTrue(follower.wait_for(30))
+        timer.join()
+        self.assertTrue(follower.complete())
+        # the end of the window is known without waiting for the timeout
+        self.assertFalse(follower.wait_for(31))
+        self.assertLess(monotonic() - tstart, 1.)
+        follower.close()
+        for filterbank in filterbanks:
+            filterbank.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from dada_fildb.header_cache import HeaderCache, check_consistency
+from dada_fildb.sigproc import SigprocFile
+
+
+class TestHeaderCache(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Create a filterbank file and a cache location
+        """
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmpdir.name, 'cache', 'headers.json')
+        self.fname = os.path.join(self.tmpdir.name, 'test.fil')
+        self.header = {'source_name': 'FAKE',
+                       'fch1': 1520.,
+                       'foff': -1.,
+                       'nchans': 16,
+                       'nbits': 8,
+                       'tstart': 55000.0,
+                       'tsamp': 1e-3,
+                       'nifs': 1}
+        self.create_filterbank(nsamp=10)
+
+    def tearDown(self):
+        """
+        Remove files
+        """
+        self.tmpdir.cleanup()
+
+    def create_filterbank(self, nsamp):
+        """
+        (Re)create the test filterbank file
+        :param int nsamp: number of spectra
+        """
+        filterbank = SigprocFile.new_file(self.fname, self.header)
+        filterbank.append_spectra(np.zeros((nsamp, self.header['nchans']), dtype=np.uint8), self.fname)
+        filterbank.close()
+
+    def test_cache(self):
+        """
+        Headers should be stored persistently and be refreshed when the file changes
+        """
+        cache = HeaderCache(self.cache_file)
+        header, hdrbytes, size = cache.header(self.fname)
+        self.assertEqual(header['source_name'], b'FAKE')
+        self.assertEqual(header['nchans'], 16)
+        self.assertEqual(size, hdrbytes + 10 * 16)
+        cache.save()
+        self.assertTrue(os.path.isfile(self.cache_file))
+
+        # a new cache instance should give the same header without parsing the file
+        cache = HeaderCache(self.cache_file)
+        self.assertEqual(cache.header(self.fname)[0], header)
+        filterbank = SigprocFile(self.fname, header_cache=cache)
+        self.assertEqual(filterbank.nspectra(), 10)
+        self.assertEqual(filterbank.source_name, b'FAKE')
+        filterbank.close()
+
+        # changing the file should invalidate the entry
+        self.create_filterbank(nsamp=20)
+        self.assertEqual(cache.header(self.fname)[2], hdrbytes + 20 * 16)
+
+    def test_consistency(self):
+        """
+        Mismatching header values should be reported
+        """
+        headers = {'a.fil': {'nchans': 16, 'tsamp': 1e-3},
+                   'b.fil': {'nchans': 16, 'tsamp': 1e-3},
+                   'c.fil': {'nchans': 32, 'tsamp': 1e-3}}
+        self.assertEqual(check_consistency(headers, keys=('nchans', 'tsamp')), [('c.fil', 'nchans', 32, 16)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import unittest
+
+import numpy as np
+
+from dada_fildb.dada_fildb import create_header, get_data, open_filterbanks
+from dada_fildb.ifs import IFFile, MultiIFFile, SpectraCache, split_ifs
+from dada_fildb.sigproc import SigprocFile
+
+
+class TestIFs(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Set configuration, create filterbank files with multiple IFs
+        """
+        self.nchans = 16
+        self.nifs = 4
+        self.nsamp = 300
+        self.pagesize = 64
+        self.fnames = ['test_ifs8.fil', 'test_ifs2.fil']
+        # 8-bit data with four IFs and 2-bit data with two IFs, (time, IF, frequency)
+        self.data = np.random.randint(0, 256, size=(self.nsamp, self.nifs, self.nchans)).astype(np.uint8)
+        self.data2 = np.random.randint(0, 4, size=(self.nsamp, 2, self.nchans)).astype(np.uint8)
+        self.create_filterbank(self.fnames[0], 8, self.data)
+        # the first sample is in the least significant bits
+        packed = self.data2.reshape(self.nsamp, -1, 4)
+        packed = (packed << np.array([0, 2, 4, 6], dtype=np.uint8)).sum(axis=2, dtype=np.uint8)
+        self.create_filterbank(self.fnames[1], 2, packed)
+
+    def tearDown(self):
+        """
+        Remove test files
+        """
+        for fname in self.fnames:
+            os.remove(fname)
+
+    def create_filterbank(self, fname, nbits, data):
+        """
+        Create a test filterbank file
+
+        :param str fname: path to file
+        :param int nbits: number of bits per sample
+        :param np.ndarray data: packed data, one row per spectrum
+        """
+        header = {'source_name': 'FAKE',
+                  'fch1': 1520.,
+                  'foff': -1.,
+                  'nchans': self.nchans,
+                  'nbits': nbits,
+                  'tstart': 55000.0,
+                  'tsamp': 1e-3,
+                  'nifs': data.shape[1] if nbits == 8 else 2}
+        SigprocFile.new_file(fname, header).fp.close()
+        SigprocFile.append_spectra(data.reshape(len(data), -1), fname)
+
+    def test_get_spectra(self):
+        """
+        All IFs are read at once, also for packed data
+        """
+        for backend in SigprocFile.backends:
+            filterbank = SigprocFile(self.fnames[0], backend=backend)
+            np.testing.assert_array_equal(filterbank.get_spectra(10, 50), self.data[10:60])
+            np.testing.assert_array_equal(filterbank.get_spectra(10, 50, chan_start=3, nchan=5),
+                                          self.data[10:60, :, 3:8])
+            self.assertEqual(len(filterbank.get_spectra(280, 50)), 20)
+            filterbank.close()
+        filterbank = SigprocFile(self.fnames[1])
+        np.testing.assert_array_equal(filterbank.get_spectra(10, 50, chan_start=4, nchan=8),
+                                      self.data2[10:60, :, 4:12])
+        filterbank.close()
+
+    def test_streams(self):
+        """
+        Each IF stream gives its own IF, the streams of a filterbank share a single read
+        """
+        filterbank = SigprocFile(self.fnames[0])
+        reads = []
+        cache = SpectraCache(filterbank)
+        get_spectra = filterbank.get_spectra
+        filterbank.get_spectra = lambda *args: reads.append(args) or get_spectra(*args)
+        streams = [IFFile(filterbank, (i, ), cache) for i in range(self.nifs)]
+        for i, stream in enumerate(streams):
+            self.assertEqual(stream.nifs, 1)
+            self.assertEqual(stream.nchans, self.nchans)
+            np.testing.assert_array_equal(stream.get_data(20, 100), self.data[20:120, i])
+        self.assertEqual(len(reads), 1)
+        filterbank.close()
+
+        with self.assertRaises(ValueError):
+            IFFile(filterbank, (self.nifs, ))
+
+    def test_sum(self):
+        """
+        The total intensity is the rounded mean of the first two IFs
+        """
+        for fname, data in zip(self.fnames, (self.data, self.data2)):
+            filterbank = SigprocFile(fname)
+            streams = split_ifs(filterbank, 'sum')
+            self.assertEqual(len(streams), 1)
+            expected = (data[:, :2].sum(axis=1, dtype=int) + 1) // 2
+            np.testing.assert_array_equal(streams[0].get_data(0, self.nsamp), expected)
+            filterbank.close()
+
+    def test_first(self):
+        """
+        By default only the first IF is read, data with one IF is not split
+        """
+        filterbank = SigprocFile(self.fnames[0])
+        stream, = split_ifs(filterbank)
+        np.testing.assert_array_equal(stream.get_data(0, self.nsamp), self.data[:, 0])
+        filterbank.close()
+        synthetic = open_filterbanks([], synthetic=True, nchans=self.nchans, ifs='all', duration='100samp')
+        self.assertNotIsInstance(synthetic[0], MultiIFFile)
+
+    def test_layout(self):
+        """
+        Pages of all IFs have the IF axis in the requested position, the header describes the polarisations
+        """
+        nbeam = 2
+        npage = int(np.ceil(self.nsamp / self.pagesize))
+        for layout in ('major', 'interleaved'):
+            filterbanks = open_filterbanks([self.fnames[0]] * nbeam, ifs='all', if_layout=layout,
+                                           channels=(2, 14))
+            nchans = 12
+            header = create_header(filterbanks[0], nbeam=nbeam, pagesize=self.pagesize)
+            self.assertEqual(header['NPOL'], str(self.nifs))
+            self.assertEqual(header['NDIM'], '1')
+            self.assertEqual(header['RESOLUTION'], str(nbeam * self.nifs * nchans * self.pagesize))
+            for order in ['TF', 'Tf', 'FT', 'fT']:
+                for page in range(npage):
+                    out = np.empty(int(header['RESOLUTION']), dtype=np.uint8)
+                    get_data(filterbanks, page, self.pagesize, order, out)
+                    # (time, IF, frequency) of this page, padded with zeroes
+                    expected = np.zeros((self.pagesize, self.nifs, nchans), dtype=np.uint8)
+                    block = self.data[page * self.pagesize:(page + 1) * self.pagesize, :, 2:14]
+                    expected[:len(block)] = block
+                    if 'F' in order:
+                        expected = expected[..., ::-1]
+                    # axes of each beam in the page: time, IF, frequency
+                    axes = {'major': 'ITF', 'interleaved': 'TFI'}[layout]
+                    if order[0] in 'Ff':
+                        axes = axes.replace('TF', 'FT')
+                    expected = expected.transpose(['TIF'.index(axis) for axis in axes])
+                    for beam_page in out.reshape(nbeam, -1):
+                        np.testing.assert_array_equal(beam_page, expected.ravel())
+            for filterbank in filterbanks:
+                filterbank.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import json
+import os
+import unittest
+
+import numpy as np
+
+from dada_fildb.injection import DM_CONST, InjectedFile, load_pulses, write_log
+from dada_fildb.sigproc import SigprocFile
+
+
+class TestInjection(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Create an 8-bit filterbank file with constant data
+        """
+        self.nchans = 64
+        self.nsamp = 4000
+        self.tsamp = 1e-3
+        self.fname = 'test_injection.fil'
+        header = {'source_name': 'FAKE',
+                  'fch1': 1520.,
+                  'foff': -4.,
+                  'nchans': self.nchans,
+                  'nbits': 8,
+                  'tstart': 55000.0,
+                  'tsamp': self.tsamp,
+                  'nifs': 1}
+        filterbank = SigprocFile.new_file(self.fname, header)
+        self.data = np.full((self.nsamp, self.nchans), 100, dtype=np.uint8)
+        filterbank.append_spectra(self.data, self.fname)
+        filterbank.fp.close()
+        self.filterbank = SigprocFile(self.fname)
+        self.pulse = {'time': 1., 'dm': 500., 'width': 2e-3, 'fluence': 50., 'beam': None}
+
+    def tearDown(self):
+        """
+        Remove test files
+        """
+        self.filterbank.close()
+        for fname in (self.fname, 'test_injection.txt', 'test_injection.jsonl'):
+            if os.path.isfile(fname):
+                os.remove(fname)
+
+    def test_inject(self):
+        """
+        The pulse arrives at the dispersion delay in each channel with the requested fluence,
+        other samples are not changed
+        """
+        injected = InjectedFile(self.filterbank, [self.pulse])
+        data = injected.get_data(0, self.nsamp).astype(float) - self.data
+        freqs = 1520. - 4. * np.arange(self.nchans)
+        delay = DM_CONST * self.pulse['dm'] * (freqs ** -2 - freqs[0] ** -2)
+        peak = np.argmax(data, axis=0) * self.tsamp
+        np.testing.assert_allclose(peak, self.pulse['time'] + delay, atol=2 * self.tsamp)
+        # each sample is rounded to an integer
+        np.testing.assert_allclose(data.sum(axis=0) * self.tsamp * 1e3, self.pulse['fluence'], rtol=.1)
+        self.assertTrue((data >= 0).all())
+        # the input is not changed
+        np.testing.assert_array_equal(self.filterbank.get_data(0, self.nsamp), self.data)
+
+    def test_pages(self):
+        """
+        Reading in pages gives the same data as reading at once, also for pages without pulse
+        """
+        injected = InjectedFile(self.filterbank, [self.pulse])
+        expected = injected.get_data(0, self.nsamp).copy()
+        pagesize = 300
+        pages = [injected.get_data(start, pagesize).copy() for start in range(0, self.nsamp, pagesize)]
+        np.testing.assert_array_equal(np.concatenate(pages), expected)
+
+    def test_saturation(self):
+        """
+        Bright pulses saturate at the maximum value
+        """
+        pulse = dict(self.pulse, fluence=1e5)
+        data = InjectedFile(self.filterbank, [pulse]).get_data(0, self.nsamp)
+        self.assertEqual(data.max(), 255)
+        self.assertEqual(data.min(), 100)
+
+    def test_log(self):
+        """
+        Pulses are read from a text file and logged
+        """
+        with open('test_injection.txt', 'w') as f:
+            f.write('# time dm width fluence beam\n1. 500. 2e-3 50.\n2.5 100 1e-3 20 0\n')
+        pulses = load_pulses('test_injection.txt')
+        self.assertEqual(len(pulses), 2)
+        self.assertIsNone(pulses[0]['beam'])
+        self.assertEqual(pulses[1]['beam'], 0)
+        write_log('test_injection.jsonl', [InjectedFile(self.filterbank, pulses)], pagesize=1000)
+        with open('test_injection.jsonl') as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[1]['first_page'], 2)
+        self.assertTrue(all(entry['injected'] for entry in entries))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from dada_fildb.dada_fildb import dada_fildb, get_data, open_filterbanks
+from dada_fildb.sigproc import SigprocFile
+
+from ringbuffer import PageWriter
+
+
+class TestLoop(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Create two beams of 100 spectra, which is three whole pages and a partial page
+        """
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.nchans = 16
+        self.pagesize = 32
+        self.npage_loop = 3
+        self.tsamp = 1e-3
+        self.files = []
+        for beam in range(2):
+            fname = os.path.join(self.tmpdir.name, f'beam{beam:02d}.fil')
+            header = {'source_name': 'FAKE',
+                      'fch1': 1520.,
+                      'foff': -1.,
+                      'nchans': self.nchans,
+                      'nbits': 8,
+                      'tstart': 55000.0,
+                      'tsamp': self.tsamp,
+                      'nifs': 1}
+            filterbank = SigprocFile.new_file(fname, header)
+            filterbank.append_spectra(np.random.randint(0, 256, size=(100, self.nchans)).astype(np.uint8), fname)
+            filterbank.close()
+            self.files.append(fname)
+
+    def tearDown(self):
+        """
+        Remove files
+        """
+        self.tmpdir.cleanup()
+
+    def check_pages(self, writer, order):
+        """
+        Every page is a page of the whole pages of the data, in order, starting again after the last one
+
+        :param PageWriter writer: writer the data were replayed into
+        :param str order: ringbuffer data order
+        """
+        filterbanks = open_filterbanks(self.files)
+        expected = np.empty((self.npage_loop, len(writer.buffer)), dtype=np.uint8)
+        for page in range(self.npage_loop):
+            get_data(filterbanks, page, self.pagesize, order, expected[page])
+        for filterbank in filterbanks:
+            filterbank.close()
+        for page, data in enumerate(writer.pages):
+            np.testing.assert_array_equal(data, expected[page % self.npage_loop], err_msg=f'page {page}')
+
+    def test_loop(self):
+        """
+        A fixed number of loops replays the whole pages that many times, and sets the scan length accordingly
+        """
+        for order in ('TF', 'FT'):
+            writer = PageWriter()
+            dada_fildb(self.files, 'dada', order, self.pagesize, loop=4, writer=writer)
+            self.assertEqual(len(writer.pages), 4 * self.npage_loop)
+            self.assertTrue(writer.eod)
+            self.assertAlmostEqual(float(writer.header['SCANLEN']), 4 * self.npage_loop * self.pagesize * self.tsamp)
+            self.check_pages(writer, order)
+
+    def test_forever(self):
+        """
+        Looping forever replays until the writer stops, with an unknown scan length
+        """
+        writer = PageWriter(max_pages=10)
+        dada_fildb(self.files, 'dada', 'TF', self.pagesize, loop=np.inf, writer=writer)
+        self.assertEqual(len(writer.pages), 10)
+        self.assertFalse(writer.eod)
+        self.assertEqual(float(writer.header['SCANLEN']), 0)
+        self.check_pages(writer, 'TF')
+
+    def test_short(self):
+        """
+        Data shorter than one page or fewer than one loop cannot be looped over
+        """
+        for loop, pagesize in ((2, 128), (0, self.pagesize)):
+            with self.assertRaises(ValueError):
+                dada_fildb(self.files, 'dada', 'TF', pagesize, loop=loop, writer=PageWriter())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from dada_fildb.metrics import BUCKETS, STAGES, Histogram, Metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Create an output location
+        """
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.prefix = os.path.join(self.tmpdir.name, 'metrics')
+
+    def tearDown(self):
+        """
+        Remove files
+        """
+        self.tmpdir.cleanup()
+
+    def test_histogram(self):
+        """
+        A duration is counted in the first bucket with an upper bound that is not smaller,
+        durations beyond the last bucket are counted separately
+        """
+        self.assertEqual(len(BUCKETS), 33)
+        self.assertEqual((BUCKETS[0], BUCKETS[4], BUCKETS[-1]), (1e-6, 1e-5, 100.))
+        hist = Histogram()
+        for value in (5e-7, 1e-6, 1.1e-6, 1e-3, 1e3):
+            hist.add(value, nbyte=10)
+        self.assertEqual(hist.counts[0], 2)
+        self.assertEqual(hist.counts[1], 1)
+        self.assertEqual(hist.counts[BUCKETS.index(1e-3)], 1)
+        self.assertEqual(hist.counts[-1], 1)
+        self.assertEqual((hist.count, hist.nbyte, hist.max), (5, 50, 1e3))
+        self.assertAlmostEqual(hist.sum, 5e-7 + 1e-6 + 1.1e-6 + 1e-3 + 1e3)
+
+        self.assertEqual(Histogram.quantile(hist.counts, .2), 1e-6)
+        self.assertEqual(Histogram.quantile(hist.counts, .7), 1e-3)
+        self.assertEqual(Histogram.quantile(hist.counts, .99), float('inf'))
+        self.assertIsNone(Histogram.quantile([0] * len(hist.counts), .5))
+
+        hist.reset_window()
+        self.assertEqual((hist.window_count, sum(hist.window_counts)), (0, 0))
+        self.assertEqual(hist.count, 5)
+
+    def test_snapshot(self):
+        """
+        Every export appends a snapshot to the JSON lines file, the window statistics cover the time
+        since the previous export
+        """
+        metrics = Metrics(self.prefix, interval=1e3)
+        metrics.record('read', 2e-3, nbyte=100)
+        metrics.record('read', 4e-3, nbyte=100)
+        metrics.page_done(1000)
+        metrics.export()
+        metrics.record('read', 1e-5)
+        metrics.page_done(1000)
+        metrics.export()
+
+        with open(f'{self.prefix}.jsonl') as f:
+            snapshots = [json.loads(line) for line in f]
+        self.assertEqual(len(snapshots), 2)
+        first, second = snapshots
+        self.assertEqual(set(first['stages']), set(STAGES))
+        self.assertEqual((first['pages'], first['bytes']), (1, 1000))
+        self.assertEqual((second['pages'], second['bytes']), (2, 2000))
+        read = first['stages']['read']
+        self.assertEqual((read['count'], read['window_count'], read['bytes']), (2, 2, 200))
+        self.assertAlmostEqual(read['seconds'], 6e-3)
+        self.assertEqual(read['max'], 4e-3)
+        # 2 ms is in the bucket up to 3.16 ms
+        self.assertEqual(read['window_p50'], 3.16e-3)
+        read = second['stages']['read']
+        self.assertEqual((read['count'], read['window_count']), (3, 1))
+        self.assertEqual(read['window_p99'], 1e-5)
+        self.assertIsNone(second['stages']['wait']['window_p50'])
+        self.assertGreater(second['pages_per_second'], 0)
+
+    def test_prometheus(self):
+        """
+        The Prometheus file has cumulative buckets, sums and counts per stage, and totals with the labels
+        """
+        metrics = Metrics(self.prefix, labels={'key': 'dada'})
+        for value in (1e-6, 1e-3, 1e3):
+            metrics.record('wait', value)
+        metrics.record('copy', 1e-4, nbyte=512)
+        metrics.page_done(512)
+        metrics.export()
+
+        with open(f'{self.prefix}.prom') as f:
+            text = f.read()
+        self.assertFalse(os.path.exists(f'{self.prefix}.prom.tmp'))
+        self.assertEqual(text, metrics.prometheus())
+        values = {}
+        for line in text.splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                values[name] = float(value)
+        self.assertIn('# TYPE dada_fildb_stage_seconds histogram', text)
+        self.assertEqual(values['dada_fildb_stage_seconds_bucket{key="dada",stage="wait",le="1e-06"}'], 1)
+        self.assertEqual(values['dada_fildb_stage_seconds_bucket{key="dada",stage="wait",le="0.001"}'], 2)
+        self.assertEqual(values['dada_fildb_stage_seconds_bucket{key="dada",stage="wait",le="100.0"}'], 2)
+        self.assertEqual(values['dada_fildb_stage_seconds_bucket{key="dada",stage="wait",le="+Inf"}'], 3)
+        self.assertEqual(values['dada_fildb_stage_seconds_count{key="dada",stage="wait"}'], 3)
+        self.assertAlmostEqual(values['dada_fildb_stage_seconds_sum{key="dada",stage="wait"}'], 1e3 + 1e-3 + 1e-6)
+        self.assertEqual(values['dada_fildb_stage_bytes_total{key="dada",stage="copy"}'], 512)
+        self.assertEqual(values['dada_fildb_pages_total{key="dada"}'], 1)
+        self.assertEqual(values['dada_fildb_bytes_total{key="dada"}'], 512)
+        # buckets are cumulative
+        for stage in STAGES:
+            counts = [values[f'dada_fildb_stage_seconds_bucket{{key="dada",stage="{stage}",le="{bound}"}}']
+                      for bound in BUCKETS]
+            self.assertEqual(counts, sorted(counts))
+
+    def test_concurrent_export(self):
+        """
+        Pages written from several threads export without clashing on the temporary file
+        """
+        metrics = Metrics(self.prefix, interval=0.)
+        with ThreadPoolExecutor(8) as executor:
+            for future in [executor.submit(metrics.page_done, 10) for _ in range(2000)]:
+                future.result()
+        metrics.export()
+        with open(f'{self.prefix}.jsonl') as f:
+            snapshots = [json.loads(line) for line in f]
+        self.assertEqual(snapshots[-1]['pages'], 2000)
+        with open(f'{self.prefix}.prom') as f:
+            self.assertIn('dada_fildb_pages_total{} 2000', f.read().splitlines())
+
+
+if __name__ == '__main__':
+    unittest.main()
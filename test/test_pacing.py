@@ -0,0 +1,94 @@
+import unittest
+from unittest import mock
+
+from dada_fildb.pacing import Pacer
+
+
+class Clock:
+    """
+    Stand-in for the monotonic clock, which only advances when sleeping or when told to
+    """
+
+    def __init__(self, now=1000.):
+        self.now = now
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestPacer(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Replace the clock of the pacer
+        """
+        self.clock = Clock()
+        patchers = [mock.patch('dada_fildb.pacing.monotonic', self.clock.monotonic),
+                    mock.patch('dada_fildb.pacing.sleep', self.clock.sleep)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_deadlines(self):
+        """
+        Page n is released at start + (n + 1) * interval, however long preparing each page took
+        """
+        pacer = Pacer(.5)
+        pacer.start()
+        start = self.clock.now
+        for page, work in enumerate((.1, .3, .45, 0., .2)):
+            self.clock.now += work
+            self.assertEqual(pacer.wait(page), 0.)
+            self.assertAlmostEqual(self.clock.now, start + (page + 1) * .5)
+        # a short sleep is not carried over to the next page
+        self.clock.now -= .05
+        self.assertEqual(pacer.wait(5), 0.)
+        self.assertAlmostEqual(self.clock.sleeps[-1], .55)
+        self.assertAlmostEqual(self.clock.now, start + 6 * .5)
+        self.assertEqual((pacer.npage, pacer.nlate), (6, 0))
+
+    def test_lateness(self):
+        """
+        Late pages are released immediately, and the schedule catches up without moving the deadlines
+        """
+        pacer = Pacer(1.)
+        pacer.start()
+        start = self.clock.now
+        # page 0 is ready 0.5 s late
+        self.clock.now += 1.5
+        self.assertAlmostEqual(pacer.wait(0), .5)
+        self.assertEqual(len(self.clock.sleeps), 0)
+        # page 1 is ready in time, it is still due at start + 2 s
+        self.clock.now += .1
+        self.assertEqual(pacer.wait(1), 0.)
+        self.assertAlmostEqual(self.clock.now, start + 2.)
+        # page 2 and 3 are ready 2.25 and 1.25 s late
+        self.clock.now += 3.25
+        self.assertAlmostEqual(pacer.wait(2), 2.25)
+        self.assertAlmostEqual(pacer.wait(3), 1.25)
+        self.assertEqual(len(self.clock.sleeps), 1)
+
+        self.assertEqual((pacer.npage, pacer.nlate), (4, 3))
+        self.assertAlmostEqual(pacer.max_lateness, 2.25)
+        self.assertAlmostEqual(pacer.total_lateness, 4.)
+        with self.assertLogs('dada_fildb.pacing', level='WARNING'):
+            pacer.summary()
+
+    def test_schedule(self):
+        """
+        The schedule starts at the first page if it was not started, and the interval must be positive
+        """
+        pacer = Pacer(.25)
+        self.assertAlmostEqual(pacer.schedule(3)[0], 1.)
+        self.assertEqual(len(self.clock.sleeps), 0)
+        with self.assertRaises(ValueError):
+            Pacer(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
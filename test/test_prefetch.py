@@ -0,0 +1,111 @@
+import threading
+import unittest
+
+import numpy as np
+
+from dada_fildb.dada_fildb import write_pages
+from dada_fildb.prefetch import Prefetcher
+
+from ringbuffer import PageWriter
+
+
+class TestPrefetcher(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Set configuration
+        """
+        self.nbyte = 16
+        self.npage = 10
+        self.nprefetch = 3
+        # address of the buffer each page was read into
+        self.buffers = {}
+        self.lock = threading.Lock()
+
+    def fill(self, page, out):
+        """
+        Write a page filled with its page number, remember which buffer it was read into
+        """
+        with self.lock:
+            self.buffers[page] = out.ctypes.data
+        out[:] = page
+
+    def test_prefetch(self):
+        """
+        Pages read on background threads are written in order, reusing a fixed pool of buffers
+        """
+        prefetcher = Prefetcher(self.fill, self.nbyte, self.npage, self.nprefetch)
+        writer = PageWriter(self.nbyte)
+        write_pages(writer, prefetcher.fill, self.npage)
+        prefetcher.close()
+
+        self.assertTrue(writer.eod)
+        expected = [np.full(self.nbyte, page, dtype=np.uint8) for page in range(self.npage)]
+        np.testing.assert_array_equal(writer.pages, expected)
+        # no page is read beyond the end
+        self.assertEqual(sorted(self.buffers), list(range(self.npage)))
+        self.assertEqual(len(set(self.buffers.values())), self.nprefetch)
+        # a buffer is reused once its page has been copied into the ringbuffer
+        for page in range(self.nprefetch, self.npage):
+            self.assertEqual(self.buffers[page], self.buffers[page - self.nprefetch])
+
+    def test_order(self):
+        """
+        Pages must be requested in order
+        """
+        prefetcher = Prefetcher(self.fill, self.nbyte, self.npage, self.nprefetch)
+        out = np.zeros(self.nbyte, dtype=np.uint8)
+        with self.assertRaises(ValueError):
+            prefetcher.fill(1, out)
+        prefetcher.close()
+        with self.assertRaises(ValueError):
+            Prefetcher(self.fill, self.nbyte, self.npage, 0)
+
+    def test_error(self):
+        """
+        An error while reading a page is raised when that page is requested
+        """
+        def fill(page, out):
+            if page == 2:
+                raise IOError('read error')
+            self.fill(page, out)
+
+        prefetcher = Prefetcher(fill, self.nbyte, self.npage, self.nprefetch)
+        out = np.zeros(self.nbyte, dtype=np.uint8)
+        for page in range(2):
+            prefetcher.fill(page, out)
+            np.testing.assert_array_equal(out, page)
+        with self.assertRaises(IOError):
+            prefetcher.fill(2, out)
+        prefetcher.close()
+
+    def test_close(self):
+        """
+        Closing waits for the reads in progress and does not start new ones
+        """
+        release = threading.Event()
+        started = []
+
+        def fill(page, out):
+            started.append(page)
+            if page > 0:
+                release.wait()
+            out[:] = page
+
+        prefetcher = Prefetcher(fill, self.nbyte, None, self.nprefetch)
+        out = np.zeros(self.nbyte, dtype=np.uint8)
+        prefetcher.fill(0, out)
+        closer = threading.Thread(target=prefetcher.close)
+        closer.start()
+        closer.join(timeout=.1)
+        # the reads of the pages after the first one are still waiting
+        self.assertTrue(closer.is_alive())
+        release.set()
+        closer.join(timeout=5)
+        self.assertFalse(closer.is_alive())
+        # the read of the page after the prefetched ones may have been cancelled before it started
+        self.assertIn(sorted(started), (list(range(self.nprefetch)), list(range(self.nprefetch + 1))))
+
+
+if __name__ == '__main__':
+    unittest.main()
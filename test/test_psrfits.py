@@ -0,0 +1,161 @@
+import os
+import unittest
+
+import numpy as np
+from astropy.io import fits
+
+from dada_fildb.dada_fildb import create_header
+from dada_fildb.psrfits import PsrfitsFile
+
+
+class TestPsrfits(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Set configuration
+        """
+        self.nsubint = 5
+        self.nsblk = 64
+        self.nchans = 16
+        self.fname = 'test_psrfits.fits'
+
+    def tearDown(self):
+        """
+        Remove test file
+        """
+        if os.path.isfile(self.fname):
+            os.remove(self.fname)
+
+    def create_file(self, npol, nbits, scale, offset, ascending=False):
+        """
+        Create a PSRFITS search-mode file, with descending or ascending channel frequencies
+
+        :return: unpacked samples with shape (spectrum, polarisation, channel), in the channel order of the file
+        """
+        if ascending:
+            freqs = 1400. + np.arange(self.nchans)
+        else:
+            freqs = 1520. - np.arange(self.nchans)
+        samples = np.random.randint(0, 2 ** nbits, size=(self.nsubint, self.nsblk, npol, self.nchans)).astype(np.uint8)
+        packed = samples.reshape(self.nsubint, -1, 8 // nbits)
+        # the first sample is stored in the most significant bits
+        packed = (packed << (nbits * np.arange(8 // nbits)[::-1]).astype(np.uint8)).sum(axis=2, dtype=np.uint8)
+        primary = fits.PrimaryHDU()
+        primary.header['SRC_NAME'] = 'FAKE'
+        primary.header['RA'] = '12:34:56.7'
+        primary.header['DEC'] = '+12:34:56.7'
+        primary.header['STT_IMJD'] = 55000
+        primary.header['STT_SMJD'] = 43200
+        primary.header['STT_OFFS'] = .5
+        columns = [fits.Column('DAT_FREQ', f'{self.nchans}D',
+                               array=np.tile(freqs, (self.nsubint, 1))),
+                   fits.Column('DAT_SCL', f'{self.nchans * npol}E', array=scale.reshape(self.nsubint, -1)),
+                   fits.Column('DAT_OFFS', f'{self.nchans * npol}E', array=offset.reshape(self.nsubint, -1)),
+                   fits.Column('DATA', f'{packed.shape[1]}B', array=packed)]
+        subint = fits.BinTableHDU.from_columns(columns, name='SUBINT')
+        subint.header['NSBLK'] = self.nsblk
+        subint.header['NPOL'] = npol
+        subint.header['NCHAN'] = self.nchans
+        subint.header['NBITS'] = nbits
+        subint.header['TBIN'] = 1e-3
+        subint.header['CHAN_BW'] = 1. if ascending else -1.
+        subint.header['POL_TYPE'] = 'AABBCRCI' if npol == 4 else 'AA+BB'
+        fits.HDUList([primary, subint]).writeto(self.fname, overwrite=True)
+        return samples.reshape(-1, npol, self.nchans)
+
+    def test_scaled(self):
+        """
+        Data are scaled per subintegration and the first two polarisations are summed
+        """
+        npol = 4
+        scale = np.random.uniform(.5, 2, size=(self.nsubint, npol, self.nchans)).astype(np.float32)
+        offset = np.random.uniform(-10, 10, size=(self.nsubint, npol, self.nchans)).astype(np.float32)
+        samples = self.create_file(npol, 8, scale, offset)
+        row = np.arange(len(samples)) // self.nsblk
+        expected = (samples[:, :2] * scale[row, :2] + offset[row, :2]).sum(axis=1)
+
+        filterbank = PsrfitsFile(self.fname)
+        self.assertEqual(filterbank.nbits, 32)
+        self.assertEqual(filterbank.nspectra(), self.nsubint * self.nsblk)
+        # reads within a subintegration, spanning subintegrations and past the end
+        for nstart, nsamp in [(10, 20), (50, 100), (0, self.nsubint * self.nsblk), (300, 100)]:
+            np.testing.assert_allclose(filterbank.get_data(nstart, nsamp), expected[nstart:nstart + nsamp],
+                                       rtol=1e-5, atol=1e-4)
+        np.testing.assert_allclose(filterbank.get_data(60, 10, chan_start=4, nchan=8), expected[60:70, 4:12],
+                                   rtol=1e-5, atol=1e-4)
+        filterbank.close()
+
+    def test_raw(self):
+        """
+        Unscaled single-polarisation data are passed through, also when packed in fewer than 8 bits
+        """
+        for nbits in (8, 4, 2):
+            scale = np.ones((self.nsubint, 1, self.nchans), dtype=np.float32)
+            offset = np.zeros((self.nsubint, 1, self.nchans), dtype=np.float32)
+            samples = self.create_file(1, nbits, scale, offset)[:, 0]
+            filterbank = PsrfitsFile(self.fname)
+            self.assertEqual(filterbank.nbits, nbits)
+            self.assertEqual(filterbank.dtype, np.uint8)
+            np.testing.assert_array_equal(filterbank.get_data(10, 20), samples[10:30])
+            np.testing.assert_array_equal(filterbank.get_data(50, 100), samples[50:150])
+            filterbank.close()
+
+    def test_header(self):
+        """
+        The header attributes are read from the PSRFITS headers
+        """
+        scale = np.ones((self.nsubint, 1, self.nchans), dtype=np.float32)
+        offset = np.zeros((self.nsubint, 1, self.nchans), dtype=np.float32)
+        self.create_file(1, 8, scale, offset)
+        filterbank = PsrfitsFile(self.fname)
+        self.assertAlmostEqual(filterbank.tstart, 55000.5 + .5 / 86400.)
+        self.assertEqual(filterbank.fch1, 1520.)
+        self.assertEqual(filterbank.foff, -1.)
+        header = create_header(filterbank, nbeam=1, pagesize=100)
+        self.assertEqual(header['RA_HMS'], '12:34:56.7')
+        self.assertEqual(header['SOURCE'], 'FAKE')
+        self.assertEqual(header['NCHAN'], str(self.nchans))
+        filterbank.close()
+
+    def test_ascending(self):
+        """
+        Files with ascending frequencies are read with the highest frequency first, like SIGPROC data
+        """
+        for npol, nbits in ((1, 8), (1, 2), (2, 8)):
+            if npol == 1:
+                scale = np.ones((self.nsubint, 1, self.nchans), dtype=np.float32)
+                offset = np.zeros((self.nsubint, 1, self.nchans), dtype=np.float32)
+            else:
+                scale = np.random.uniform(.5, 2, size=(self.nsubint, npol, self.nchans)).astype(np.float32)
+                offset = np.random.uniform(-10, 10, size=(self.nsubint, npol, self.nchans)).astype(np.float32)
+            samples = self.create_file(npol, nbits, scale, offset, ascending=True)
+            row = np.arange(len(samples)) // self.nsblk
+            expected = (samples * scale[row] + offset[row]).sum(axis=1)[:, ::-1]
+
+            filterbank = PsrfitsFile(self.fname)
+            self.assertEqual(filterbank.fch1, 1400. + self.nchans - 1)
+            self.assertEqual(filterbank.foff, -1.)
+            for nstart, nsamp in [(10, 20), (50, 100)]:
+                np.testing.assert_allclose(filterbank.get_data(nstart, nsamp), expected[nstart:nstart + nsamp],
+                                           rtol=1e-5, atol=1e-4)
+            np.testing.assert_allclose(filterbank.get_data(60, 10, chan_start=4, nchan=8), expected[60:70, 4:12],
+                                       rtol=1e-5, atol=1e-4)
+            header = create_header(filterbank, nbeam=1, pagesize=100, flip_band=True)
+            self.assertEqual(float(header['MIN_FREQUENCY']), 1400.)
+            self.assertEqual(float(header['BW']), self.nchans)
+            filterbank.close()
+
+    def test_nbits(self):
+        """
+        Data with more than 8 bits per sample are rejected when the file is opened
+        """
+        scale = np.ones((self.nsubint, 1, self.nchans), dtype=np.float32)
+        offset = np.zeros((self.nsubint, 1, self.nchans), dtype=np.float32)
+        self.create_file(1, 8, scale, offset)
+        fits.setval(self.fname, 'NBITS', value=16, extname='SUBINT')
+        with self.assertRaises(ValueError):
+            PsrfitsFile(self.fname)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import unittest
+
+import numpy as np
+
+from dada_fildb.dada_fildb import prepare_replay
+from dada_fildb.requantize import RequantizedFile
+from dada_fildb.sigproc import SigprocFile
+
+
+class TestRequantize(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Create a 32-bit filterbank file with a different mean and standard deviation per channel
+        """
+        self.nchans = 32
+        self.nsamp = 20000
+        self.fname = 'test_requantize.fil'
+        header = {'source_name': 'FAKE',
+                  'fch1': 1520.,
+                  'foff': -1.,
+                  'nchans': self.nchans,
+                  'nbits': 32,
+                  'tstart': 55000.0,
+                  'tsamp': 1e-3,
+                  'nifs': 1}
+        filterbank = SigprocFile.new_file(self.fname, header)
+        mean = np.linspace(1e3, 1e5, self.nchans)
+        std = np.linspace(1, 100, self.nchans)
+        data = np.random.normal(mean, std, size=(self.nsamp, self.nchans)).astype(np.float32)
+        # last channel is constant
+        data[:, -1] = 10.
+        filterbank.append_spectra(data, self.fname)
+        filterbank.fp.close()
+        self.filterbank = SigprocFile(self.fname)
+
+    def tearDown(self):
+        """
+        Remove test file
+        """
+        self.filterbank.fp.close()
+        os.remove(self.fname)
+
+    def test_requantize(self):
+        """
+        Requantize with block and running statistics
+        """
+        nsigma = 6.
+        for mode in ('block', 'running'):
+            requantized = RequantizedFile(self.filterbank, mode=mode, nsigma=nsigma)
+            self.assertEqual(requantized.nchans, self.nchans)
+            data = requantized.get_data(0, self.nsamp)
+            self.assertEqual(data.dtype, np.uint8)
+            self.assertEqual(data.shape, (self.nsamp, self.nchans))
+            np.testing.assert_allclose(data[:, :-1].mean(axis=0), 128, atol=1, err_msg=mode)
+            np.testing.assert_allclose(data[:, :-1].std(axis=0), 128 / nsigma, rtol=.05, err_msg=mode)
+            self.assertTrue((data[:, -1] == 128).all())
+
+    def test_running_pages(self):
+        """
+        In running mode each page is scaled with the statistics of all data up to and including that page,
+        pages must be read in order
+        """
+        nsigma = 6.
+        pagesize = 1000
+        data = self.filterbank.get_data(0, self.nsamp).astype(np.float64)
+        requantized = RequantizedFile(self.filterbank, mode='running', nsigma=nsigma)
+        self.assertTrue(requantized.stateful)
+        scales = []
+        for nstart in range(0, self.nsamp, pagesize):
+            page = requantized.get_data(nstart, pagesize)
+            seen = data[:nstart + pagesize]
+            mean = seen.mean(axis=0)
+            std = seen.std(axis=0)
+            scale = np.divide(128. / nsigma, std, out=np.zeros_like(std), where=std > 0)
+            expected = np.clip((data[nstart:nstart + pagesize] - mean) * scale + 128.5, 0, 255).astype(np.uint8)
+            # allow for rounding differences of the float32 computation
+            self.assertLessEqual(np.abs(page.astype(int) - expected).max(), 1, msg=f'page at {nstart}')
+            scales.append(requantized.scale.copy())
+        # the statistics change from page to page
+        self.assertFalse(np.array_equal(scales[0], scales[1]))
+
+        # reading a page again, or out of order, is an error
+        requantized = RequantizedFile(self.filterbank, mode='running', nsigma=nsigma)
+        requantized.get_data(0, pagesize)
+        for nstart in (0, 2 * pagesize):
+            with self.assertRaises(ValueError):
+                requantized.get_data(nstart, pagesize)
+        self.assertFalse(RequantizedFile(self.filterbank, mode='block').stateful)
+
+    def test_running_prefetch(self):
+        """
+        Pages cannot be prefetched with running requantization, as that would read them out of order
+        """
+        with self.assertRaises(ValueError):
+            prepare_replay([self.fname], 'dada', 'TF', 1000, prefetch=4, requantize='running')
+
+
+if __name__ == '__main__':
+    unittest.main()
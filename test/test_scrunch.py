@@ -0,0 +1,85 @@
+import os
+import unittest
+
+import numpy as np
+
+from dada_fildb.dada_fildb import create_header
+from dada_fildb.scrunch import ScrunchedFile
+from dada_fildb.sigproc import SigprocFile
+
+
+class TestScrunch(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Create an 8-bit filterbank file
+        """
+        self.nchans = 64
+        self.nsamp = 1001
+        self.fname = 'test_scrunch.fil'
+        header = {'source_name': 'FAKE',
+                  'src_raj': 0.,
+                  'src_dej': 0.,
+                  'az_start': 0.,
+                  'za_start': 0.,
+                  'fch1': 1520.,
+                  'foff': -1.,
+                  'nchans': self.nchans,
+                  'nbits': 8,
+                  'tstart': 55000.0,
+                  'tsamp': 1e-3,
+                  'nifs': 1}
+        filterbank = SigprocFile.new_file(self.fname, header)
+        self.data = np.random.randint(0, 256, size=(self.nsamp, self.nchans)).astype(np.uint8)
+        filterbank.append_spectra(self.data, self.fname)
+        filterbank.fp.close()
+        self.filterbank = SigprocFile(self.fname)
+
+    def tearDown(self):
+        """
+        Remove test file
+        """
+        self.filterbank.close()
+        os.remove(self.fname)
+
+    def test_scrunch(self):
+        """
+        Scrunched data are the rounded mean of blocks of the input
+        """
+        for tscrunch, fscrunch in [(1, 1), (4, 1), (1, 8), (3, 4)]:
+            scrunched = ScrunchedFile(self.filterbank, tscrunch=tscrunch, fscrunch=fscrunch)
+            nsamp = self.nsamp // tscrunch
+            self.assertEqual(scrunched.nspectra(), nsamp)
+            self.assertEqual(scrunched.nchans, self.nchans // fscrunch)
+            blocks = self.data[:nsamp * tscrunch].reshape(nsamp, tscrunch, self.nchans // fscrunch, fscrunch)
+            expected = np.floor(blocks.mean(axis=(1, 3)) + .5).astype(np.uint8)
+            # read in two parts, the second part past the end of the file
+            half = nsamp // 2
+            np.testing.assert_array_equal(scrunched.get_data(0, half), expected[:half])
+            np.testing.assert_array_equal(scrunched.get_data(half, nsamp), expected[half:])
+
+    def test_header(self):
+        """
+        The header describes the scrunched data, with the same centre frequency
+        """
+        pagesize = 100
+        scrunched = ScrunchedFile(self.filterbank, tscrunch=4, fscrunch=8)
+        header = create_header(self.filterbank, nbeam=1, pagesize=pagesize)
+        scrunched_header = create_header(scrunched, nbeam=1, pagesize=pagesize)
+        self.assertAlmostEqual(float(scrunched_header['TSAMP']), 4e-3)
+        self.assertEqual(int(scrunched_header['NCHAN']), self.nchans // 8)
+        self.assertAlmostEqual(float(scrunched_header['CHANNEL_BANDWIDTH']), 8.)
+        self.assertAlmostEqual(float(scrunched_header['FREQ']), float(header['FREQ']))
+        self.assertEqual(int(scrunched_header['BYTES_PER_SECOND']), self.nchans // 8 * 250)
+        self.assertEqual(int(scrunched_header['RESOLUTION']), pagesize * self.nchans // 8)
+
+    def test_invalid(self):
+        """
+        The number of channels must be divisible by fscrunch
+        """
+        with self.assertRaises(ValueError):
+            ScrunchedFile(self.filterbank, fscrunch=3)
+
+
+if __name__ == '__main__':
+    unittest.main()
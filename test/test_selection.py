@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from dada_fildb.dada_fildb import open_filterbanks, prepare_replay, select
+from dada_fildb.sigproc import SigprocFile
+
+
+class TestSelection(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Create a filterbank file
+        """
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.tmpdir.name, 'test.fil')
+        self.nchans = 16
+        self.tsamp = 1e-3
+        self.data = np.random.randint(0, 256, size=(100, self.nchans)).astype(np.uint8)
+        header = {'source_name': 'FAKE',
+                  'fch1': 1520.,
+                  'foff': -1.,
+                  'nchans': self.nchans,
+                  'nbits': 8,
+                  'tstart': 55000.0,
+                  'tsamp': self.tsamp,
+                  'nifs': 1}
+        filterbank = SigprocFile.new_file(self.fname, header)
+        filterbank.append_spectra(self.data, self.fname)
+        filterbank.close()
+        self.filterbank = SigprocFile(self.fname)
+
+    def tearDown(self):
+        """
+        Close and remove files
+        """
+        self.filterbank.close()
+        self.tmpdir.cleanup()
+
+    def test_select(self):
+        """
+        A window in seconds or samples and a channel range are read as a filterbank of their own
+        """
+        selected = select(self.filterbank, start='10samp', duration=.02, channels=(4, None))
+        self.assertEqual(selected.nspectra(), 20)
+        self.assertEqual(selected.nchans, self.nchans - 4)
+        self.assertAlmostEqual(selected.fch1, 1516.)
+        self.assertAlmostEqual((selected.tstart - 55000.) * 86400, 10 * self.tsamp, delta=1e-6)
+        np.testing.assert_array_equal(selected.get_data(5, 50), self.data[15:30, 4:])
+
+    def test_duration(self):
+        """
+        A window must have at least one sample, otherwise the end of the data would never be reached
+        """
+        for duration in ('0samp', '-5samp', 0., -.01, .4 * self.tsamp):
+            with self.assertRaises(ValueError, msg=str(duration)):
+                select(self.filterbank, duration=duration)
+            with self.assertRaises(ValueError, msg=str(duration)):
+                prepare_replay([self.fname], 'dada', 'TF', 32, duration=duration)
+        with self.assertRaises(ValueError):
+            open_filterbanks([], synthetic=True, duration='0samp', nchans=self.nchans)
+        self.assertEqual(select(self.filterbank, duration=.6 * self.tsamp).nspectra(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import os
+import struct
+import unittest
+
+import numpy as np
+
+from dada_fildb.sigproc import SigprocFile
+
+
+class TestSigprocFile(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Set configuration
+        """
+        self.nchans = 64
+        self.nsamp = 100
+        self.fname = 'test_sigproc.fil'
+
+    def tearDown(self):
+        """
+        Remove test file
+        """
+        try:
+            os.remove(self.fname)
+        except FileNotFoundError:
+            pass
+
+    def create_filterbank(self, nbits, data):
+        """
+        Create a test filterbank file
+        :param int nbits: number of bits per sample
+        :param np.ndarray data: (time, freq) data, packed into nbits per sample
+        :return: SigprocFile
+        """
+        header = {'source_name': 'FAKE',
+                  'fch1': 1520.,
+                  'foff': -1.,
+                  'nchans': self.nchans,
+                  'nbits': nbits,
+                  'tstart': 55000.0,
+                  'tsamp': 1e-3,
+                  'nifs': 1}
+        filterbank = SigprocFile.new_file(self.fname, header)
+        if nbits < 8:
+            # first sample in least significant bits
+            fac = 8 // nbits
+            packed = np.zeros((data.shape[0], data.shape[1] // fac), dtype=np.uint8)
+            for i in range(fac):
+                packed |= data[:, i::fac] << (i * nbits)
+            data = packed
+        filterbank.append_spectra(data, self.fname)
+        filterbank.fp.close()
+        return SigprocFile(self.fname)
+
+    def test_unpack_subbyte(self):
+        """
+        Read back 1, 2 and 4-bit data
+        """
+        for nbits in (1, 2, 4):
+            data = np.random.randint(0, 2 ** nbits, size=(self.nsamp, self.nchans)).astype(np.uint8)
+            filterbank = self.create_filterbank(nbits, data)
+            self.assertEqual(filterbank.nspectra(), self.nsamp)
+            self.assertEqual(filterbank.dtype, np.uint8)
+            np.testing.assert_array_equal(filterbank.get_data(10, 50), data[10:60])
+            np.testing.assert_array_equal(filterbank.unpack(0, self.nsamp)[:, 0], data.astype(np.float32))
+            filterbank.fp.close()
+
+    def test_channel_subset(self):
+        """
+        Read a time and channel range of 2, 8 and 16-bit data
+        """
+        for nbits, dtype in ((2, np.uint8), (8, np.uint8), (16, np.uint16)):
+            data = np.random.randint(0, 2 ** nbits, size=(self.nsamp, self.nchans)).astype(dtype)
+            filterbank = self.create_filterbank(nbits, data)
+            np.testing.assert_array_equal(filterbank.get_data(10, 20, chan_start=5, nchan=30), data[10:30, 5:35])
+            # reading beyond the end of the file returns only the remaining spectra
+            np.testing.assert_array_equal(filterbank.get_data(90, 20, chan_start=60), data[90:, 60:])
+            filterbank.close()
+
+    def test_backends(self):
+        """
+        Read the same data with each backend
+        """
+        for nbits, dtype in ((4, np.uint8), (8, np.uint8), (32, np.float32)):
+            data = np.random.randint(0, 2 ** min(nbits, 8), size=(self.nsamp, self.nchans)).astype(dtype)
+            self.create_filterbank(nbits, data).close()
+            for backend in SigprocFile.backends:
+                filterbank = SigprocFile(self.fname, backend=backend)
+                for nstart in range(0, self.nsamp, 30):
+                    np.testing.assert_array_equal(filterbank.get_data(nstart, 30, chan_start=4, nchan=20),
+                                                  data[nstart:nstart + 30, 4:24], err_msg=backend)
+                filterbank.close()
+
+    def test_release(self):
+        """
+        Sequential reads with the mmap and pread backends release the data behind them from the page cache
+        """
+        nsamp = 2000
+        data = np.random.randint(0, 256, size=(nsamp, self.nchans)).astype(np.uint8)
+        self.create_filterbank(8, data).close()
+        for backend in SigprocFile.backends:
+            filterbank = SigprocFile(self.fname, backend=backend)
+            for nstart in range(0, nsamp, 200):
+                np.testing.assert_array_equal(filterbank.get_data(nstart, 200), data[nstart:nstart + 200],
+                                              err_msg=backend)
+            if backend == 'copy':
+                self.assertEqual(filterbank._released, 0)
+            else:
+                # one window of 200 spectra behind the last read is kept
+                last_read = filterbank.hdrbytes + (nsamp - 200) * self.nchans
+                self.assertGreater(filterbank._released, 0, msg=backend)
+                self.assertLessEqual(filterbank._released, last_read - 200 * self.nchans, msg=backend)
+            # data that were released are read back from disk
+            np.testing.assert_array_equal(filterbank.get_data(0, 200), data[:200], err_msg=backend)
+            filterbank.close()
+
+    def test_unknown_keywords(self):
+        """
+        Unknown header keywords with empty, integer, double and string values should be skipped
+        """
+        with open(self.fname, 'wb') as fp:
+            SigprocFile.send_string('HEADER_START', fp)
+            SigprocFile.send_string('FREQUENCY_START', fp)
+            SigprocFile.send_string('nchans', fp)
+            fp.write(struct.pack('i', self.nchans))
+            SigprocFile.send_string('unknown_int', fp)
+            fp.write(struct.pack('i', 42))
+            SigprocFile.send_string('unknown_double', fp)
+            fp.write(struct.pack('d', 1.5))
+            SigprocFile.send_string('unknown_string', fp)
+            SigprocFile.send_string('some value', fp)
+            SigprocFile.send_string('nbits', fp)
+            fp.write(struct.pack('i', 8))
+            SigprocFile.send_string('nifs', fp)
+            fp.write(struct.pack('i', 1))
+            SigprocFile.send_string('HEADER_END', fp)
+            hdrbytes = fp.tell()
+            fp.write(np.zeros((self.nsamp, self.nchans), dtype=np.uint8).tobytes())
+        filterbank = SigprocFile(self.fname)
+        self.assertEqual(filterbank.hdrbytes, hdrbytes)
+        self.assertEqual(filterbank.nchans, self.nchans)
+        self.assertEqual(filterbank.nbits, 8)
+        self.assertEqual(filterbank.nspectra(), self.nsamp)
+        filterbank.close()
+
+    def test_unknown_int_before_known(self):
+        """
+        An unknown integer whose value is also a valid string length does not skip the known keywords after it
+        """
+        def string(value):
+            return struct.pack('i', len(value)) + value.encode()
+
+        known = string('tsamp') + struct.pack('d', 1e-3) + string('nbits') + struct.pack('i', 8)
+        # read as a string, the value of the unknown keyword would end exactly at the next known keyword, nifs
+        buf = (string('HEADER_START') + string('nchans') + struct.pack('i', self.nchans)
+               + string('unknown_int') + struct.pack('i', len(known)) + known
+               + string('nifs') + struct.pack('i', 1) + string('HEADER_END'))
+        header, hdrbytes = SigprocFile.parse_header(buf)
+        self.assertEqual(header, {'nchans': self.nchans, 'tsamp': 1e-3, 'nbits': 8, 'nifs': 1})
+        self.assertEqual(hdrbytes, len(buf))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+
+from dada_fildb.dada_fildb import create_header
+from dada_fildb.synthetic import SyntheticFile, noise_pool
+
+
+class TestSynthetic(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Set configuration
+        """
+        self.nchans = 64
+        self.tsamp = 1e-3
+        self.pool = noise_pool(self.nchans, nspectra=1000, seed=1)
+
+    def test_noise(self):
+        """
+        Noise has the requested statistics, the bandpass falls off towards the edges
+        """
+        self.assertEqual(self.pool.dtype, np.uint8)
+        self.assertAlmostEqual(self.pool.mean(), 128., delta=.5)
+        self.assertAlmostEqual(self.pool.astype(float).std(), 16., delta=.5)
+        bandpass = noise_pool(self.nchans, nspectra=1000, noise='bandpass', seed=1).mean(axis=0)
+        self.assertLess(bandpass[0], bandpass[self.nchans // 2])
+        self.assertLess(bandpass[-1], bandpass[self.nchans // 2])
+
+    def test_get_data(self):
+        """
+        The same seed and position give the same data, also for reads longer than the pool
+        """
+        synthetic = SyntheticFile(self.nchans, self.tsamp, 1520., -1., nsamp=5000, pool=self.pool, seed=3)
+        other = SyntheticFile(self.nchans, self.tsamp, 1520., -1., nsamp=5000, pool=self.pool, seed=4)
+        self.assertEqual(synthetic.nspectra(), 5000)
+        np.testing.assert_array_equal(synthetic.get_data(100, 200), synthetic.get_data(100, 200))
+        self.assertFalse(np.array_equal(synthetic.get_data(100, 200), other.get_data(100, 200)))
+        self.assertFalse(np.array_equal(synthetic.get_data(100, 200), synthetic.get_data(300, 200)))
+        data = synthetic.get_data(0, 2500)
+        self.assertEqual(data.shape, (2500, self.nchans))
+        np.testing.assert_array_equal(data, synthetic.get_data(0, 2500))
+        # up to the end of the data
+        self.assertEqual(len(synthetic.get_data(4900, 200)), 100)
+        self.assertEqual(synthetic.get_data(0, 10, chan_start=8, nchan=4).shape, (10, 4))
+
+    def test_header(self):
+        """
+        A header can be created for an endless stream
+        """
+        synthetic = SyntheticFile(self.nchans, self.tsamp, 1520., -1., pool=self.pool)
+        self.assertTrue(np.isinf(synthetic.nspectra()))
+        header = create_header(synthetic, nbeam=2, pagesize=100, scanlen=0)
+        self.assertEqual(header['NCHAN'], str(self.nchans))
+        self.assertEqual(header['SOURCE'], 'SYNTHETIC')
+        self.assertEqual(header['SCANLEN'], '0')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+
+from dada_fildb.transpose import page_shape, reorder
+
+
+class TestTranspose(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Create a block of filterbank data
+        """
+        self.nchans = 100
+        self.pagesize = 300
+        self.data = np.random.randint(0, 256, size=(self.pagesize, self.nchans)).astype(np.uint8)
+
+    def expected(self, data, order):
+        """
+        Reference conversion of filterbank data to ringbuffer order
+        :param np.ndarray data: block of filterbank data
+        :param str order: ringbuffer data order
+        :return: slab in ringbuffer order
+        """
+        page = np.zeros((self.pagesize, self.nchans), dtype=np.uint8)
+        page[:len(data)] = data
+        if 'F' in order:
+            page = page[:, ::-1]
+        if order[0] in 'Ff':
+            page = page.T
+        return page
+
+    def test_reorder(self):
+        """
+        Convert a full page to each order, with tiles that do not divide the page
+        """
+        for order in ['TF', 'Tf', 'FT', 'fT']:
+            out = np.empty(page_shape(order, self.nchans, self.pagesize), dtype=np.uint8)
+            reorder(self.data, order, out, tile=64)
+            np.testing.assert_array_equal(out, self.expected(self.data, order), err_msg=order)
+
+    def test_partial_page(self):
+        """
+        Convert a partial page, the remainder should be zero
+        """
+        data = self.data[:123]
+        for order in ['TF', 'Tf', 'FT', 'fT']:
+            out = np.full(page_shape(order, self.nchans, self.pagesize), 255, dtype=np.uint8)
+            reorder(data, order, out, tile=64)
+            np.testing.assert_array_equal(out, self.expected(data, order), err_msg=order)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+from astropy.time import Time
+
+from dada_fildb.utc import LEAP_SECOND_DAYS, mjd_to_isot
+
+
+class TestUTC(unittest.TestCase):
+
+    def check(self, mjds):
+        """
+        Conversions are identical to those of astropy
+        """
+        expected = Time(np.array(mjds), format='mjd').isot
+        for mjd, isot in zip(mjds, expected):
+            self.assertEqual(mjd_to_isot(mjd), isot, msg=f'MJD {mjd!r}')
+
+    def test_random(self):
+        """
+        Times since leap seconds were introduced, and times that round to the next millisecond or day
+        """
+        mjds = list(np.random.uniform(41317, 62000, 2000))
+        for day in (55000, 58000, 60000):
+            for second in (0, .0005, .0004999, 59.9995, 12345.6785, 86399.9994, 86399.9995, 86399.99999):
+                mjds.append(day + second / 86400)
+        self.check(mjds)
+
+    def test_leap_seconds(self):
+        """
+        The last second of a day that ends with a leap second is 23:59:60
+        """
+        self.assertEqual(len(LEAP_SECOND_DAYS), 27)
+        self.assertEqual(mjd_to_isot(57753 + 86400.5 / 86401), '2016-12-31T23:59:60.500')
+        mjds = []
+        for day in LEAP_SECOND_DAYS:
+            mjds.extend(day + np.random.uniform(0, 1, 20))
+            for second in (0, 86399.5, 86399.9996, 86400, 86400.0004, 86400.5, 86400.9994, 86400.9996):
+                mjds.append(day + second / 86401)
+            mjds.extend([day + 1 - 1e-12, day + 1, day + 1 + 1e-9])
+        self.check(mjds)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import os
+import unittest
+
+import numpy as np
+
+from dada_fildb.dada_fildb import create_header, get_data, open_filterbanks
+from dada_fildb.sigproc import SigprocFile
+from dada_fildb.verify import Verifier, expected_page, verify
+
+from ringbuffer import PageReader
+
+
+class TestVerify(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Create filterbank files and the pages dada_fildb writes from them
+        """
+        self.nchans = 32
+        self.nsamp = 1000
+        self.pagesize = 128
+        self.npage = int(np.ceil(self.nsamp / self.pagesize))
+        self.fnames = ['test_verify0.fil', 'test_verify1.fil']
+        header = {'source_name': 'FAKE',
+                  'fch1': 1520.,
+                  'foff': -1.,
+                  'nchans': self.nchans,
+                  'nbits': 8,
+                  'tstart': 55000.0,
+                  'tsamp': 1e-3,
+                  'nifs': 1}
+        self.filterbanks = []
+        for fname in self.fnames:
+            filterbank = SigprocFile.new_file(fname, header)
+            data = np.random.randint(0, 256, size=(self.nsamp, self.nchans)).astype(np.uint8)
+            filterbank.append_spectra(data, fname)
+            filterbank.fp.close()
+            self.filterbanks.append(SigprocFile(fname))
+
+    def tearDown(self):
+        """
+        Remove test files
+        """
+        for filterbank, fname in zip(self.filterbanks, self.fnames):
+            filterbank.close()
+            os.remove(fname)
+
+    def pages(self, order):
+        """
+        Pages as written by dada_fildb
+        """
+        nbyte = len(self.filterbanks) * self.nchans * self.pagesize
+        pages = np.empty((self.npage, nbyte), dtype=np.uint8)
+        for page in range(self.npage):
+            get_data(self.filterbanks, page, self.pagesize, order, pages[page])
+        return pages
+
+    def test_expected_page(self):
+        """
+        The independently built pages are identical to those of dada_fildb
+        """
+        for order in ['TF', 'Tf', 'FT', 'fT']:
+            for page, data in enumerate(self.pages(order)):
+                np.testing.assert_array_equal(expected_page(self.filterbanks, page, self.pagesize, order), data)
+
+    def test_verifier(self):
+        """
+        Mismatched, dropped and duplicated pages are detected
+        """
+        pages = list(self.pages('FT'))
+        verifier = Verifier(self.filterbanks, 'FT', self.pagesize, npage=self.npage, nthread=2)
+        for data in pages:
+            verifier.add(data)
+        verifier.finish()
+        self.assertTrue(verifier.report()['ok'])
+
+        # page 1 is corrupted, page 3 is dropped, page 4 is written twice, the last page is missing
+        pages[1] = pages[1].copy()
+        pages[1][0] ^= 1
+        pages = pages[:3] + [pages[4]] + pages[4:-1]
+        verifier = Verifier(self.filterbanks, 'FT', self.pagesize, npage=self.npage, nthread=2)
+        for data in pages:
+            verifier.add(data)
+        verifier.finish()
+        report = verifier.report()
+        self.assertFalse(report['ok'])
+        self.assertEqual(report['mismatched'], [1])
+        self.assertEqual(report['dropped'], [3])
+        self.assertEqual(report['duplicated'], [4])
+        self.assertEqual(report['missing'], 1)
+
+        # after dropped pages, all expected pages that can no longer be matched are forgotten
+        window = 2
+        verifier = Verifier(self.filterbanks, 'FT', self.pagesize, npage=self.npage, nthread=2, window=window)
+        for data in self.pages('FT')[::2]:
+            verifier.add(data)
+        verifier.finish()
+        self.assertEqual(verifier.report()['dropped'], [1, 3, 5])
+        self.assertGreaterEqual(min(verifier._expected), verifier.next_page - window)
+
+    def test_stateful(self):
+        """
+        Pages of running requantization, which depend on the pages before them, are verified
+        """
+        header = {'source_name': 'FAKE',
+                  'fch1': 1520.,
+                  'foff': -1.,
+                  'nchans': self.nchans,
+                  'nbits': 32,
+                  'tstart': 55000.0,
+                  'tsamp': 1e-3,
+                  'nifs': 1}
+        fnames = ['test_verify_float0.fil', 'test_verify_float1.fil']
+        for fname in fnames:
+            filterbank = SigprocFile.new_file(fname, header)
+            # the statistics drift, so the scale differs from page to page
+            data = np.random.normal(np.linspace(0, 100, self.nsamp)[:, None], 10, size=(self.nsamp, self.nchans))
+            filterbank.append_spectra(data.astype(np.float32), fname)
+            filterbank.close()
+        try:
+            # a serial replay
+            filterbanks = open_filterbanks(fnames, requantize='running')
+            nbyte = len(filterbanks) * self.nchans * self.pagesize
+            pages = np.empty((self.npage, nbyte), dtype=np.uint8)
+            for page in range(self.npage):
+                get_data(filterbanks, page, self.pagesize, 'FT', pages[page])
+            dada_header = create_header(filterbanks[0], nbeam=len(filterbanks), pagesize=self.pagesize)
+            for filterbank in filterbanks:
+                filterbank.close()
+
+            result = verify('dada', 'FT', self.pagesize, nthread=4, dada_reader=PageReader(dada_header, list(pages)),
+                            files=fnames, requantize='running')
+            self.assertTrue(result['ok'])
+            self.assertEqual(result['correct'], self.npage)
+            result = verify('dada', 'FT', self.pagesize, nthread=4,
+                            dada_reader=PageReader(dada_header, list(pages[:2]) + list(pages[3:])),
+                            files=fnames, requantize='running')
+            self.assertEqual(result['dropped'], [2])
+            self.assertEqual(result['correct'], self.npage - 1)
+        finally:
+            for fname in fnames:
+                os.remove(fname)
+
+    def test_verify(self):
+        """
+        A ringbuffer is verified with the options of the command line, including the file reader backend
+        """
+        header = create_header(self.filterbanks[0], nbeam=len(self.filterbanks), pagesize=self.pagesize)
+        pages = list(self.pages('FT'))
+        for backend in SigprocFile.backends:
+            dada_reader = PageReader(header, pages)
+            result = verify('dada', 'FT', self.pagesize, dada_reader=dada_reader, files=self.fnames, reader=backend)
+            self.assertTrue(result['ok'])
+            self.assertEqual(result['correct'], self.npage)
+            self.assertFalse(dada_reader.connected)
+
+        # a dropped page and a header of a different data order are reported
+        result = verify('dada', 'FT', self.pagesize, dada_reader=PageReader(header, pages[:2] + pages[3:]),
+                        files=self.fnames)
+        self.assertFalse(result['ok'])
+        self.assertEqual(result['dropped'], [2])
+        result = verify('dada', 'Tf', self.pagesize, dada_reader=PageReader(header, list(self.pages('Tf'))),
+                        files=self.fnames)
+        self.assertFalse(result['ok'])
+        self.assertIn('MIN_FREQUENCY', result['header_mismatches'])
+
+        # a replay cannot loop over data shorter than one page
+        with self.assertRaises(ValueError):
+            verify('dada', 'FT', 2 * self.nsamp, loop=2, dada_reader=PageReader(header, []), files=self.fnames)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import unittest
+
+import numpy as np
+
+from dada_fildb.sigproc import SigprocFile
+from dada_fildb.virtual import VirtualSigprocFile
+
+
+class TestVirtualSigprocFile(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Set configuration, create consecutive filterbank files
+        """
+        self.nchans = 16
+        self.tsamp = 1e-3
+        self.nsamps = [100, 37, 250]
+        self.data = np.random.randint(0, 256, size=(sum(self.nsamps), self.nchans)).astype(np.uint8)
+
+        self.files = []
+        start = 0
+        for i, nsamp in enumerate(self.nsamps):
+            tstart = 55000. + start * self.tsamp / 86400.
+            self.files.append(self.create_filterbank(f'test_part{i}.fil', tstart, self.data[start:start + nsamp]))
+            start += nsamp
+
+    def tearDown(self):
+        """
+        Remove test files
+        """
+        for fname in self.files:
+            os.remove(fname)
+
+    def create_filterbank(self, fname, tstart, data):
+        """
+        Create a test filterbank file
+        :param str fname: path to file
+        :param float tstart: start MJD
+        :param np.ndarray data: (time, freq) data
+        :return: path to file
+        """
+        header = {'source_name': 'FAKE',
+                  'fch1': 1520.,
+                  'foff': -1.,
+                  'nchans': self.nchans,
+                  'nbits': 8,
+                  'tstart': tstart,
+                  'tsamp': self.tsamp,
+                  'nifs': 1}
+        filterbank = SigprocFile.new_file(fname, header)
+        filterbank.append_spectra(data, fname)
+        filterbank.close()
+        return fname
+
+    def test_get_data(self):
+        """
+        Read blocks within and across file boundaries
+        """
+        filterbank = VirtualSigprocFile(self.files)
+        self.assertEqual(filterbank.nspectra(), sum(self.nsamps))
+        self.assertEqual(filterbank.nchans, self.nchans)
+        for nstart, nsamp in [(0, 50), (90, 20), (50, 200), (380, 100), (400, 10)]:
+            np.testing.assert_array_equal(filterbank.get_data(nstart, nsamp), self.data[nstart:nstart + nsamp],
+                                          err_msg=f'nstart={nstart} nsamp={nsamp}')
+        filterbank.close()
+
+    def test_gap(self):
+        """
+        Files that do not follow each other should be rejected
+        """
+        with self.assertRaises(ValueError):
+            VirtualSigprocFile([self.files[0], self.files[2]])
+
+
+if __name__ == '__main__':
+    unittest.main()
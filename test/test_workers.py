@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from dada_fildb.dada_fildb import get_data, get_pages, open_filterbanks
+from dada_fildb.sigproc import SigprocFile
+
+
+class TestWorkers(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Create four beams of 100 spectra, which is three whole pages and a partial page
+        """
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.nchans = 48
+        self.pagesize = 32
+        self.npage = 4
+        self.orders = ['TF', 'Tf', 'FT', 'fT']
+        files = []
+        for beam in range(4):
+            fname = os.path.join(self.tmpdir.name, f'beam{beam:02d}.fil')
+            header = {'source_name': 'FAKE',
+                      'fch1': 1520.,
+                      'foff': -1.,
+                      'nchans': self.nchans,
+                      'nbits': 8,
+                      'tstart': 55000.0,
+                      'tsamp': 1e-3,
+                      'nifs': 1}
+            filterbank = SigprocFile.new_file(fname, header)
+            filterbank.append_spectra(np.random.randint(0, 256, size=(100, self.nchans)).astype(np.uint8), fname)
+            filterbank.close()
+            files.append(fname)
+        self.filterbanks = open_filterbanks(files)
+        self.nbyte = len(self.filterbanks) * self.nchans * self.pagesize
+
+    def tearDown(self):
+        """
+        Close and remove files
+        """
+        for filterbank in self.filterbanks:
+            filterbank.close()
+        self.tmpdir.cleanup()
+
+    def test_get_data(self):
+        """
+        Pages filled by worker threads, one beam per thread, are identical to pages filled serially
+        """
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            for order in self.orders:
+                for page in range(self.npage):
+                    serial = np.empty(self.nbyte, dtype=np.uint8)
+                    get_data(self.filterbanks, page, self.pagesize, order, serial)
+                    # stale data in the page must be overwritten, also after the end of the data
+                    parallel = np.full(self.nbyte, 255, dtype=np.uint8)
+                    get_data(self.filterbanks, page, self.pagesize, order, parallel, executor=executor)
+                    np.testing.assert_array_equal(parallel, serial, err_msg=f'order {order}, page {page}')
+
+    def test_get_pages(self):
+        """
+        Pages of several orders filled at once by worker threads are identical to pages filled serially
+        """
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            for page in range(self.npage):
+                serial = {order: np.empty(self.nbyte, dtype=np.uint8) for order in self.orders}
+                get_pages(self.filterbanks, page, self.pagesize, serial)
+                parallel = {order: np.full(self.nbyte, 255, dtype=np.uint8) for order in self.orders}
+                get_pages(self.filterbanks, page, self.pagesize, parallel, executor=executor)
+                for order in self.orders:
+                    np.testing.assert_array_equal(parallel[order], serial[order],
+                                                  err_msg=f'order {order}, page {page}')
+
+
+if __name__ == '__main__':
+    unittest.main()
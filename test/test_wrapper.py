@@ -0,0 +1,69 @@
+import copy
+import threading
+import unittest
+
+import numpy as np
+
+from dada_fildb.wrapper import FilterbankWrapper, accumulator_dtype, sum_to_mean
+
+
+class Reader:
+    """
+    Minimal filterbank reader
+    """
+
+    nchans = 16
+    tsamp = 1e-3
+
+
+class TestWrapper(unittest.TestCase):
+
+    def test_attributes(self):
+        """
+        Attributes not set on the wrapper are taken from the wrapped reader
+        """
+        wrapper = FilterbankWrapper(Reader())
+        wrapper.nchans = 8
+        self.assertEqual(wrapper.nchans, 8)
+        self.assertEqual(wrapper.tsamp, 1e-3)
+        with self.assertRaises(AttributeError):
+            wrapper.nbits
+        # a copy does not recurse while its attributes are not set yet
+        self.assertIs(copy.copy(wrapper).filterbank, wrapper.filterbank)
+
+    def test_buffers(self):
+        """
+        Buffers are reused within a thread, grown when needed, and separate between threads
+        """
+        wrapper = FilterbankWrapper(Reader())
+        buffer = wrapper._buffer('out', (10, 4), np.uint8)
+        self.assertEqual(buffer.shape, (10, 4))
+        self.assertTrue(np.shares_memory(wrapper._buffer('out', (5, 4), np.uint8), buffer))
+        self.assertFalse(np.shares_memory(wrapper._buffer('acc', (5, 4), np.uint8), buffer))
+        for shape, dtype in (((20, 4), np.uint8), ((5, 3), np.uint8), ((5, 4), np.float32)):
+            other = wrapper._buffer('out', shape, dtype)
+            self.assertEqual((other.shape, other.dtype), (shape, dtype))
+            self.assertFalse(np.shares_memory(other, buffer))
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(wrapper._buffer('out', (5, 4), np.float32)))
+        thread.start()
+        thread.join()
+        self.assertFalse(np.shares_memory(other[0], wrapper._buffer('out', (5, 4), np.float32)))
+
+    def test_sum_to_mean(self):
+        """
+        Integer means are rounded to the nearest value, floating point means are exact
+        """
+        acc = np.array([0, 1, 2, 3, 5, 6], dtype=accumulator_dtype(np.uint8))
+        sum_to_mean(acc, 4)
+        np.testing.assert_array_equal(acc, [0, 0, 1, 1, 1, 2])
+        acc = np.array([1., 2., 3.], dtype=accumulator_dtype(np.float32))
+        sum_to_mean(acc, 4)
+        np.testing.assert_array_equal(acc, [.25, .5, .75])
+        self.assertEqual(accumulator_dtype(np.int16), np.int32)
+        self.assertEqual(accumulator_dtype(np.uint16), np.uint32)
+
+
+if __name__ == '__main__':
+    unittest.main()